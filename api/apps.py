@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _ensure_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .services.search_service import ensure_search_index
+    ensure_search_index(connections[using])
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(_ensure_search_index, sender=self)
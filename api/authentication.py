@@ -0,0 +1,94 @@
+"""
+JWT authentication with a cached user lookup.
+
+simplejwt fetches the ``User`` row on every request. Here the row is kept in a
+small in-process cache for ``AUTH_USER_CACHE_TTL`` seconds. Each entry
+remembers the user's 'auth' version, read from the cache shared by all
+workers (see ``CACHES``; gunicorn refuses several workers on a process-local
+cache). Saving or deleting a user bumps that version (see ``signals.py``).
+The worker that saved sees the change on its next request. Other workers see
+it within ``AUTH_VERSION_MEMO_SECONDS``, for which each worker memoizes the
+version it read, so most requests cost neither a query nor a cache read.
+
+With ``JWT_TRUST_CLAIMS_FOR_SAFE_METHODS`` on, a GET/HEAD/OPTIONS request whose
+user is not cached in this worker is served from the token claims, provided
+the shared cache records that the user was loaded as active under the current
+'auth' version. That record also carries ``is_staff`` and ``is_superuser``, so
+admin-only views behave the same on either path. Any save of the user bumps
+the version, and a missing or evicted record only means the row is read from
+the DB once more, so a deactivated user is never let through.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache_utils import bump_version, get_version
+
+_users = {}
+_versions = {}
+
+
+def _claims_key(user_id):
+    return f'fintrack:auth:claims:{user_id}'
+
+
+def forget_user(user) -> None:
+    """Drop a user from every worker's auth cache (call after saving/deleting them)."""
+    _users.pop(str(user.pk), None)
+    _versions.pop(str(user.pk), None)
+    bump_version('auth', user.pk)
+    cache.delete(_claims_key(user.pk))
+
+
+def clear_user_cache() -> None:
+    _users.clear()
+    _versions.clear()
+
+
+def _auth_version(user_id, now):
+    memo = _versions.get(user_id)
+    if memo is not None and memo[0] > now:
+        return memo[1]
+    version = get_version('auth', user_id)
+    _versions[user_id] = (now + settings.AUTH_VERSION_MEMO_SECONDS, version)
+    return version
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        self._safe_method = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            # Tokens may carry the id as a string; the local caches are keyed by str(pk).
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            return super().get_user(validated_token)
+
+        now = time.monotonic()
+        version = _auth_version(user_id, now)
+        entry = _users.get(user_id)
+        if entry is not None and entry[0] > now and entry[1] == version:
+            return entry[2]
+
+        trust_claims = getattr(settings, 'JWT_TRUST_CLAIMS_FOR_SAFE_METHODS', False)
+        if trust_claims and getattr(self, '_safe_method', False):
+            claims = cache.get(_claims_key(user_id))
+            if claims is not None and claims[0] == version:
+                # An unsaved instance is enough for ``filter(user=...)``, ``user.id`` and IsAdminUser.
+                User = get_user_model()
+                return User(pk=User._meta.pk.to_python(user_id), is_active=True, is_staff=claims[1], is_superuser=claims[2])
+
+        user = super().get_user(validated_token)  # refuses inactive users
+        _users[user_id] = (now + settings.AUTH_USER_CACHE_TTL, version, user)
+        if trust_claims:
+            # Stamped with the version read before the row: a save in between bumps it and voids this.
+            cache.set(_claims_key(user_id), (version, user.is_staff, user.is_superuser),
+                      int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+        return user
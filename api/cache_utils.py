@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(namespace, user_id):
+    return f'fintrack:{namespace}:v:{user_id}'
+
+
+def get_version(namespace, user_id):
+    """Current per-user version for a cached namespace (e.g. 'rules', 'data')."""
+    key = _version_key(namespace, user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted key never reuses an old version number.
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(namespace, user_id):
+    """Invalidate everything cached under ``namespace`` for this user."""
+    key = _version_key(namespace, user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def versioned_key(namespace, user_id, *parts):
+    suffix = ':'.join(str(p) for p in parts)
+    return f'fintrack:{namespace}:{user_id}:{get_version(namespace, user_id)}:{suffix}'
@@ -0,0 +1,16 @@
+from typing import List
+
+from django.db import connection
+
+
+def delete_by_ids(model, ids: List[int]) -> None:
+    """
+    ``DELETE ... WHERE id IN (...)`` without QuerySet.delete(): no cascade
+    collection, no signals. Only for callers that have already done the
+    per-row work set-wise, on models nothing references.
+    """
+    if not ids:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from api.models import Budget, Transaction
+from api.models import Budget, Transaction, RecurringTransaction
+from api.services.recurring_service import advance
+from api.services.fx_service import currency_symbol
 from decimal import Decimal
 from django.utils import timezone
 from datetime import timedelta
@@ -106,13 +108,37 @@ class Command(BaseCommand):
                 budget.save()
 
         self.stdout.write(f'✓ Created {len(expense_transactions)} expense transactions')
+
+        # Recurring schedules for the salary and bills above (next run one month on)
+        recurring_data = [
+            {'type': 'income', 'category': 'Salary', 'amount': Decimal('50000'), 'description': 'Monthly Salary', 'days_ago': 28},
+            {'type': 'expense', 'category': 'Entertainment', 'amount': Decimal('300'), 'description': 'Netflix subscription', 'days_ago': 25},
+            {'type': 'expense', 'category': 'Utilities', 'amount': Decimal('1200'), 'description': 'Electricity bill', 'days_ago': 9},
+        ]
+
+        for item in recurring_data:
+            last_run = timezone.now() - timedelta(days=item['days_ago'])
+            _, created = RecurringTransaction.objects.get_or_create(
+                user=user,
+                description=item['description'],
+                defaults={
+                    'type': item['type'],
+                    'category': item['category'],
+                    'amount': item['amount'],
+                    'frequency': 'monthly',
+                    'next_run_at': advance(last_run, 'monthly'),
+                }
+            )
+            if created:
+                self.stdout.write(f'✓ Created recurring schedule: {item["description"]}')
         
         # Calculate totals
         total_income = sum(t['amount'] for t in income_data)
         total_expenses = sum(t['amount'] for t in expense_transactions)
         
         self.stdout.write(self.style.SUCCESS('\n=== Sample Data Added Successfully! ==='))
-        self.stdout.write(f'Total Income: ₹{total_income}')
-        self.stdout.write(f'Total Expenses: ₹{total_expenses}')
-        self.stdout.write(f'Net: ₹{total_income - total_expenses}')
+        symbol = currency_symbol()
+        self.stdout.write(f'Total Income: {symbol}{total_income}')
+        self.stdout.write(f'Total Expenses: {symbol}{total_expenses}')
+        self.stdout.write(f'Net: {symbol}{total_income - total_expenses}')
         self.stdout.write('\nRefresh your dashboard to see the charts populated with data!')
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.services.archive_service import ARCHIVE_BATCH_SIZE, archive_cutoff, archive_transactions
+
+
+class Command(BaseCommand):
+    help = 'Move transactions older than TRANSACTION_ARCHIVE_MONTHS into the archive table, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.TRANSACTION_ARCHIVE_MONTHS)
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be moved')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        totals = archive_transactions(options['months'], options['batch_size'], options['dry_run'])
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {verb} {totals['archived']} transactions dated before "
+            f"{archive_cutoff(options['months']):%Y-%m-%d} for {totals['users']} users "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from api.services.anomaly_service import backfill_statistics, BACKFILL_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-category and per-merchant anomaly statistics from transaction history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this username (default: every user)')
+        parser.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError(f"User '{options['user']}' not found")
+
+        started = time.monotonic()
+        totals = backfill_statistics(user_ids, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Rebuilt statistics for {totals['users']} users from {totals['transactions']} expenses "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
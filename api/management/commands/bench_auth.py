@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import CachedJWTAuthentication, clear_user_cache
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request JWT authentication overhead with and without the user cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to authenticate as (default: first active user)')
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True).order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('No matching active user')
+
+        token = str(AccessToken.for_user(user))
+        factory = RequestFactory()
+        n = options['requests']
+
+        for label, auth_class in (('JWTAuthentication', JWTAuthentication), ('CachedJWTAuthentication', CachedJWTAuthentication)):
+            clear_user_cache()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(n):
+                    request = Request(factory.get('/api/transactions/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                    auth_class().authenticate(request)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label:<25} {elapsed / n * 1e6:8.1f} µs/request  {len(queries) / n:.3f} queries/request'
+            )
+        self.stdout.write(self.style.SUCCESS(f'✓ Authenticated {n} requests per backend as {user.username}'))
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Optional, heavy libraries that only specific endpoints need.
+HEAVY_MODULES = ('reportlab', 'PIL', 'openai', 'google.genai', 'twilio')
+
+# What a worker does before its first response: load the WSGI app and the URLconf.
+WORKER_BOOT = (
+    "import os, sys, json, resource\n"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')\n"
+    "import core.wsgi\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+    "print(json.dumps({\n"
+    "    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,\n"
+    "    'heavy': [m for m in %r if m in sys.modules],\n"
+    "}))\n"
+) % (HEAVY_MODULES,)
+
+
+def parse_importtime(stderr: str):
+    """{top-level module: cumulative µs} and the total self time from ``-X importtime`` output."""
+    top_level, total = {}, 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        if not name.startswith('  '):
+            top_level[name.strip()] = int(cumulative_us)
+    return top_level, total
+
+
+class Command(BaseCommand):
+    help = 'Measure web worker boot (python -X importtime) and check that heavy optional libraries stay unloaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+        parser.add_argument('--check', action='store_true', help=f'Fail if any of {", ".join(HEAVY_MODULES)} is imported')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'PYTHONWARNINGS': 'ignore'}
+        best = None
+        for _ in range(max(1, options['runs'])):
+            started = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', WORKER_BOOT],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            wall = time.perf_counter() - started
+            if proc.returncode != 0:
+                raise CommandError(f'Worker boot failed:\n{proc.stderr[-2000:]}')
+            if best is None or wall < best[0]:
+                best = (wall, proc)
+
+        wall, proc = best
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        top_level, import_us = parse_importtime(proc.stderr)
+        self.stdout.write(f'Worker boot: {wall * 1000:.0f} ms wall, {import_us / 1000:.0f} ms importing, '
+                          f'peak RSS {result["rss_kb"] / 1024:.1f} MiB (best of {options["runs"]})')
+        for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {us / 1000:8.1f} ms  {name}')
+
+        if result['heavy']:
+            message = f'Loaded at boot: {", ".join(result["heavy"])}'
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ None of {", ".join(HEAVY_MODULES)} loaded at boot'))
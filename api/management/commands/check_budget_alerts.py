@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Budget
+from api.services.alert_service import SWEEP_BATCH_SIZE, evaluate_budget_alerts, shard
+
+
+class Command(BaseCommand):
+    help = 'Notify every budget that crossed its alert threshold since the last run (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', help='Only owners in shard K of N, as K/N (e.g. 0/4), to split the sweep')
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        budgets = Budget.objects.all()
+        if options['shard']:
+            try:
+                index, count = (int(part) for part in options['shard'].split('/'))
+            except ValueError:
+                raise CommandError('--shard should look like K/N, e.g. 0/4')
+            if not 0 <= index < count:
+                raise CommandError('--shard K/N needs 0 <= K < N')
+            budgets = shard(budgets, index, count)
+
+        started = time.perf_counter()
+        notifications = evaluate_budget_alerts(budgets, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Sent {len(notifications)} budget alerts in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from api.services.fx_service import base_currency, known_currencies
+from api.services.import_service import (
+    import_statement, detect_format, StatementFormatError,
+    DEFAULT_CHUNK_SIZE, DEFAULT_CATEGORY, SUPPORTED_FORMATS,
+)
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV or OFX bank statement for a user, skipping rows imported before'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=SUPPORTED_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--category', default=DEFAULT_CATEGORY, help='Category for rows without one')
+        parser.add_argument('--currency', help='Currency of the statement (default: base currency)')
+        parser.add_argument('--atomic', action='store_true', help='Roll back the whole import on failure')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' not found")
+
+        fmt = options['format'] or detect_format(options['path'])
+        options['currency'] = (options['currency'] or base_currency()).upper()
+        if options['currency'] != base_currency() and options['currency'] not in known_currencies():
+            raise CommandError(f"No exchange rates are loaded for {options['currency']}")
+
+        def report(result):
+            self.stdout.write(
+                f"  {result['processed']} rows read, {result['imported']} imported, "
+                f"{result['duplicates']} duplicates, {result['error_count']} errors"
+            )
+
+        try:
+            with open(options['path'], 'rb') as fh:
+                if options['atomic']:
+                    with transaction.atomic():
+                        result = self._import(user, fh, fmt, options, report)
+                else:
+                    result = self._import(user, fh, fmt, options, report)
+        except OSError as e:
+            raise CommandError(str(e))
+        except StatementFormatError as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f'  ✗ {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Imported {result['imported']} transactions "
+            f"({result['duplicates']} duplicates skipped, {result['error_count']} rows rejected)"
+        ))
+
+    def _import(self, user, fh, fmt, options, report):
+        return import_statement(
+            user, fh, fmt=fmt,
+            chunk_size=options['chunk_size'],
+            default_category=options['category'],
+            progress=report,
+            currency=options['currency'],
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.fx_service import load_rates, base_currency
+
+
+class Command(BaseCommand):
+    help = 'Load FX rates from a CSV file with date,currency,rate columns (rate = base units per unit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as fh:
+                count = load_rates(fh)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'✓ Loaded {count} rates (base currency {base_currency()})'))
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.forecast_service import precompute_forecast
+
+
+class Command(BaseCommand):
+    help = 'Precompute and cache today\'s spending forecast for every user (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this username')
+
+    def handle(self, *args, **options):
+        if settings.CACHE_BACKEND == 'locmem':
+            # The results would live in this process only and vanish when it exits.
+            raise CommandError('Forecasts are precomputed into the shared cache; set REDIS_URL or use the database cache')
+        users = User.objects.filter(is_active=True, transactions__isnull=False).distinct().order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        started = time.perf_counter()
+        count = 0
+        for user in users.iterator():
+            precompute_forecast(user)
+            count += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✓ Precomputed forecasts for {count} users in {elapsed:.1f}s'))
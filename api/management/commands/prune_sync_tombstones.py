@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.services.sync_service import TOMBSTONE_RETENTION_DAYS, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than the retention window (clients older than that must resync fully)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=TOMBSTONE_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Pruned {deleted} tombstones'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from api.models import CategoryRule
+from api.services.categorization_service import recategorize_all
+
+
+class Command(BaseCommand):
+    help = 'Re-apply categorization rules to existing transactions and fix budget roll-ups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this username (default: every user with rules)')
+        parser.add_argument('--only-uncategorized', action='store_true',
+                            help='Leave transactions that already have a category alone')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' not found")
+        else:
+            users = User.objects.filter(id__in=CategoryRule.objects.values('user_id'))
+
+        total = 0
+        started = time.monotonic()
+        for user in users:
+            changed = recategorize_all(user, only_uncategorized=options['only_uncategorized'])
+            total += changed
+            self.stdout.write(f'  {user.username}: {changed} transactions updated')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Recategorized {total} transactions in {time.monotonic() - started:.1f}s'
+        ))
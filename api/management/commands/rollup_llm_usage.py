@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.services.llm_usage_service import rollup_usage
+
+
+class Command(BaseCommand):
+    help = 'Roll finished days of LLM calls into per-day usage rows and prune old raw calls (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.LLM_CALL_RETENTION_DAYS,
+                            help='Keep raw calls this many days')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        totals = rollup_usage(options['retention_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Rolled up {totals['days']} days into {totals['rows']} rows, pruned {totals['pruned']} calls "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services.recurring_service import materialize_due, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Create transactions for all due recurring schedules (safe to run concurrently)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        totals = materialize_due(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Created {totals['transactions']} transactions from {totals['schedules']} schedules"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_savingsgoal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-date', '-id'], name='api_tx_user_date_idx'),
+        ),
+    ]
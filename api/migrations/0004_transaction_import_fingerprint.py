@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:32
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_transaction_user_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('fingerprint', ''), _negated=True), fields=['user', 'fingerprint'], name='api_tx_user_fingerprint_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_transaction_import_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('substring', 'substring'), ('regex', 'regex'), ('merchant', 'merchant'), ('amount', 'amount')], max_length=20)),
+                ('pattern', models.CharField(blank=True, max_length=200)),
+                ('min_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('category', models.CharField(max_length=100)),
+                ('priority', models.PositiveIntegerField(default=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('priority', 'id'),
+            },
+        ),
+    ]
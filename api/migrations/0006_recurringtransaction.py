@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_categoryrule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('type', models.CharField(choices=[('expense', 'expense'), ('income', 'income')], max_length=10)),
+                ('category', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('daily', 'daily'), ('weekly', 'weekly'), ('monthly', 'monthly'), ('yearly', 'yearly')], default='monthly', max_length=10)),
+                ('next_run_at', models.DateTimeField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['next_run_at'], name='api_recurring_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_recurringtransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MerchantStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant', models.CharField(max_length=100)),
+                ('last_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_date', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='merchant_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'merchant')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_contributions(apps, schema_editor):
+    # Existing balances become one opening contribution dated at goal creation.
+    SavingsGoal = apps.get_model('api', 'SavingsGoal')
+    GoalContribution = apps.get_model('api', 'GoalContribution')
+    GoalContribution.objects.bulk_create([
+        GoalContribution(goal_id=goal_id, amount=amount, created_at=created_at)
+        for goal_id, amount, created_at in
+        SavingsGoal.objects.filter(current_amount__gt=0).values_list('id', 'current_amount', 'created_at')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_anomaly_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalContribution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contributions', to='api.savingsgoal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['goal', 'created_at'], name='api_goal_contrib_idx')],
+            },
+        ),
+        migrations.RunPython(seed_contributions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:46
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_goalcontribution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='currency',
+            field=models.CharField(default=api.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(default=api.models.default_currency, max_length=3),
+        ),
+        migrations.CreateModel(
+            name='FxRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+            ],
+            options={
+                'unique_together': {('currency', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_households'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('transaction', 'transaction'), ('budget', 'budget'), ('goal', 'goal')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='savingsgoal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'updated_at'], name='api_budget_user_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['household', 'updated_at'], name='api_budget_household_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savingsgoal',
+            index=models.Index(fields=['user', 'updated_at'], name='api_goal_user_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savingsgoal',
+            index=models.Index(fields=['household', 'updated_at'], name='api_goal_household_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'updated_at'], name='api_tx_user_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['household', 'updated_at'], name='api_tx_household_sync_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.household'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='api_tombstone_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['household', 'deleted_at'], name='api_tombstone_household_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at'], name='api_tombstone_deleted_idx'),
+        ),
+    ]
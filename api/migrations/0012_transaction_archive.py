@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(max_length=3)),
+                ('type', models.CharField(choices=[('expense', 'expense'), ('income', 'income')], max_length=10)),
+                ('category', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('fingerprint', models.CharField(blank=True, default='', max_length=40)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('household', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.household')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='api_archive_user_date_idx'), models.Index(condition=models.Q(('household__isnull', False)), fields=['household', 'date'], name='api_archive_household_date_idx'), models.Index(condition=models.Q(('fingerprint', ''), _negated=True), fields=['user', 'fingerprint'], name='api_archive_fingerprint_idx'), models.Index(fields=['date'], name='api_archive_date_idx')],
+            },
+        ),
+    ]
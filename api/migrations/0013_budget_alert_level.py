@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+
+
+def seed_alert_levels(apps, schema_editor):
+    # Budgets already over their threshold were alerted by the old inline checks;
+    # start them at their current level so the first sweep doesn't repeat it.
+    Budget = apps.get_model('api', 'Budget')
+    limited = Q(limit_amount__gt=0)
+    Budget.objects.update(alert_level=Case(
+        When(limited & Q(spent_amount__gt=F('limit_amount')), then=Value(2)),
+        When(limited & GreaterThanOrEqual(F('spent_amount') * 100, F('limit_amount') * F('alert_threshold')), then=Value(1)),
+        default=Value(0),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='alert_level',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(seed_alert_levels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_budget_alert_level'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(max_length=20)),
+                ('provider', models.CharField(max_length=20)),
+                ('model', models.CharField(blank=True, default='', max_length=50)),
+                ('outcome', models.CharField(choices=[('ok', 'ok'), ('fallback', 'fallback'), ('demo', 'demo')], max_length=10)),
+                ('chain', models.CharField(blank=True, default='', max_length=200)),
+                ('latency_ms', models.PositiveIntegerField()),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='api_llmcall_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LLMUsageDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('operation', models.CharField(max_length=20)),
+                ('provider', models.CharField(max_length=20)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('fallbacks', models.PositiveIntegerField(default=0)),
+                ('demos', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('completion_tokens', models.PositiveBigIntegerField(default=0)),
+                ('cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=14)),
+                ('latency_histogram', models.JSONField(default=list)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='api_llmusage_day_idx')],
+            },
+        ),
+    ]
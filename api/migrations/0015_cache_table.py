@@ -0,0 +1,23 @@
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import migrations
+
+CACHE_TABLE = 'fintrack_cache'
+
+
+def create_cache_table(apps, schema_editor):
+    # Created whatever cache is configured right now, so switching to
+    # CACHE_BACKEND=database later never finds the table missing.
+    command = CreateCacheTable()
+    command.verbosity = 0
+    command.create_table(schema_editor.connection.alias, CACHE_TABLE, dry_run=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_llm_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
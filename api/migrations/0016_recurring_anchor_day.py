@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_anchor_days(apps, schema_editor):
+    # The original day is lost for rules that already clamped; keep their current one.
+    RecurringTransaction = apps.get_model('api', 'RecurringTransaction')
+    schedules = list(RecurringTransaction.objects.only('id', 'next_run_at'))
+    for schedule in schedules:
+        schedule.anchor_day = timezone.localtime(schedule.next_run_at).day
+    RecurringTransaction.objects.bulk_update(schedules, ['anchor_day'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='anchor_day',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(seed_anchor_days, migrations.RunPython.noop),
+    ]
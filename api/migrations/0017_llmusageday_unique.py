@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+COUNTERS = ('calls', 'fallbacks', 'demos', 'prompt_tokens', 'completion_tokens', 'cost_usd')
+
+
+def merge_duplicate_days(apps, schema_editor):
+    # Overlapping rollup runs could write the same day twice; fold those rows together.
+    LLMUsageDay = apps.get_model('api', 'LLMUsageDay')
+    keys = ('day', 'user_id', 'operation', 'provider')
+    duplicated = LLMUsageDay.objects.values(*keys).annotate(n=Count('id')).filter(n__gt=1)
+    for key in duplicated:
+        rows = list(LLMUsageDay.objects.filter(**{k: key[k] for k in keys}).order_by('id'))
+        keep = rows[0]
+        for row in rows[1:]:
+            for field in COUNTERS:
+                setattr(keep, field, getattr(keep, field) + getattr(row, field))
+            keep.latency_histogram = [a + b for a, b in zip(keep.latency_histogram, row.latency_histogram)]
+        keep.save()
+        LLMUsageDay.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_recurring_anchor_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='llmusageday',
+            constraint=models.UniqueConstraint(fields=('day', 'user', 'operation', 'provider'), name='api_llmusage_day_key_uniq'),
+        ),
+    ]
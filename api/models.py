@@ -1,19 +1,65 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
+
+def default_currency():
+    return settings.BASE_CURRENCY
+
+
+class Household(models.Model):
+    """Shared ledger: budgets, transactions and goals visible to every member"""
+    name = models.CharField(max_length=100)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class HouseholdMembership(models.Model):
+    ROLE_CHOICES = (('owner', 'owner'), ('member', 'member'))
+
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='household_memberships')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='member')
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('household', 'user')
+
+    def __str__(self):
+        return f'{self.user.username} in {self.household.name}'
+
+
 class Budget(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    # Personal budgets have a user; household budgets have a household instead.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets', null=True, blank=True)
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='budgets', null=True, blank=True)
     category = models.CharField(max_length=100)
+    # limit_amount and spent_amount are both in this currency
+    currency = models.CharField(max_length=3, default=default_currency)
     limit_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     spent_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     alert_threshold = models.PositiveIntegerField(default=80)
+    # Highest alert level already notified (see alert_service): 0 none, 1 threshold, 2 over limit
+    alert_level = models.PositiveSmallIntegerField(default=0)
+    # Maintained on every write, including queryset updates; drives /api/sync/
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('user', 'category')
+        unique_together = (('user', 'category'), ('household', 'category'))
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='api_budget_user_sync_idx'),
+            models.Index(fields=['household', 'updated_at'], name='api_budget_household_sync_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.user.username} - {self.category}'
+        owner = self.household.name if self.household_id else self.user.username
+        return f'{owner} - {self.category}'
 
 
 class SavingsGoal(models.Model):
@@ -32,6 +78,7 @@ class SavingsGoal(models.Model):
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='savings_goals')
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='savings_goals', null=True, blank=True)
     name = models.CharField(max_length=100)
     target_amount = models.DecimalField(max_digits=12, decimal_places=2)
     current_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -39,6 +86,13 @@ class SavingsGoal(models.Model):
     color = models.CharField(max_length=20, default='#6366f1')  # Accent color for the goal
     deadline = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='api_goal_user_sync_idx'),
+            models.Index(fields=['household', 'updated_at'], name='api_goal_household_sync_idx'),
+        ]
     
     @property
     def progress_percent(self):
@@ -58,19 +112,215 @@ class SavingsGoal(models.Model):
         return f'{self.user.username} - {self.name}'
 
 
+class GoalContribution(models.Model):
+    """One deposit into (or withdrawal from) a savings goal"""
+    goal = models.ForeignKey(SavingsGoal, on_delete=models.CASCADE, related_name='contributions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['goal', 'created_at'], name='api_goal_contrib_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.goal.name} +{self.amount}'
+
+
 class Transaction(models.Model):
     TYPE_CHOICES = (('expense', 'expense'), ('income', 'income'))
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
-    date = models.DateTimeField(auto_now_add=True)
+    # Set when posted to a shared household ledger; NULL is the user's personal ledger
+    household = models.ForeignKey(
+        Household, on_delete=models.CASCADE, related_name='transactions', null=True, blank=True,
+    )
+    date = models.DateTimeField(default=timezone.now)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default=default_currency)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     category = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Set for statement imports only: hash of (date, type, amount, description)
+    fingerprint = models.CharField(max_length=40, blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='api_tx_user_sync_idx'),
+            models.Index(fields=['household', 'updated_at'], name='api_tx_household_sync_idx'),
+            models.Index(fields=['user', '-date', '-id'], name='api_tx_user_date_idx'),
+            models.Index(
+                fields=['user', 'fingerprint'], name='api_tx_user_fingerprint_idx',
+                condition=~Q(fingerprint=''),
+            ),
+            models.Index(
+                fields=['household', '-date', '-id'], name='api_tx_household_date_idx',
+                condition=Q(household__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.type} {self.amount} {self.category}'
 
+class ArchivedTransaction(models.Model):
+    """Transactions moved out of the hot table by ``archive_transactions``; ids are kept"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    date = models.DateTimeField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    category = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    fingerprint = models.CharField(max_length=40, blank=True, default='')
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Read-mostly, so only the indexes the history queries need.
+        indexes = [
+            models.Index(fields=['user', 'date'], name='api_archive_user_date_idx'),
+            models.Index(
+                fields=['household', 'date'], name='api_archive_household_date_idx',
+                condition=Q(household__isnull=False),
+            ),
+            models.Index(
+                fields=['user', 'fingerprint'], name='api_archive_fingerprint_idx',
+                condition=~Q(fingerprint=''),
+            ),
+            models.Index(fields=['date'], name='api_archive_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.type} {self.amount} {self.category} (archived)'
+
+class RecurringTransaction(models.Model):
+    """Schedule that materializes a transaction every period (salary, bills, subscriptions)"""
+    FREQUENCY_CHOICES = (
+        ('daily', 'daily'),
+        ('weekly', 'weekly'),
+        ('monthly', 'monthly'),
+        ('yearly', 'yearly'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_transactions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    category = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='monthly')
+    next_run_at = models.DateTimeField()
+    # Local day of month that monthly/yearly occurrences fall on; short months
+    # clamp to their last day without moving the anchor.
+    anchor_day = models.PositiveSmallIntegerField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_run_at'], name='api_recurring_due_idx', condition=Q(is_active=True)),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.frequency} {self.description or self.category}'
+
+    def save(self, *args, **kwargs):
+        if self.anchor_day is None and self.next_run_at is not None:
+            self.anchor_day = timezone.localtime(self.next_run_at).day
+        super().save(*args, **kwargs)
+
+
+class CategoryRule(models.Model):
+    """User-defined rule that assigns a category to matching transactions"""
+    KIND_CHOICES = (
+        ('substring', 'substring'),
+        ('regex', 'regex'),
+        ('merchant', 'merchant'),
+        ('amount', 'amount'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_rules')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    pattern = models.CharField(max_length=200, blank=True)
+    min_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    category = models.CharField(max_length=100)
+    priority = models.PositiveIntegerField(default=100)  # Lower wins
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('priority', 'id')
+
+    def __str__(self):
+        return f'{self.user.username} - {self.kind} -> {self.category}'
+
+class CategoryStats(models.Model):
+    """Running expense statistics per category (Welford), used to spot outliers"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_stats')
+    category = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)  # Sum of squared deviations from the mean
+
+    class Meta:
+        unique_together = ('user', 'category')
+
+    def __str__(self):
+        return f'{self.user.username} - {self.category} (n={self.count})'
+
+
+class MerchantStats(models.Model):
+    """Last expense seen per normalized merchant name, used to spot duplicate charges"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='merchant_stats')
+    merchant = models.CharField(max_length=100)
+    last_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    last_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'merchant')
+
+    def __str__(self):
+        return f'{self.user.username} - {self.merchant}'
+
+
+class FxRate(models.Model):
+    """Units of the base currency per one unit of ``currency`` on ``date``"""
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+
+    class Meta:
+        unique_together = ('currency', 'date')
+
+    def __str__(self):
+        return f'{self.currency} {self.date}: {self.rate}'
+
+
+class Tombstone(models.Model):
+    """Marks a deleted transaction, budget or goal so sync clients can drop it"""
+    KIND_CHOICES = (('transaction', 'transaction'), ('budget', 'budget'), ('goal', 'goal'))
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # No FK constraints: the owner may be going away in the same cascade.
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    household = models.ForeignKey(Household, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='api_tombstone_user_idx'),
+            models.Index(fields=['household', 'deleted_at'], name='api_tombstone_household_idx'),
+            models.Index(fields=['deleted_at'], name='api_tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} deleted'
+
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
@@ -79,3 +329,53 @@ class Notification(models.Model):
 
     def __str__(self):
         return f'{self.type} for {self.user.username}'
+
+
+class LLMCall(models.Model):
+    """One AI request (insight or receipt scan), append-only; rolled into LLMUsageDay and pruned"""
+    OUTCOME_CHOICES = (('ok', 'ok'), ('fallback', 'fallback'), ('demo', 'demo'))
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    operation = models.CharField(max_length=20)
+    # The provider and model that answered; 'rules' or 'demo' when none did
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=50, blank=True, default='')
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES)
+    # Every provider tried, in order: "openai:error:1200>gemini:ok:850" (outcome:ms)
+    chain = models.CharField(max_length=200, blank=True, default='')
+    latency_ms = models.PositiveIntegerField()
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at'], name='api_llmcall_created_idx')]
+
+    def __str__(self):
+        return f'{self.operation} via {self.provider} ({self.outcome})'
+
+
+class LLMUsageDay(models.Model):
+    """Per-day totals of LLMCall by user, operation and provider, kept after the raw calls are pruned"""
+    day = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    operation = models.CharField(max_length=20)
+    provider = models.CharField(max_length=20)
+    calls = models.PositiveIntegerField(default=0)
+    fallbacks = models.PositiveIntegerField(default=0)
+    demos = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=14, decimal_places=6, default=0)
+    # Call counts per latency bucket (llm_usage_service.LATENCY_BUCKETS_MS), for percentiles
+    latency_histogram = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [models.Index(fields=['day'], name='api_llmusage_day_idx')]
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'operation', 'provider'], name='api_llmusage_day_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.operation} via {self.provider}: {self.calls} calls'
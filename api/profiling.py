@@ -0,0 +1,191 @@
+"""
+On-demand request profiling for staff.
+
+A staff user adds the ``X-Fintrack-Profile`` header (or ``?_profile=1``) to
+any request. The request then runs under pyinstrument when it is installed,
+or cProfile otherwise, and every SQL statement is logged with its duration.
+The result goes into ``REQUEST_PROFILE_DIR``, which keeps only the newest
+``REQUEST_PROFILE_KEEP`` captures. The response carries an
+``X-Profile-Id`` header, and captures are listed and downloaded at
+``/api/profiles/``. Ask for ``cprofile`` as the header or parameter value to
+get a pstats file even when pyinstrument is available.
+
+Requests without the header or parameter pay for one dict lookup and one
+substring test.
+"""
+import cProfile
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_FINTRACK_PROFILE'
+PROFILE_PARAM = '_profile='
+MAX_LOGGED_SQL = 2000
+FORMATS = {'pstats': '.prof', 'pyinstrument': '.html'}
+
+
+def _get_pyinstrument():
+    try:
+        from pyinstrument import Profiler
+        return Profiler
+    except ImportError:
+        return None
+
+
+def profile_dir() -> Path:
+    return Path(settings.REQUEST_PROFILE_DIR)
+
+
+def _meta_path(profile_id: str) -> Path:
+    return profile_dir() / f'{profile_id}.json'
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Stored captures, newest first."""
+    entries = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            meta = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        meta.pop('queries', None)
+        entries.append(meta)
+    return entries
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    # Ids are generated here; anything else (e.g. '../') is not a capture.
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        return json.loads(_meta_path(profile_id).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def profile_file(meta: Dict[str, Any]) -> Path:
+    return profile_dir() / f"{meta['id']}{FORMATS[meta['format']]}"
+
+
+def _prune(keep: int) -> None:
+    metas = sorted(profile_dir().glob('*.json'), reverse=True)
+    for path in metas[keep:]:
+        for suffix in ('.json', *FORMATS.values()):
+            try:
+                path.with_suffix(suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+
+class _QueryLog:
+    """``connection.execute_wrapper`` that records every statement and its time."""
+
+    def __init__(self, alias: str):
+        self.alias = alias
+        self.queries: List[Dict[str, Any]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < MAX_LOGGED_SQL:
+                self.queries.append({
+                    'db': self.alias,
+                    'sql': sql,
+                    'ms': round((time.perf_counter() - started) * 1000, 3),
+                    'many': many,
+                })
+
+
+def _staff_user(request):
+    """The active staff user behind a session or a JWT, else None."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # API clients authenticate with a JWT inside DRF, after middleware runs.
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = result[0] if result else None
+    return user if user is not None and user.is_active and user.is_staff else None
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_HEADER not in request.META and PROFILE_PARAM not in request.META.get('QUERY_STRING', ''):
+            return self.get_response(request)
+        user = _staff_user(request)
+        if user is None:
+            return self.get_response(request)
+        return self._profile(request, user)
+
+    def _profile(self, request, user):
+        mode = request.META.get(PROFILE_HEADER) or request.GET.get('_profile', '')
+        sampler = None if mode.lower() == 'cprofile' else _get_pyinstrument()
+        profiler = sampler() if sampler else cProfile.Profile()
+        logs = [_QueryLog(conn.alias) for conn in connections.all()]
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for conn, log in zip(connections.all(), logs):
+                stack.enter_context(conn.execute_wrapper(log))
+            if sampler:
+                profiler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.stop()
+            else:
+                response = profiler.runcall(self.get_response, request)
+        elapsed = time.perf_counter() - started
+
+        profile_id = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+        queries = [q for log in logs for q in log.queries]
+        meta = {
+            'id': profile_id,
+            'format': 'pyinstrument' if sampler else 'pstats',
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user_id': user.pk,
+            'duration_ms': round(elapsed * 1000, 1),
+            'query_count': len(queries),
+            'query_ms': round(sum(q['ms'] for q in queries), 1),
+            'captured_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'queries': queries,
+        }
+        try:
+            directory = profile_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            if sampler:
+                profile_file(meta).write_text(profiler.output_html())
+            else:
+                profiler.dump_stats(os.fspath(profile_file(meta)))
+            # The .json is written last; a capture only shows up once complete.
+            _meta_path(profile_id).write_text(json.dumps(meta))
+            _prune(settings.REQUEST_PROFILE_KEEP)
+        except OSError:
+            logger.exception('Could not store request profile')
+            return response
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -1,6 +1,24 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Budget, Transaction, Notification
+from django.utils import timezone
+from .models import Budget, Transaction, Notification, CategoryRule, RecurringTransaction, Household, SavingsGoal
+from .services.categorization_service import validate_pattern
+from .services.fx_service import known_currencies
+from .services.household_service import get_ledger_scope
+
+def clean_currency(value):
+    value = value.upper()
+    if value not in known_currencies():
+        raise serializers.ValidationError(f'No FX rates loaded for {value}.')
+    return value
+
+class LedgerFieldMixin:
+    """Validates an optional ``household`` against the request user's memberships."""
+
+    def validate_household(self, value):
+        if value is not None and not get_ledger_scope(self.context['request']).can_post_to(value.id):
+            raise serializers.ValidationError('You are not a member of this household.')
+        return value
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=6)
@@ -16,17 +34,140 @@ class RegisterSerializer(serializers.ModelSerializer):
             password=validated_data['password']
         )
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(LedgerFieldMixin, serializers.ModelSerializer):
+    currency = serializers.CharField(max_length=3, required=False)
+    household = serializers.PrimaryKeyRelatedField(queryset=Household.objects.all(), required=False, allow_null=True)
+
     class Meta:
         model = Budget
-        fields = ('id', 'category', 'limit_amount', 'spent_amount', 'alert_threshold')
+        fields = ('id', 'category', 'household', 'currency', 'limit_amount', 'spent_amount', 'alert_threshold', 'updated_at')
+        read_only_fields = ('updated_at',)
+        extra_kwargs = {
+            'limit_amount': {'min_value': 0},
+            'alert_threshold': {'min_value': 1, 'max_value': 100},
+        }
+        # Creating a budget for an existing category updates it (see the view).
+        validators = []
+
+    def validate_currency(self, value):
+        return clean_currency(value)
+
+class BudgetEntrySerializer(serializers.Serializer):
+    category = serializers.CharField(max_length=100)
+    limit_amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0)
+    alert_threshold = serializers.IntegerField(min_value=1, max_value=100, default=80)
+    currency = serializers.CharField(max_length=3, required=False)
+
+    def validate_currency(self, value):
+        return clean_currency(value)
+
+class BudgetBulkSerializer(LedgerFieldMixin, serializers.Serializer):
+    household = serializers.PrimaryKeyRelatedField(queryset=Household.objects.all(), required=False, allow_null=True)
+    budgets = BudgetEntrySerializer(many=True, allow_empty=False, max_length=500)
+
+class TransactionSerializer(LedgerFieldMixin, serializers.ModelSerializer):
+    # Left blank, the category comes from the user's categorization rules
+    category = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    currency = serializers.CharField(max_length=3, required=False)
+    household = serializers.PrimaryKeyRelatedField(queryset=Household.objects.all(), required=False, allow_null=True)
 
-class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
-        fields = ('id', 'date', 'amount', 'type', 'category', 'description')
+        fields = ('id', 'date', 'amount', 'currency', 'type', 'category', 'description', 'household', 'updated_at')
+        read_only_fields = ('date', 'updated_at')
+
+    def validate_currency(self, value):
+        return clean_currency(value)
+
+class TransactionBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=10000)
+    category = serializers.CharField(max_length=100, required=False)
+    type = serializers.ChoiceField(choices=Transaction.TYPE_CHOICES, required=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('Give at least one filter; deleting everything needs ids.')
+        return attrs
+
+class SavingsGoalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavingsGoal
+        fields = (
+            'id', 'household', 'name', 'target_amount', 'current_amount', 'icon', 'color',
+            'deadline', 'created_at', 'updated_at',
+        )
+        read_only_fields = fields
+
+class TransactionSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    type = serializers.ChoiceField(choices=Transaction.TYPE_CHOICES, required=False)
+    min_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+    cursor = serializers.CharField(required=False, max_length=500)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=20)
+
+class RecurringTransactionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringTransaction
+        fields = (
+            'id', 'amount', 'type', 'category', 'description', 'frequency',
+            'next_run_at', 'anchor_day', 'end_date', 'is_active', 'created_at',
+        )
+        read_only_fields = ('anchor_day', 'created_at')
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Amount must be greater than zero.')
+        return value
+
+    def validate(self, attrs):
+        if 'next_run_at' in attrs:
+            # A rescheduled rule recurs on its new day of the month.
+            attrs['anchor_day'] = timezone.localtime(attrs['next_run_at']).day
+        return attrs
+
+class CategoryRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategoryRule
+        fields = ('id', 'kind', 'pattern', 'min_amount', 'max_amount', 'category', 'priority', 'created_at')
+        read_only_fields = ('created_at',)
+
+    def validate(self, attrs):
+        kind = attrs.get('kind', getattr(self.instance, 'kind', None))
+        pattern = attrs.get('pattern', getattr(self.instance, 'pattern', ''))
+        try:
+            validate_pattern(kind, pattern)
+        except ValueError as e:
+            raise serializers.ValidationError({'pattern': str(e)})
+        if kind == 'amount':
+            low = attrs.get('min_amount', getattr(self.instance, 'min_amount', None))
+            high = attrs.get('max_amount', getattr(self.instance, 'max_amount', None))
+            if low is None and high is None:
+                raise serializers.ValidationError({'min_amount': 'Amount rules need a minimum or maximum.'})
+            if low is not None and high is not None and low > high:
+                raise serializers.ValidationError({'max_amount': 'Maximum must not be below minimum.'})
+        return attrs
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ('id', 'message', 'type', 'created_at')
+
+class HouseholdSerializer(serializers.ModelSerializer):
+    members = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Household
+        fields = ('id', 'name', 'created_at', 'members')
+        read_only_fields = ('created_at',)
+
+    def get_members(self, obj):
+        # Uses the prefetched memberships, so listing households is not N+1.
+        return [
+            {'id': m.user_id, 'username': m.user.username, 'role': m.role}
+            for m in obj.memberships.all()
+        ]
@@ -0,0 +1,140 @@
+"""
+Budget threshold alerts.
+
+Each budget's alert level is computed in SQL: 0 below its threshold, 1 at or
+over the threshold, 2 over the limit. The level already notified is stored
+on the budget, and ``evaluate_budget_alerts`` only reads rows where the two
+differ. A rise is a crossing and gets one notification (to the owner, or to
+every member of a household). A drop (refund, edit, higher limit) re-arms
+the budget quietly. Every budget is then alerted once per crossing, not once
+per expense.
+
+The same function is the inline fast path (pass the budgets a write just
+touched) and the periodic sweep (``check_budget_alerts`` command, optionally
+one shard of owners). The sweep is a keyset walk over the rows that differ;
+on Postgres that is one sequential scan of the table. Notifications and
+level updates are written in bulk per batch.
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Floor, Mod
+from django.db.models.lookups import GreaterThanOrEqual
+
+from ..models import Budget, HouseholdMembership, Notification
+from .fx_service import currency_symbol
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 5000
+
+BELOW, AT_THRESHOLD, OVER_LIMIT = 0, 1, 2
+
+_limited = Q(limit_amount__gt=0)
+
+
+def utilization_expression():
+    """Whole percent of the limit spent (0 for budgets without a limit), computed in SQL."""
+    return Case(
+        When(_limited, then=Cast(Floor(F('spent_amount') * 100 / F('limit_amount')), IntegerField())),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def alert_level_expression():
+    return Case(
+        When(_limited & Q(spent_amount__gt=F('limit_amount')), then=Value(OVER_LIMIT)),
+        # spent / limit >= threshold%, without a division
+        When(_limited & GreaterThanOrEqual(F('spent_amount') * 100, F('limit_amount') * F('alert_threshold')),
+             then=Value(AT_THRESHOLD)),
+        default=Value(BELOW),
+        output_field=IntegerField(),
+    )
+
+
+def with_alert_levels(budgets):
+    return budgets.annotate(utilization_pct=utilization_expression(), level=alert_level_expression())
+
+
+def shard(budgets, index: int, count: int):
+    """Budgets whose owner (household, else user) falls in shard ``index`` of ``count``."""
+    return budgets.annotate(owner_shard=Mod(Coalesce('household_id', 'user_id'), count)).filter(owner_shard=index)
+
+
+def alert_message(budget: Dict) -> str:
+    symbol = currency_symbol(budget['currency'])
+    amounts = f"({symbol}{budget['spent_amount']}/{symbol}{budget['limit_amount']})"
+    if budget['level'] == OVER_LIMIT:
+        return f"Budget alert: {budget['category']} budget exceeded, {budget['utilization_pct']}% used {amounts}"
+    return f"Budget alert: {budget['utilization_pct']}% of {budget['category']} budget used {amounts}"
+
+
+def _recipients(rows) -> Dict[int, List[int]]:
+    household_ids = {row['household_id'] for row in rows if row['household_id']}
+    members = defaultdict(list)
+    if household_ids:
+        for household_id, user_id in HouseholdMembership.objects.filter(
+            household_id__in=household_ids,
+        ).values_list('household_id', 'user_id'):
+            members[household_id].append(user_id)
+    return members
+
+
+def _apply(rows) -> List[Notification]:
+    members = _recipients(rows)
+    notifications = []
+    by_level = defaultdict(list)
+    for row in rows:
+        by_level[row['level']].append(row['id'])
+        if row['level'] > row['alert_level']:
+            message = alert_message(row)
+            for user_id in members[row['household_id']] if row['household_id'] else [row['user_id']]:
+                notifications.append(Notification(user_id=user_id, type='budget_alert', message=message))
+    # The level is bookkeeping, not a budget change: updated_at (and sync) stay as they are.
+    for level, ids in by_level.items():
+        Budget.objects.filter(pk__in=ids).update(alert_level=level)
+    return Notification.objects.bulk_create(notifications)
+
+
+def evaluate_budget_alerts(budgets=None, batch_size: int = SWEEP_BATCH_SIZE) -> List[Notification]:
+    """
+    Notify every budget in ``budgets`` (default: all) that crossed to a higher
+    alert level since it was last evaluated, and re-arm those that dropped.
+
+    Returns the notifications created. Rows are locked per batch with
+    SKIP LOCKED where supported, so the sweep and the inline path never
+    notify the same crossing twice.
+    """
+    budgets = Budget.objects.all() if budgets is None else budgets
+    changed = with_alert_levels(budgets).exclude(level=F('alert_level'))
+    created = []
+    last_id = evaluated = 0
+    while True:
+        with db_transaction.atomic():
+            rows = list(
+                changed.filter(pk__gt=last_id).order_by('pk').select_for_update(skip_locked=True, of=('self',))
+                .values('id', 'user_id', 'household_id', 'category', 'currency', 'limit_amount',
+                        'spent_amount', 'alert_level', 'utilization_pct', 'level')[:batch_size]
+            )
+            if not rows:
+                break
+            created.extend(_apply(rows))
+        last_id = rows[-1]['id']
+        evaluated += len(rows)
+        if len(rows) < batch_size:
+            break
+    if evaluated > batch_size:
+        logger.info(f'Budget alert sweep: {evaluated} level changes, {len(created)} notifications')
+    return created
+
+
+def check_budget_alerts(budgets: List[Budget]) -> List[Notification]:
+    """Inline fast path after a write: evaluate just these budgets."""
+    ids = [budget.pk for budget in budgets if budget is not None]
+    if not ids:
+        return []
+    return evaluate_budget_alerts(Budget.objects.filter(pk__in=ids))
@@ -0,0 +1,280 @@
+"""
+Anomaly detection.
+
+Every expense updates two small rows in O(1): the running count, mean and M2
+of its (user, category) in the base currency using Welford's algorithm, and
+the last amount seen at its merchant. Before an expense is folded into the statistics it is checked
+against them: far above the category's norm, or the same amount charged by the
+same merchant a short while earlier, raises an ``anomaly`` notification.
+``backfill_statistics`` rebuilds all rows from history in one streaming pass.
+"""
+import heapq
+import logging
+import math
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import ArchivedTransaction, CategoryStats, MerchantStats, Notification, Transaction
+from .categorization_service import normalize_merchant
+from .fx_service import currency_symbol, to_base
+
+logger = logging.getLogger(__name__)
+
+Z_THRESHOLD = 5.0
+MIN_SAMPLES = 10
+# Floor on the standard deviation as a fraction of the mean, so a category of
+# identical charges (rent, subscriptions) does not flag every small change.
+MIN_RELATIVE_STD = 0.1
+DUPLICATE_WINDOW = timedelta(days=3)
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def welford_add(count: int, mean: float, m2: float, value: float):
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+
+def welford_remove(count: int, mean: float, m2: float, value: float):
+    if count <= 1:
+        return 0, 0.0, 0.0
+    new_mean = (count * mean - value) / (count - 1)
+    m2 -= (value - mean) * (value - new_mean)
+    return count - 1, new_mean, max(m2, 0.0)
+
+
+def z_score(stats: CategoryStats, value: float) -> Optional[float]:
+    """Standard deviations ``value`` lies above the category mean, or None with too little history."""
+    if stats.count < MIN_SAMPLES:
+        return None
+    std = max(math.sqrt(stats.m2 / (stats.count - 1)), abs(stats.mean) * MIN_RELATIVE_STD)
+    if std <= 0:
+        return None
+    return (value - stats.mean) / std
+
+
+def merchant_key(description: str) -> str:
+    return normalize_merchant(description)[:100]
+
+
+def _scope(keys, field: str) -> Q:
+    by_user = defaultdict(set)
+    for user_id, value in keys:
+        by_user[user_id].add(value)
+    scope = Q()
+    for user_id, values in by_user.items():
+        scope |= Q(user_id=user_id, **{f'{field}__in': values})
+    return scope
+
+
+def record_expenses(transactions: Iterable[Transaction], notify: bool = True) -> List[Notification]:
+    """
+    Fold newly written expenses into the statistics and flag anomalies.
+
+    Works for one transaction or a bulk-created batch across users with a
+    fixed number of queries; rows are locked so concurrent writers serialize.
+    Returns the anomaly notifications created.
+    """
+    expenses = sorted(
+        (tx for tx in transactions if tx.type == 'expense'),
+        key=lambda tx: (tx.date, tx.pk or 0),
+    )
+    if not expenses:
+        return []
+    base_amounts = to_base(
+        [tx.amount for tx in expenses], [tx.currency for tx in expenses], [tx.date for tx in expenses],
+    )
+    pairs = [(tx, merchant_key(tx.description)) for tx in expenses]
+    stat_keys = {(tx.user_id, tx.category) for tx in expenses}
+    merchant_keys = {(tx.user_id, merchant) for tx, merchant in pairs if merchant}
+
+    with db_transaction.atomic():
+        CategoryStats.objects.bulk_create(
+            [CategoryStats(user_id=user_id, category=category) for user_id, category in stat_keys],
+            ignore_conflicts=True,
+        )
+        stats = {
+            (row.user_id, row.category): row
+            for row in CategoryStats.objects.select_for_update().filter(_scope(stat_keys, 'category'))
+        }
+        merchants = {
+            (row.user_id, row.merchant): row
+            for row in MerchantStats.objects.select_for_update().filter(_scope(merchant_keys, 'merchant'))
+        } if merchant_keys else {}
+        new_merchants = {}
+        notifications = []
+
+        for (tx, merchant), value in zip(pairs, base_amounts):
+            value = float(value)
+            row = stats[(tx.user_id, tx.category)]
+            score = z_score(row, value)
+            if notify and score is not None and score >= Z_THRESHOLD:
+                notifications.append(Notification(
+                    user_id=tx.user_id,
+                    type='anomaly',
+                    message=(
+                        f'Unusual expense: {currency_symbol(tx.currency)}{tx.amount:,.0f} on {tx.category} '
+                        f'is far above your usual {currency_symbol()}{row.mean:,.0f}'
+                    ),
+                ))
+            row.count, row.mean, row.m2 = welford_add(row.count, row.mean, row.m2, value)
+
+            if not merchant:
+                continue
+            key = (tx.user_id, merchant)
+            seen = merchants.get(key)
+            if seen is None:
+                merchants[key] = new_merchants[key] = MerchantStats(
+                    user_id=tx.user_id, merchant=merchant, last_amount=tx.amount, last_date=tx.date,
+                )
+                continue
+            if notify and seen.last_amount == tx.amount and abs(tx.date - seen.last_date) <= DUPLICATE_WINDOW:
+                notifications.append(Notification(
+                    user_id=tx.user_id,
+                    type='anomaly',
+                    message=(
+                        f'Possible duplicate charge: {currency_symbol(tx.currency)}{tx.amount:,.0f} '
+                        f'at {tx.description or merchant} was also charged on {timezone.localtime(seen.last_date):%d %b}'
+                    ),
+                ))
+            seen.last_amount, seen.last_date = tx.amount, tx.date
+
+        CategoryStats.objects.bulk_update(list(stats.values()), ['count', 'mean', 'm2'])
+        existing = [row for key, row in merchants.items() if key not in new_merchants]
+        MerchantStats.objects.bulk_update(existing, ['last_amount', 'last_date'])
+        MerchantStats.objects.bulk_create(
+            list(new_merchants.values()),
+            update_conflicts=True,
+            unique_fields=['user', 'merchant'],
+            update_fields=['last_amount', 'last_date'],
+        )
+        return Notification.objects.bulk_create(notifications)
+
+
+def forget_expense(tx: Transaction) -> None:
+    """Take a deleted expense back out of its category statistics."""
+    forget_expenses([tx])
+
+
+def forget_expenses(transactions: Iterable[Transaction]) -> None:
+    """Take many expenses back out of their category statistics with a fixed number of queries."""
+    expenses = [tx for tx in transactions if tx.type == 'expense']
+    if not expenses:
+        return
+    values = to_base([tx.amount for tx in expenses], [tx.currency for tx in expenses], [tx.date for tx in expenses])
+    with db_transaction.atomic():
+        stats = {
+            (row.user_id, row.category): row
+            for row in CategoryStats.objects.select_for_update().filter(
+                _scope({(tx.user_id, tx.category) for tx in expenses}, 'category'),
+            )
+        }
+        for tx, value in zip(expenses, values):
+            row = stats.get((tx.user_id, tx.category))
+            if row is not None:
+                row.count, row.mean, row.m2 = welford_remove(row.count, row.mean, row.m2, float(value))
+        CategoryStats.objects.bulk_update(list(stats.values()), ['count', 'mean', 'm2'])
+
+
+def move_expenses(moves: Iterable[Tuple[Transaction, Transaction]]) -> None:
+    """
+    Move expenses between category statistics, as ``(before, after)`` pairs
+    (a recategorization), with a fixed number of queries. Merchant rows are
+    left alone: the charges themselves did not change.
+    """
+    moves = list(moves)
+    changes = [(old, -1) for old, _ in moves] + [(new, 1) for _, new in moves]
+    changes = [(tx, sign) for tx, sign in changes if tx.type == 'expense']
+    if not changes:
+        return
+    values = to_base([tx.amount for tx, _ in changes], [tx.currency for tx, _ in changes], [tx.date for tx, _ in changes])
+    keys = {(tx.user_id, tx.category) for tx, _ in changes}
+    with db_transaction.atomic():
+        CategoryStats.objects.bulk_create(
+            [CategoryStats(user_id=user_id, category=category) for user_id, category in keys],
+            ignore_conflicts=True,
+        )
+        stats = {
+            (row.user_id, row.category): row
+            for row in CategoryStats.objects.select_for_update().filter(_scope(keys, 'category'))
+        }
+        for (tx, sign), value in zip(changes, values):
+            row = stats[(tx.user_id, tx.category)]
+            update = welford_add if sign > 0 else welford_remove
+            row.count, row.mean, row.m2 = update(row.count, row.mean, row.m2, float(value))
+        CategoryStats.objects.bulk_update(list(stats.values()), ['count', 'mean', 'm2'])
+
+
+def _replace_user_statistics(user_id, stats, merchants) -> None:
+    with db_transaction.atomic():
+        CategoryStats.objects.filter(user_id=user_id).delete()
+        MerchantStats.objects.filter(user_id=user_id).delete()
+        CategoryStats.objects.bulk_create([
+            CategoryStats(user_id=user_id, category=category, count=count, mean=mean, m2=m2)
+            for category, (count, mean, m2) in stats.items()
+        ])
+        MerchantStats.objects.bulk_create([
+            MerchantStats(user_id=user_id, merchant=merchant, last_amount=amount, last_date=date)
+            for merchant, (amount, date) in merchants.items()
+        ], batch_size=1000)
+
+
+def backfill_statistics(user_ids: Optional[Iterable[int]] = None, chunk_size: int = BACKFILL_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Recompute all statistics from history without raising notifications.
+
+    Streams expenses ordered by (user, date) so only one user's statistics
+    are held in memory at a time; each user's rows are swapped atomically.
+    """
+    querysets = [Transaction.objects.filter(type='expense'), ArchivedTransaction.objects.filter(type='expense')]
+    stale_stats = CategoryStats.objects.all()
+    stale_merchants = MerchantStats.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        querysets = [qs.filter(user_id__in=user_ids) for qs in querysets]
+        stale_stats = stale_stats.filter(user_id__in=user_ids)
+        stale_merchants = stale_merchants.filter(user_id__in=user_ids)
+    # Archived expenses still count, so merge both tables in (user, date, id) order.
+    rows = heapq.merge(*[
+        qs.order_by('user_id', 'date', 'id')
+        .values_list('user_id', 'category', 'amount', 'description', 'date', 'currency', 'id')
+        .iterator(chunk_size=chunk_size)
+        for qs in querysets
+    ], key=lambda r: (r[0], r[4], r[6]))
+
+    totals = {'users': 0, 'transactions': 0}
+    seen_users = []
+    current, stats, merchants = None, {}, {}
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        base_amounts = to_base([r[2] for r in chunk], [r[5] for r in chunk], [r[4] for r in chunk])
+        for (user_id, category, amount, description, date, _, _), value in zip(chunk, base_amounts):
+            if user_id != current:
+                if current is not None:
+                    _replace_user_statistics(current, stats, merchants)
+                current, stats, merchants = user_id, {}, {}
+                seen_users.append(user_id)
+            stats[category] = welford_add(*stats.get(category, (0, 0.0, 0.0)), float(value))
+            merchant = merchant_key(description)
+            if merchant:
+                merchants[merchant] = (amount, date)
+        totals['transactions'] += len(chunk)
+    if current is not None:
+        _replace_user_statistics(current, stats, merchants)
+
+    # Users whose expenses are all gone keep no statistics.
+    stale_stats.exclude(user_id__in=seen_users).delete()
+    stale_merchants.exclude(user_id__in=seen_users).delete()
+    totals['users'] = len(seen_users)
+    logger.info(f"Anomaly statistics backfilled for {totals['users']} users from {totals['transactions']} expenses")
+    return totals
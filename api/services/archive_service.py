@@ -0,0 +1,147 @@
+"""
+Hot/cold storage for transactions.
+
+Transactions older than ``TRANSACTION_ARCHIVE_MONTHS`` are moved, ids
+included, from ``Transaction`` into the compact ``ArchivedTransaction``
+table by the ``archive_transactions`` command. Day-to-day reads (dashboard,
+insights, heatmap, search, edits) only see the hot table. Anything that must
+cover the full history asks ``ledger_history`` for its querysets. The archive
+is only included when the requested date range reaches back past the newest
+archived row, so recent-window queries never touch it.
+
+Archived rows keep counting towards budgets and anomaly statistics. Moving
+a row changes no derived data, so no signals run and no tombstones are left.
+"""
+import heapq
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..cache_utils import bump_version, versioned_key
+from ..db_utils import delete_by_ids
+from ..models import ArchivedTransaction, Transaction
+from .fx_service import sum_in_base
+from .household_service import LedgerScope, bump_ledger_data
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_VERSION_SCOPE = 'global'
+BOUNDARY_CACHE_TTL = 60 * 60
+ARCHIVED_FIELDS = (
+    'id', 'user_id', 'household_id', 'date', 'amount', 'currency', 'type',
+    'category', 'description', 'fingerprint', 'updated_at',
+)
+
+
+def archive_cutoff(months: Optional[int] = None) -> datetime:
+    """Start of the local month ``months`` months ago; the archive holds whole months."""
+    months = settings.TRANSACTION_ARCHIVE_MONTHS if months is None else months
+    today = timezone.localdate()
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    return timezone.make_aware(datetime(year, month + 1, 1))
+
+
+def archive_boundary() -> Optional[datetime]:
+    """Date of the newest archived row (None while the archive is empty)."""
+    key = versioned_key('archive', ARCHIVE_VERSION_SCOPE, 'boundary')
+    boundary = cache.get(key)
+    if boundary is None:
+        boundary = ArchivedTransaction.objects.aggregate(top=Max('date'))['top'] or ''
+        cache.set(key, boundary, BOUNDARY_CACHE_TTL)
+    return boundary or None
+
+
+def ledger_history(scope: LedgerScope, date_from: Optional[datetime] = None,
+                   date_to: Optional[datetime] = None) -> List[Any]:
+    """
+    Querysets that together hold the scope's transactions dated in
+    ``[date_from, date_to]``: the hot table, plus the archive when the range
+    reaches it. Both expose the same field names.
+    """
+    querysets = [Transaction.objects.all()]
+    boundary = archive_boundary()
+    if boundary is not None and (date_from is None or date_from <= boundary):
+        querysets.append(ArchivedTransaction.objects.all())
+    bounds = {}
+    if date_from is not None:
+        bounds['date__gte'] = date_from
+    if date_to is not None:
+        bounds['date__lte'] = date_to
+    return [scope.filter(qs).filter(**bounds) for qs in querysets]
+
+
+def sum_history(querysets, *fields) -> Dict:
+    """``sum_in_base`` over several querysets, merged by key."""
+    totals: Dict = {}
+    for qs in querysets:
+        for key, value in sum_in_base(qs, *fields).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def iter_history(querysets, *fields, chunk_size: int = 2000) -> Iterator[tuple]:
+    """
+    Stream ``values_list(*fields)`` rows from all querysets in (date, id)
+    order. Each queryset is read with a server-side iterator and the streams
+    are merged, so memory stays flat however long the history is.
+    """
+    streams = [
+        qs.order_by('date', 'id').values_list('date', 'id', *fields).iterator(chunk_size=chunk_size)
+        for qs in querysets
+    ]
+    for row in heapq.merge(*streams, key=lambda r: (r[0], r[1])):
+        yield row[2:]
+
+
+def archive_transactions(months: Optional[int] = None, batch_size: int = ARCHIVE_BATCH_SIZE,
+                         dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move transactions dated before the cutoff into the archive.
+
+    Work is done per user (through the user/date index) in batches of
+    ``batch_size``. Each batch is its own short transaction: copy the rows,
+    then delete them from the hot table. Locks are never held for long, and
+    an interrupted run can simply be started again.
+    """
+    cutoff = archive_cutoff(months)
+    old = Transaction.objects.filter(date__lt=cutoff)
+    totals = {'users': 0, 'archived': 0}
+    if dry_run:
+        totals['users'] = old.values('user_id').distinct().count()
+        totals['archived'] = old.count()
+        return totals
+
+    user_ids = list(old.order_by().values_list('user_id', flat=True).distinct())
+    for user_id in user_ids:
+        ledgers = set()
+        while True:
+            with db_transaction.atomic():
+                rows = list(
+                    old.filter(user_id=user_id).select_for_update()
+                    .order_by('date', 'id').values_list(*ARCHIVED_FIELDS)[:batch_size]
+                )
+                if not rows:
+                    break
+                ArchivedTransaction.objects.bulk_create(
+                    [ArchivedTransaction(**dict(zip(ARCHIVED_FIELDS, row))) for row in rows],
+                    ignore_conflicts=True,
+                )
+                # Moving a row is not a delete: no signals, no tombstones, no budget reversal.
+                delete_by_ids(Transaction, [row[0] for row in rows])
+            # Readers must see the new boundary as soon as rows leave the hot table.
+            bump_version('archive', ARCHIVE_VERSION_SCOPE)
+            ledgers.update(row[2] for row in rows)
+            totals['archived'] += len(rows)
+        for household_id in ledgers:
+            bump_ledger_data(user_id, household_id)
+        totals['users'] += 1
+    logger.info(f"Archived {totals['archived']} transactions older than {cutoff:%Y-%m-%d} for {totals['users']} users")
+    return totals
+
@@ -0,0 +1,157 @@
+"""
+Set-based budget roll-ups.
+
+Write paths that touch many transactions at once (statement imports, batch
+jobs, recategorization, edits) hand their expenses to ``adjust_budgets``,
+which applies them with a constant number of queries instead of a get/save
+per row. Amounts are converted into each budget's currency at their own
+transaction date, the same way a single write charges them.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+
+from ..models import Budget
+from .fx_service import base_currency, convert, convert_many
+from .household_service import bump_ledger_data
+
+
+def upsert_budgets(entries: Iterable[Mapping], user=None, household=None) -> List[Budget]:
+    """
+    Create or update many budgets of one ledger in a single statement.
+
+    Each entry has a ``category`` and optionally ``limit_amount``,
+    ``alert_threshold`` and ``currency``. Existing budgets keep their spend
+    and currency; only the limit and threshold change. Later entries for the
+    same category win. Returns the ledger's budgets for those categories,
+    ordered by category.
+    """
+    if household is not None:
+        owner, unique_fields = {'household': household}, ['household', 'category']
+    else:
+        owner, unique_fields = {'user': user}, ['user', 'category']
+    budgets = {}
+    for entry in entries:
+        category = entry['category'].strip()
+        limit_amount = Decimal(str(entry.get('limit_amount', 0)))
+        alert_threshold = int(entry.get('alert_threshold', 80))
+        if not category:
+            raise ValueError('Budget category is required')
+        if limit_amount < 0:
+            raise ValueError(f'Budget limit for {category} cannot be negative')
+        if not 1 <= alert_threshold <= 100:
+            raise ValueError(f'Alert threshold for {category} should be between 1 and 100')
+        budgets[category] = Budget(
+            **owner, category=category, limit_amount=limit_amount, alert_threshold=alert_threshold,
+            currency=entry.get('currency') or base_currency(),
+        )
+    if not budgets:
+        return []
+
+    with db_transaction.atomic():
+        Budget.objects.bulk_create(
+            list(budgets.values()),
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['limit_amount', 'alert_threshold', 'updated_at'],
+        )
+        saved = list(Budget.objects.filter(**owner, category__in=list(budgets)).order_by('category'))
+    bump_ledger_data(getattr(user, 'pk', user), getattr(household, 'pk', household))
+    return saved
+
+
+def charge_budget(transaction) -> Budget:
+    """
+    Add one expense to the budget of its ledger (the household's if it was
+    posted to one, else the author's) and return the refreshed budget.
+
+    The increment is done in SQL, so members posting to the same household
+    budget at the same time cannot overwrite each other's spend.
+    """
+    if transaction.household_id:
+        lookup = {'household_id': transaction.household_id, 'category': transaction.category}
+    else:
+        lookup = {'user_id': transaction.user_id, 'category': transaction.category}
+    budget, _ = Budget.objects.get_or_create(**lookup)
+    amount = convert(transaction.amount, transaction.currency, budget.currency, transaction.date)
+    Budget.objects.filter(pk=budget.pk).update(spent_amount=F('spent_amount') + amount, updated_at=timezone.now())
+    budget.refresh_from_db(fields=['spent_amount'])
+    bump_ledger_data(transaction.user_id, transaction.household_id)
+    return budget
+
+
+def _budget_lookup(household_id, user_id, category) -> Dict:
+    if household_id:
+        return {'household_id': household_id, 'category': category}
+    return {'user_id': user_id, 'category': category}
+
+
+def _ledger_key(household_id, user_id, category) -> Tuple:
+    return (household_id, None if household_id else user_id, category)
+
+
+def adjust_budgets(changes: Iterable[Tuple[object, int]]) -> List[Budget]:
+    """
+    Apply signed expense changes, ``(transaction, +1 or -1)``, to the budgets
+    of their ledgers and return the budgets whose spend changed.
+
+    Each amount is converted into its budget's currency at the transaction's
+    own date, exactly as ``charge_budget`` does, so a charge made here or
+    there is taken back to the cent by a later edit or delete. A category or
+    ledger change is a -1 on the old version and a +1 on the new one. Budgets
+    are read in one query, missing ones are created in one more, and all
+    spend changes go out in a single UPDATE.
+    """
+    grouped = defaultdict(list)
+    for tx, sign in changes:
+        if tx.type == 'expense':
+            grouped[_ledger_key(tx.household_id, tx.user_id, tx.category)].append((tx, sign))
+    if not grouped:
+        return []
+
+    def read(keys):
+        scope = Q()
+        for key in keys:
+            scope |= Q(**_budget_lookup(*key))
+        return {_ledger_key(b.household_id, b.user_id, b.category): b for b in Budget.objects.filter(scope)}
+
+    budgets = read(grouped)
+    # Spend removed from a budget that no longer exists has nothing to correct.
+    missing = [
+        key for key, entries in grouped.items()
+        if key not in budgets and any(sign > 0 for _, sign in entries)
+    ]
+    if missing:
+        Budget.objects.bulk_create([Budget(**_budget_lookup(*key)) for key in missing], ignore_conflicts=True)
+        budgets.update(read(missing))
+
+    changed = []
+    for key, entries in grouped.items():
+        budget = budgets.get(key)
+        if budget is None:
+            continue
+        amounts = convert_many(
+            [tx.amount for tx, _ in entries], [tx.currency for tx, _ in entries],
+            budget.currency, [tx.date for tx, _ in entries],
+        )
+        delta = sum((sign * amount for (_, sign), amount in zip(entries, amounts)), Decimal('0'))
+        if delta:
+            changed.append((budget, delta))
+    if not changed:
+        return []
+
+    increment = Case(
+        *[When(pk=budget.pk, then=Value(delta)) for budget, delta in changed],
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    Budget.objects.filter(pk__in=[budget.pk for budget, _ in changed]).update(
+        spent_amount=F('spent_amount') + increment, updated_at=timezone.now(),
+    )
+    for budget, delta in changed:
+        budget.spent_amount += delta
+    return [budget for budget, _ in changed]
@@ -0,0 +1,282 @@
+"""
+Rule-based auto-categorization.
+
+A user's rules are compiled into one matcher: every substring/regex rule
+becomes an alternative of a single regex (ordered by priority), merchant
+rules become a dict keyed by normalized merchant name, and amount rules a
+short priority-ordered list. The compiled matcher is cached per process and
+keyed by a per-user rules version that is bumped whenever a rule changes.
+"""
+import copy
+import logging
+import re
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from ..cache_utils import bump_version, get_version
+from ..models import CategoryRule, Transaction
+from .alert_service import check_budget_alerts
+from .budget_service import adjust_budgets
+from .household_service import bump_ledger_data
+
+logger = logging.getLogger(__name__)
+
+UNCATEGORIZED = 'Uncategorized'
+MERCHANT_MAX_WORDS = 4
+RECATEGORIZE_CHUNK_SIZE = 5000
+MATCHER_CACHE_SIZE = 512
+REGEX_MAX_LENGTH = 100
+# Rules only look at the start of very long descriptions.
+MATCH_MAX_CHARS = 500
+
+_matchers = OrderedDict()
+
+
+def normalize_merchant(description: str) -> str:
+    """'SWIGGY*ORDER 88231 BLR' -> 'swiggy order blr' (digits and punctuation dropped)."""
+    words = re.sub(r'[^a-z ]+', ' ', (description or '').lower()).split()
+    return ' '.join(words[:MERCHANT_MAX_WORDS])
+
+
+def _alternative(name: str, body: str) -> str:
+    return f'(?P<{name}>{body})'
+
+
+def _compile(alternatives) -> re.Pattern:
+    # Wrapping the alternation in a lookahead makes finditer report, at
+    # every position, the best-ranked rule that matches there, so the
+    # minimum over positions is the best-ranked rule overall.
+    return re.compile(f"(?=(?:{'|'.join(alternatives)}))", re.IGNORECASE)
+
+
+# Backslash escapes, so an escaped backslash before a digit is not read as a backreference.
+_ESCAPE = re.compile(r'\\(.)', re.DOTALL)
+_QUANTIFIER = re.compile(r'[*+?]|\{\d+(?:,\d*)?\}|\{,\d+\}')
+
+
+def _repeats_ambiguous_group(pattern: str) -> bool:
+    """
+    True if a repeated group contains a repeat or an alternation, as in
+    ``(a+)+`` or ``(a|ab)*``: the shapes that backtrack exponentially.
+    """
+    # One flag per open group: does it contain a repeat or an alternation?
+    stack = [False]
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            i += 2 if pattern[i + 1:i + 2] == '^' else 1
+            if pattern[i:i + 1] == ']':
+                i += 1  # a leading ']' is a literal
+            while i < n and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+            continue
+        if c == '(':
+            stack.append(False)
+            i += 2 if pattern[i + 1:i + 2] == '?' else 1
+            continue
+        if c == ')':
+            inner = stack.pop() if len(stack) > 1 else False
+            i += 1
+            quantifier = _QUANTIFIER.match(pattern, i)
+            if quantifier and inner:
+                return True
+            stack[-1] = stack[-1] or inner or bool(quantifier)
+            if quantifier:
+                i = quantifier.end()
+            continue
+        quantifier = _QUANTIFIER.match(pattern, i)
+        if quantifier or c == '|':
+            stack[-1] = True
+            i = quantifier.end() if quantifier else i + 1
+            continue
+        i += 1
+    return False
+
+
+def _regex_error(pattern: str) -> Optional[str]:
+    """Why a regex rule cannot go into the matcher, or None if it can."""
+    if len(pattern) > REGEX_MAX_LENGTH:
+        return f'Regular expressions are limited to {REGEX_MAX_LENGTH} characters.'
+    if '(?P<' in pattern:
+        return 'Named groups are not allowed in rule patterns.'
+    # Group numbers shift once the rule is combined with the others.
+    if '(?(' in pattern or any(m.group(1).isdigit() and m.group(1) != '0' for m in _ESCAPE.finditer(pattern)):
+        return 'Backreferences to numbered groups are not allowed in rule patterns.'
+    if _repeats_ambiguous_group(pattern):
+        # Every import and recategorization runs the rules over every description.
+        return 'A repeated group may not itself contain a repeat or an alternation.'
+    try:
+        # Compile the form the matcher uses: inline global flags, for
+        # example, are only valid at the start of the whole expression.
+        _compile([_alternative('r0', pattern)])
+    except re.error as e:
+        return f'Invalid regular expression: {e}'
+    return None
+
+
+def validate_pattern(kind: str, pattern: str) -> None:
+    """Raise ValueError if a rule pattern cannot be compiled into the matcher."""
+    if kind in ('substring', 'regex', 'merchant') and not pattern.strip():
+        raise ValueError('Pattern is required for this rule type.')
+    if kind == 'regex':
+        error = _regex_error(pattern)
+        if error:
+            raise ValueError(error)
+    if kind == 'merchant' and not normalize_merchant(pattern):
+        raise ValueError('Merchant name must contain letters.')
+
+
+class CompiledMatcher:
+    """All of one user's rules, evaluated in a single pass per transaction."""
+
+    def __init__(self, rules: Iterable[CategoryRule]):
+        alternatives = []
+        self._text_categories = {}
+        self._merchants = {}
+        self._amount_rules = []
+
+        # Rules arrive ordered by (priority, id); the position is the rank.
+        for rank, rule in enumerate(rules):
+            if rule.kind in ('substring', 'regex'):
+                error = _regex_error(rule.pattern) if rule.kind == 'regex' else None
+                if error:
+                    # A rule saved before validation covered it: skip it rather
+                    # than failing (or stalling) every write that categorizes.
+                    logger.warning(f'Skipping category rule {rule.pk}: {error}')
+                    continue
+                body = re.escape(rule.pattern) if rule.kind == 'substring' else rule.pattern
+                alternatives.append(_alternative(f'r{rank}', body))
+                self._text_categories[f'r{rank}'] = (rank, rule.category)
+            elif rule.kind == 'merchant':
+                self._merchants.setdefault(normalize_merchant(rule.pattern), (rank, rule.category))
+            elif rule.kind == 'amount':
+                self._amount_rules.append((rank, rule.min_amount, rule.max_amount, rule.category))
+
+        self._regex = _compile(alternatives) if alternatives else None
+
+    def __bool__(self):
+        return bool(self._regex or self._merchants or self._amount_rules)
+
+    def categorize(self, description: str, amount: Optional[Decimal] = None) -> Optional[str]:
+        best = None
+        if self._regex is not None and description:
+            for match in self._regex.finditer(description[:MATCH_MAX_CHARS]):
+                hit = self._text_categories[match.lastgroup]
+                if best is None or hit[0] < best[0]:
+                    best = hit
+                    if best[0] == 0:
+                        return best[1]
+
+        if self._merchants and description:
+            words = normalize_merchant(description).split()
+            for size in range(len(words), 0, -1):
+                hit = self._merchants.get(' '.join(words[:size]))
+                if hit and (best is None or hit[0] < best[0]):
+                    best = hit
+
+        if self._amount_rules and amount is not None:
+            for rank, low, high, category in self._amount_rules:
+                if best is not None and rank > best[0]:
+                    break
+                if (low is None or amount >= low) and (high is None or amount <= high):
+                    best = (rank, category)
+                    break
+
+        return best[1] if best else None
+
+
+def get_matcher(user_id) -> CompiledMatcher:
+    """Return the user's compiled matcher, recompiling only after a rule edit."""
+    version = get_version('rules', user_id)
+    cached = _matchers.get(user_id)
+    if cached and cached[0] == version:
+        _matchers.move_to_end(user_id)
+        return cached[1]
+
+    matcher = CompiledMatcher(CategoryRule.objects.filter(user_id=user_id).order_by('priority', 'id'))
+    _matchers[user_id] = (version, matcher)
+    _matchers.move_to_end(user_id)
+    while len(_matchers) > MATCHER_CACHE_SIZE:
+        _matchers.popitem(last=False)
+    return matcher
+
+
+def categorize(user_id, description: str, amount: Optional[Decimal] = None) -> Optional[str]:
+    return get_matcher(user_id).categorize(description, amount)
+
+
+def recategorize_all(user, only_uncategorized: bool = False, chunk_size: int = RECATEGORIZE_CHUNK_SIZE) -> int:
+    """
+    Re-apply the user's rules to their whole history.
+
+    Streams (id, description, amount, category, type, ...) tuples, groups changed
+    ids by their new category and issues one UPDATE per (chunk, category).
+    In the same transaction as each chunk, budget spend and the category
+    statistics move with the rows, set-wise; budget alerts are checked once
+    at the end, as after an import. Returns the number of transactions changed.
+    """
+    # anomaly_service imports this module.
+    from .anomaly_service import move_expenses
+
+    matcher = get_matcher(user.id)
+    if not matcher:
+        return 0
+
+    qs = Transaction.objects.filter(user=user)
+    if only_uncategorized:
+        qs = qs.filter(category__in=['', UNCATEGORIZED])
+    rows = qs.order_by('id').values_list(
+        'id', 'description', 'amount', 'category', 'type', 'currency', 'date', 'household_id',
+    )
+
+    changed = 0
+    last_id = 0
+    touched = {}
+    ledgers = set()
+    while True:
+        chunk = list(rows.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        moves = defaultdict(list)
+        expense_moves = []
+        for pk, description, amount, category, tx_type, currency, date, household_id in chunk:
+            new_category = matcher.categorize(description, amount)
+            if not new_category or new_category == category:
+                continue
+            moves[new_category].append(pk)
+            ledgers.add(household_id)
+            if tx_type == 'expense':
+                old = Transaction(
+                    pk=pk, user_id=user.id, household_id=household_id, amount=amount, type=tx_type,
+                    category=category, currency=currency, date=date,
+                )
+                new = copy.copy(old)
+                new.category = new_category
+                expense_moves.append((old, new))
+
+        if moves:
+            with db_transaction.atomic():
+                now = timezone.now()
+                for new_category, ids in moves.items():
+                    Transaction.objects.filter(id__in=ids).update(category=new_category, updated_at=now)
+                budgets = adjust_budgets([(old, -1) for old, _ in expense_moves] + [(new, 1) for _, new in expense_moves])
+                move_expenses(expense_moves)
+            touched.update((budget.pk, budget) for budget in budgets)
+            changed += sum(len(ids) for ids in moves.values())
+
+    check_budget_alerts(touched.values())
+    for household_id in ledgers:
+        bump_ledger_data(user.id, household_id)
+    logger.info(f"Recategorized {changed} transactions for user {user.id}")
+    return changed
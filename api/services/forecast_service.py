@@ -0,0 +1,209 @@
+"""
+Spending forecasts.
+
+A user's daily expense totals per category come back from one grouped query
+and are laid out as a (categories x days) NumPy matrix. Moving averages,
+weekday/month seasonality, end-of-month projections and days-until-limit
+estimates are then computed for all categories at once with array operations.
+"""
+import calendar
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..cache_utils import versioned_key
+from ..models import Budget, Transaction
+from .fx_service import base_currency, to_base
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = 5 * 365
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+LIMIT_HORIZON_DAYS = 365
+FORECAST_CACHE_TTL = 36 * 60 * 60
+
+
+def load_daily_series(user, today: date, days: int = HISTORY_DAYS):
+    """
+    Return ``(categories, day_numbers, matrix)`` for the ``days`` up to ``today``.
+
+    ``matrix[i, j]`` is the expense total of ``categories[i]`` on day
+    ``day_numbers[j]`` (proleptic ordinals) in the base currency, zero where
+    nothing was spent.
+    """
+    start = today - timedelta(days=days - 1)
+    start_dt = timezone.make_aware(datetime.combine(start, time.min))
+    rows = list(
+        Transaction.objects
+        .filter(user=user, household__isnull=True, type='expense', date__gte=start_dt)
+        .annotate(day=TruncDate('date'))
+        .values('category', 'currency', 'day')
+        .annotate(total=Sum('amount'))
+        .values_list('category', 'day', 'total', 'currency')
+    )
+    day_numbers = np.arange(start.toordinal(), today.toordinal() + 1)
+    categories = sorted({row[0] for row in rows})
+    matrix = np.zeros((len(categories), len(day_numbers)))
+    if rows:
+        index = {category: i for i, category in enumerate(categories)}
+        cat_idx = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        day_idx = np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=len(rows)) - day_numbers[0]
+        totals = to_base([row[2] for row in rows], [row[3] for row in rows], [row[1] for row in rows])
+        keep = (day_idx >= 0) & (day_idx < len(day_numbers))
+        np.add.at(matrix, (cat_idx[keep], day_idx[keep]), totals[keep])
+    return categories, day_numbers, matrix
+
+
+def _calendar_parts(day_numbers: np.ndarray):
+    """Weekday (Mon=0) and month (0-11) for an array of ordinals."""
+    weekdays = (day_numbers - 1) % 7  # ordinal 1 (0001-01-01) was a Monday
+    days = (day_numbers - UNIX_EPOCH_ORDINAL).astype('datetime64[D]')
+    months = days.astype('datetime64[M]').astype(np.int64) % 12
+    return weekdays, months
+
+
+def _seasonal_factors(matrix: np.ndarray, keys: np.ndarray, size: int) -> np.ndarray:
+    """
+    Ratio of each category's mean spend per key (weekday or month) to its
+    overall daily mean; 1.0 where there is no data to say otherwise.
+    """
+    onehot = np.zeros((len(keys), size))
+    onehot[np.arange(len(keys)), keys] = 1.0
+    counts = onehot.sum(axis=0)
+    sums = matrix @ onehot
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_key_mean = np.where(counts > 0, sums / counts, np.nan)
+        overall = matrix.mean(axis=1, keepdims=True)
+        factors = per_key_mean / overall
+    return np.where(np.isfinite(factors) & (factors > 0), factors, 1.0)
+
+
+def compute_forecast(user, today: Optional[date] = None, days: int = HISTORY_DAYS) -> Dict[str, Any]:
+    today = today or timezone.localdate()
+    categories, day_numbers, matrix = load_daily_series(user, today, days)
+    budgets = list(Budget.objects.filter(user=user).values_list('category', 'limit_amount', 'spent_amount', 'currency'))
+
+    period_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    n = len(categories)
+
+    spent_days = np.flatnonzero(matrix.sum(axis=0))
+    if len(spent_days):
+        # Statistics only cover the span since the first recorded expense, so
+        # a young account is not averaged against years of empty days.
+        first_day = int(spent_days[0])
+        history = matrix[:, first_day:]
+        weekdays, months = _calendar_parts(day_numbers[first_day:])
+        ma7 = history[:, -7:].mean(axis=1)
+        ma30 = history[:, -30:].mean(axis=1)
+        weekday_factors = _seasonal_factors(history, weekdays, 7)
+        # Month-of-year seasonality only means something with a year of history.
+        has_year = history.shape[1] > 365
+        month_factors = _seasonal_factors(history, months, 12) if has_year else np.ones((n, 12))
+
+        horizon = np.arange(today.toordinal() + 1, today.toordinal() + 1 + LIMIT_HORIZON_DAYS)
+        h_weekdays, h_months = _calendar_parts(horizon)
+        # Expected spend per category per future day.
+        future = ma30[:, None] * weekday_factors[:, h_weekdays] * month_factors[:, h_months]
+        remaining_days = (period_end - today).days
+        projected_remaining = future[:, :remaining_days].sum(axis=1)
+        month_mask = day_numbers >= today.replace(day=1).toordinal()
+        month_to_date = matrix[:, month_mask].sum(axis=1)
+        cumulative = np.cumsum(future, axis=1)
+    else:
+        # Nothing spent in the window (no expenses yet, or only future-dated
+        # ones): every category forecasts zero.
+        ma7 = ma30 = projected_remaining = month_to_date = np.zeros(n)
+        weekday_factors = np.ones((n, 7))
+        cumulative = np.zeros((n, LIMIT_HORIZON_DAYS))
+
+    index = {category: i for i, category in enumerate(categories)}
+    budget_rows = []
+    if budgets:
+        b_idx = np.array([index.get(category, -1) for category, _, _, _ in budgets])
+        currencies = [currency for _, _, _, currency in budgets]
+        as_of = [today] * len(budgets)
+        limits = to_base([limit for _, limit, _, _ in budgets], currencies, as_of)
+        spent = to_base([spent for _, _, spent, _ in budgets], currencies, as_of)
+        known = b_idx >= 0
+        b_remaining = np.where(known, projected_remaining[b_idx] if n else 0.0, 0.0)
+        projected_spent = spent + b_remaining
+        headroom = limits - spent
+        if n:
+            reached = cumulative[np.where(known, b_idx, 0)] >= headroom[:, None]
+            crosses = known & reached.any(axis=1)
+            days_until = np.where(crosses, reached.argmax(axis=1) + 1, -1)
+        else:
+            days_until = np.full(len(budgets), -1)
+        days_until = np.where(headroom <= 0, 0, days_until)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            utilization = np.where(limits > 0, projected_spent / limits * 100, 0.0)
+
+        for i, (category, _, _, _) in enumerate(budgets):
+            has_limit = limits[i] > 0
+            budget_rows.append({
+                'category': category,
+                'limit_amount': round(float(limits[i]), 2),
+                'spent_amount': round(float(spent[i]), 2),
+                'projected_spent': round(float(projected_spent[i]), 2),
+                'projected_utilization_pct': int(utilization[i]),
+                'days_until_limit': int(days_until[i]) if has_limit and days_until[i] >= 0 else None,
+                'will_exceed': bool(has_limit and projected_spent[i] > limits[i]),
+            })
+
+    category_rows = [
+        {
+            'category': category,
+            'ma7': round(float(ma7[i]), 2),
+            'ma30': round(float(ma30[i]), 2),
+            'month_to_date': round(float(month_to_date[i]), 2),
+            'projected_month_total': round(float(month_to_date[i] + projected_remaining[i]), 2),
+            'weekday_factors': [round(float(f), 3) for f in weekday_factors[i]],
+        }
+        for i, category in enumerate(categories)
+    ]
+
+    return {
+        'as_of': today.isoformat(),
+        'currency': base_currency(),
+        'period_end': period_end.isoformat(),
+        'history_days': int(len(day_numbers)),
+        'total': {
+            'daily_rate': round(float(ma30.sum()), 2),
+            'month_to_date': round(float(month_to_date.sum()), 2),
+            'projected_month_total': round(float(month_to_date.sum() + projected_remaining.sum()), 2),
+        },
+        'categories': category_rows,
+        'budgets': budget_rows,
+    }
+
+
+def _cache_key(user_id, today: date) -> str:
+    return versioned_key('data', user_id, 'forecast', today.isoformat())
+
+
+def get_forecast(user) -> Dict[str, Any]:
+    """Cached forecast for today; recomputed after any write to the user's data."""
+    today = timezone.localdate()
+    key = _cache_key(user.id, today)
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = compute_forecast(user, today)
+        cache.set(key, forecast, FORECAST_CACHE_TTL)
+    return forecast
+
+
+def precompute_forecast(user) -> Dict[str, Any]:
+    """
+    Compute and store today's forecast (used by the overnight batch). The
+    web workers only see it through a shared cache backend (see CACHES).
+    """
+    today = timezone.localdate()
+    forecast = compute_forecast(user, today)
+    cache.set(_cache_key(user.id, today), forecast, FORECAST_CACHE_TTL)
+    return forecast
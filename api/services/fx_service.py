@@ -0,0 +1,248 @@
+"""
+Currency conversion against a locally stored FX rate table.
+
+Rates are loaded from a CSV file into ``FxRate`` (no live service). The whole
+table is held in-process as one sorted (day, rate) array pair per currency,
+rebuilt only when a load bumps the global 'fx' version, and looked up with
+``np.searchsorted``: a date uses the latest rate on or before it. Conversion
+happens per batch, never per row: aggregates group by (currency, day) in SQL
+and convert the grouped totals with one vectorized lookup per currency.
+"""
+import csv
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, DateField, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..cache_utils import bump_version, get_version
+from ..models import FxRate
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_SYMBOLS = {'INR': '₹', 'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'AUD': 'A$', 'CAD': 'C$', 'SGD': 'S$'}
+FX_VERSION_SCOPE = 'global'
+CENT = Decimal('0.01')
+
+_table_cache = {}
+
+
+class FxRateMissing(ValueError):
+    """Raised when an amount is in a currency the rate table does not know."""
+
+
+def base_currency() -> str:
+    return settings.BASE_CURRENCY
+
+
+def currency_symbol(currency: Optional[str] = None) -> str:
+    currency = currency or base_currency()
+    return CURRENCY_SYMBOLS.get(currency, f'{currency} ')
+
+
+def _day_number(value) -> int:
+    if isinstance(value, datetime):
+        value = timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value.toordinal()
+
+
+class RateTable:
+    """
+    Date-indexed rates for every currency, as NumPy arrays. NumPy is imported
+    where it is used, so processes that only ever see the base currency (the
+    CLI report, most requests) never load it.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, date, Decimal]]):
+        import numpy as np
+        grouped = defaultdict(list)
+        for currency, day, rate in rows:
+            grouped[currency].append((day.toordinal(), float(rate)))
+        self._series = {}
+        for currency, points in grouped.items():
+            points.sort()
+            days, rates = zip(*points)
+            self._series[currency] = (np.array(days, dtype=np.int64), np.array(rates))
+
+    @property
+    def currencies(self):
+        return set(self._series) | {base_currency()}
+
+    def rates(self, currency: str, days: 'np.ndarray') -> 'np.ndarray':
+        """Base units per unit of ``currency`` on each day ordinal in ``days``."""
+        import numpy as np
+        if currency == base_currency():
+            return np.ones(len(days))
+        try:
+            known_days, known_rates = self._series[currency]
+        except KeyError:
+            raise FxRateMissing(f'No FX rates for {currency}')
+        # Latest rate on or before each day; days before the first rate use it.
+        idx = np.searchsorted(known_days, days, side='right') - 1
+        return known_rates[np.clip(idx, 0, None)]
+
+
+def get_rate_table() -> RateTable:
+    version = get_version('fx', FX_VERSION_SCOPE)
+    cached = _table_cache.get('table')
+    if cached and cached[0] == version:
+        return cached[1]
+    table = RateTable(FxRate.objects.values_list('currency', 'date', 'rate').iterator())
+    _table_cache['table'] = (version, table)
+    return table
+
+
+def known_currencies() -> set:
+    return get_rate_table().currencies
+
+
+def to_base(amounts: Sequence, currencies: Sequence[str], days: Sequence) -> 'np.ndarray':
+    """
+    Convert parallel sequences of amounts/currencies/dates to the base
+    currency. ``days`` may hold dates, datetimes or day ordinals. The rate
+    lookup runs once per distinct currency, not per row.
+    """
+    import numpy as np
+    values = np.asarray([float(a) for a in amounts], dtype=np.float64)
+    currencies = np.asarray(currencies, dtype=object)
+    base = base_currency()
+    foreign = currencies != base
+    if not foreign.any():
+        return values
+    ordinals = np.fromiter(
+        (d if isinstance(d, int) else _day_number(d) for d in days), dtype=np.int64, count=len(values),
+    )
+    table = get_rate_table()
+    for currency in set(currencies[foreign]):
+        mask = currencies == currency
+        values[mask] *= table.rates(currency, ordinals[mask])
+    return values
+
+
+def to_decimal(value: float) -> Decimal:
+    return Decimal(repr(float(value))).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def convert(amount: Decimal, from_currency: str, to_currency: str, when=None) -> Decimal:
+    """Convert one amount (single-record write paths); cross rates go through the base currency."""
+    if from_currency == to_currency:
+        return amount
+    import numpy as np
+    day = np.array([_day_number(when or timezone.now())])
+    table = get_rate_table()
+    factor = table.rates(from_currency, day)[0] / table.rates(to_currency, day)[0]
+    return to_decimal(float(amount) * factor)
+
+
+def convert_many(amounts: Sequence[Decimal], currencies: Sequence[str], to_currency: str, days: Sequence) -> list:
+    """``convert`` for many amounts at once; each result matches the scalar call to the cent."""
+    results = list(amounts)
+    foreign = [i for i, currency in enumerate(currencies) if currency != to_currency]
+    if not foreign:
+        return results
+    import numpy as np
+    table = get_rate_table()
+    by_currency = defaultdict(list)
+    for i in foreign:
+        by_currency[currencies[i]].append(i)
+    for currency, idx in by_currency.items():
+        ordinals = np.array([_day_number(days[i]) for i in idx], dtype=np.int64)
+        factors = table.rates(currency, ordinals) / table.rates(to_currency, ordinals)
+        for i, factor in zip(idx, factors):
+            results[i] = to_decimal(float(amounts[i]) * factor)
+    return results
+
+
+def sum_in_base(queryset, *fields, amount_field: str = 'amount') -> Dict:
+    """
+    Sum ``amount_field`` per ``fields`` values, expressed in the base currency.
+
+    One query: base-currency rows collapse into one group per key, other
+    currencies are grouped by (key, currency, day) and converted in bulk.
+    Returns {key: Decimal}; the key is the single field value, a tuple for
+    several fields, or None when no fields are given.
+    """
+    base = base_currency()
+    rows = list(
+        queryset
+        .annotate(
+            fx_currency=F('currency'),
+            fx_day=Case(
+                When(currency=base, then=Value(None, output_field=DateField())),
+                default=TruncDate('date'),
+                output_field=DateField(),
+            ),
+        )
+        .values(*fields, 'fx_currency', 'fx_day')
+        .annotate(fx_total=Sum(amount_field))
+        .order_by()
+    )
+    if not rows:
+        return {}
+
+    def key_of(row):
+        if not fields:
+            return None
+        if len(fields) == 1:
+            return row[fields[0]]
+        return tuple(row[field] for field in fields)
+
+    totals = defaultdict(Decimal)
+    foreign = []
+    for row in rows:
+        if row['fx_currency'] == base:
+            totals[key_of(row)] += row['fx_total']
+        else:
+            foreign.append(row)
+    if foreign:
+        converted = to_base(
+            [row['fx_total'] for row in foreign],
+            [row['fx_currency'] for row in foreign],
+            [row['fx_day'] for row in foreign],
+        )
+        foreign_totals = defaultdict(float)
+        for row, value in zip(foreign, converted):
+            foreign_totals[key_of(row)] += value
+        for key, value in foreign_totals.items():
+            totals[key] += to_decimal(value)
+    return dict(totals)
+
+
+def load_rates(fileobj) -> int:
+    """
+    Upsert rates from CSV with ``date,currency,rate`` columns, where rate is
+    base units per one unit of the currency. Returns the number of rows loaded.
+    """
+    reader = csv.DictReader(fileobj)
+    rows = {}
+    for line, record in enumerate(reader, start=2):
+        try:
+            day = date.fromisoformat((record.get('date') or '').strip())
+            currency = (record.get('currency') or '').strip().upper()
+            rate = Decimal((record.get('rate') or '').strip())
+        except (ValueError, InvalidOperation):
+            raise ValueError(f'Line {line}: expected date,currency,rate')
+        if len(currency) != 3 or rate <= 0:
+            raise ValueError(f'Line {line}: invalid currency or rate')
+        rows[(currency, day)] = rate
+
+    with db_transaction.atomic():
+        FxRate.objects.bulk_create(
+            [FxRate(currency=currency, date=day, rate=rate) for (currency, day), rate in rows.items()],
+            update_conflicts=True,
+            unique_fields=['currency', 'date'],
+            update_fields=['rate'],
+            batch_size=1000,
+        )
+    bump_version('fx', FX_VERSION_SCOPE)
+    logger.info(f'Loaded {len(rows)} FX rates')
+    return len(rows)
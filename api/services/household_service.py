@@ -0,0 +1,114 @@
+"""
+Households (shared ledgers) and per-request ledger scoping.
+
+A budget, transaction or goal belongs to a household ledger when its
+``household_id`` is set and to its owner's personal ledger otherwise.
+``LedgerScope`` holds the ledgers a user can see, i.e. their personal ledger
+plus every household they belong to, and turns them into one filter:
+``household_id IN (...) OR (user_id = me AND household_id IS NULL)``. Each
+side is served by its own index. The household ids are resolved once per
+request and cached per user until one of their memberships changes.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Q
+
+from ..cache_utils import bump_version, versioned_key
+from ..models import Household, HouseholdMembership
+
+SCOPE_CACHE_TTL = 60 * 60
+
+
+class LedgerScope:
+    """The ledgers one user may read and post to."""
+
+    __slots__ = ('user_id', 'household_ids')
+
+    def __init__(self, user_id: int, household_ids: Iterable[int] = ()):
+        self.user_id = user_id
+        self.household_ids = tuple(sorted(household_ids))
+
+    def q(self) -> Q:
+        personal = Q(user_id=self.user_id, household__isnull=True)
+        if not self.household_ids:
+            return personal
+        return Q(household_id__in=self.household_ids) | personal
+
+    def filter(self, queryset):
+        return queryset.filter(self.q())
+
+    def sql(self, alias: str = 't') -> Tuple[str, List]:
+        """The same filter as a raw SQL fragment, for hand-written queries."""
+        personal = f'({alias}.user_id = %s AND {alias}.household_id IS NULL)'
+        if not self.household_ids:
+            return personal, [self.user_id]
+        placeholders = ', '.join(['%s'] * len(self.household_ids))
+        return f'({alias}.household_id IN ({placeholders}) OR {personal})', [*self.household_ids, self.user_id]
+
+    def can_post_to(self, household_id: Optional[int]) -> bool:
+        return household_id is None or household_id in self.household_ids
+
+
+def ledger_scope_for_user(user) -> LedgerScope:
+    key = versioned_key('households', user.id, 'ids')
+    household_ids = cache.get(key)
+    if household_ids is None:
+        household_ids = list(
+            HouseholdMembership.objects.filter(user_id=user.id).values_list('household_id', flat=True)
+        )
+        cache.set(key, household_ids, SCOPE_CACHE_TTL)
+    return LedgerScope(user.id, household_ids)
+
+
+def get_ledger_scope(request) -> LedgerScope:
+    """Resolve the request user's ledgers once and reuse them for the rest of the request."""
+    scope = getattr(request, '_ledger_scope', None)
+    if scope is None or scope.user_id != request.user.id:
+        scope = ledger_scope_for_user(request.user)
+        request._ledger_scope = scope
+    return scope
+
+
+def member_ids(household_id: int) -> List[int]:
+    key = versioned_key('members', household_id, 'ids')
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(HouseholdMembership.objects.filter(household_id=household_id).values_list('user_id', flat=True))
+        cache.set(key, ids, SCOPE_CACHE_TTL)
+    return ids
+
+
+def bump_ledger_data(user_id: Optional[int], household_id: Optional[int] = None) -> None:
+    """Invalidate ledger-derived caches for the author and, for shared rows, every member."""
+    user_ids = set(member_ids(household_id)) if household_id else set()
+    if user_id is not None:
+        user_ids.add(user_id)
+    for uid in user_ids:
+        bump_version('data', uid)
+
+
+def _membership_changed(household_id: int, user_id: int) -> None:
+    bump_version('households', user_id)
+    bump_version('members', household_id)
+    bump_version('data', user_id)
+
+
+def create_household(user, name: str) -> Household:
+    with db_transaction.atomic():
+        household = Household.objects.create(name=name, created_by=user)
+        HouseholdMembership.objects.create(household=household, user=user, role='owner')
+    _membership_changed(household.id, user.id)
+    return household
+
+
+def add_member(household: Household, user, role: str = 'member') -> HouseholdMembership:
+    membership, _ = HouseholdMembership.objects.get_or_create(household=household, user=user, defaults={'role': role})
+    _membership_changed(household.id, user.id)
+    return membership
+
+
+def remove_member(household: Household, user) -> None:
+    HouseholdMembership.objects.filter(household=household, user=user).delete()
+    _membership_changed(household.id, user.id)
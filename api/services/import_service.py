@@ -0,0 +1,346 @@
+"""
+Bank statement import (CSV and OFX).
+
+Files are parsed as a stream and inserted in fixed-size chunks, so memory
+stays bounded by the chunk size rather than the file size. Each imported row
+carries a fingerprint of (date, type, amount, description), or of its
+``source`` when it has one (a scanned receipt's image); rows whose
+fingerprint already existed before the import started are skipped, which makes
+re-importing an overlapping statement safe.
+"""
+import codecs
+import csv
+import hashlib
+import io
+import logging
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from django.db import transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..cache_utils import bump_version
+from ..models import ArchivedTransaction, Transaction
+from .alert_service import check_budget_alerts
+from .anomaly_service import record_expenses
+from .archive_service import archive_boundary
+from .budget_service import adjust_budgets
+from .categorization_service import UNCATEGORIZED, get_matcher
+from .fx_service import base_currency
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CATEGORY = UNCATEGORIZED
+MAX_REPORTED_ERRORS = 20
+SUPPORTED_FORMATS = ('csv', 'ofx')
+
+# ``source`` identifies where a row came from when its fields cannot (e.g. an image digest).
+StatementRow = namedtuple('StatementRow', 'date amount type category description source', defaults=('',))
+
+
+class StatementFormatError(ValueError):
+    """Raised when a statement cannot be parsed at all (unknown format or columns)."""
+
+
+class RowError(ValueError):
+    """Raised for a single unparseable row; the import skips it and continues."""
+
+
+CSV_COLUMNS = {
+    'date': ('date', 'transaction date', 'txn date', 'value date', 'posted date', 'posting date'),
+    'description': ('description', 'narration', 'details', 'memo', 'particulars', 'payee', 'name', 'remarks'),
+    'amount': ('amount', 'transaction amount'),
+    'debit': ('debit', 'debit amount', 'withdrawal', 'withdrawals', 'withdrawal amt.', 'withdrawal amount'),
+    'credit': ('credit', 'credit amount', 'deposit', 'deposits', 'deposit amt.', 'deposit amount'),
+    'category': ('category',),
+    'type': ('type', 'transaction type', 'dr/cr'),
+}
+
+DATE_FORMATS = (
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y',
+    '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y', '%m/%d/%Y',
+)
+
+EXPENSE_MARKERS = ('expense', 'debit', 'dr', 'd', 'withdrawal')
+INCOME_MARKERS = ('income', 'credit', 'cr', 'c', 'deposit')
+
+
+def detect_format(filename: str) -> str:
+    name = (filename or '').lower()
+    if name.endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    return 'csv'
+
+
+def parse_date(value: str) -> datetime:
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return timezone.make_aware(parsed)
+    raise RowError(f'Unrecognised date {value!r}')
+
+
+def parse_amount(value: str) -> Optional[Decimal]:
+    """Parse '1,234.50', '₹ 99', '(45.00)' and '-45' style amounts; blank is None."""
+    text = (value or '').strip()
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    text = re.sub(r'[^0-9.\-]', '', text)
+    if not text or text in ('-', '.'):
+        return None
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise RowError(f'Unrecognised amount {value!r}')
+    return -amount if negative else amount
+
+
+def fingerprint(row: StatementRow) -> str:
+    if row.source:
+        key = f'source|{row.source}'
+    else:
+        description = ' '.join(row.description.lower().split())
+        key = f'{row.date.date().isoformat()}|{row.type}|{abs(row.amount):.2f}|{description}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _text_stream(fileobj) -> io.TextIOBase:
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return codecs.getreader('utf-8-sig')(fileobj, errors='replace')
+
+
+def _map_columns(fieldnames) -> Dict[str, str]:
+    normalized = {name.strip().lower(): name for name in fieldnames if name}
+    mapping = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                mapping[field] = normalized[alias]
+                break
+    if 'date' not in mapping:
+        raise StatementFormatError('CSV has no date column')
+    if 'amount' not in mapping and not ('debit' in mapping or 'credit' in mapping):
+        raise StatementFormatError('CSV has no amount or debit/credit columns')
+    return mapping
+
+
+def _field(record, mapping, key) -> str:
+    column = mapping.get(key)
+    return (record.get(column) or '').strip() if column else ''
+
+
+def iter_csv_rows(fileobj) -> Iterator[StatementRow]:
+    """
+    Yield one StatementRow (or RowError) per CSV record.
+
+    Columns are matched by common bank header names. Separate debit/credit
+    columns decide the type directly; otherwise a type column is used, and
+    failing that a negative amount means an expense.
+    """
+    reader = csv.DictReader(_text_stream(fileobj))
+    mapping = _map_columns(reader.fieldnames or [])
+
+    for record in reader:
+        try:
+            date = parse_date(_field(record, mapping, 'date'))
+            description = _field(record, mapping, 'description')
+            category = _field(record, mapping, 'category')
+
+            debit = parse_amount(_field(record, mapping, 'debit'))
+            credit = parse_amount(_field(record, mapping, 'credit'))
+            if debit:
+                amount, tx_type = abs(debit), 'expense'
+            elif credit:
+                amount, tx_type = abs(credit), 'income'
+            else:
+                amount = parse_amount(_field(record, mapping, 'amount'))
+                if not amount:
+                    raise RowError('Missing amount')
+                marker = _field(record, mapping, 'type').lower()
+                if marker in EXPENSE_MARKERS:
+                    tx_type = 'expense'
+                elif marker in INCOME_MARKERS:
+                    tx_type = 'income'
+                else:
+                    tx_type = 'expense' if amount < 0 else 'income'
+                amount = abs(amount)
+        except RowError as exc:
+            yield RowError(f'Line {reader.line_num}: {exc}')
+            continue
+        yield StatementRow(date, amount, tx_type, category[:100], description)
+
+
+_OFX_TOKEN = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _ofx_tokens(stream, block_size: int = 64 * 1024) -> Iterator:
+    """Yield (closing, tag, text) tokens, reading the stream in fixed-size blocks."""
+    buffer = ''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        buffer += block
+        cut = buffer.rfind('<')
+        if cut <= 0:
+            continue
+        for match in _OFX_TOKEN.finditer(buffer, 0, cut):
+            yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[cut:]
+    for match in _OFX_TOKEN.finditer(buffer):
+        yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+
+def iter_ofx_rows(fileobj) -> Iterator[StatementRow]:
+    """Yield one StatementRow (or RowError) per <STMTTRN>; handles SGML and XML OFX."""
+    current = None
+    count = 0
+    for closing, tag, text in _ofx_tokens(_text_stream(fileobj)):
+        if tag == 'STMTTRN':
+            if not closing:
+                current = {}
+                continue
+            if current is None:
+                continue
+            count += 1
+            fields, current = current, None
+            try:
+                posted = fields.get('DTPOSTED', '')[:8]
+                date = timezone.make_aware(datetime.strptime(posted, '%Y%m%d'))
+                amount = parse_amount(fields.get('TRNAMT'))
+                if not amount:
+                    raise RowError('Missing amount')
+            except (RowError, ValueError) as exc:
+                yield RowError(f'Transaction {count}: {exc}')
+                continue
+            description = ' '.join(filter(None, (fields.get('NAME', ''), fields.get('MEMO', ''))))
+            tx_type = 'expense' if amount < 0 else 'income'
+            yield StatementRow(date, abs(amount), tx_type, '', description.strip())
+        elif current is not None and not closing and text:
+            current[tag] = text
+
+
+def iter_statement_rows(fileobj, fmt: str):
+    """Yield StatementRow/RowError items; ``category`` is blank when the file has none."""
+    if fmt == 'csv':
+        return iter_csv_rows(fileobj)
+    if fmt == 'ofx':
+        return iter_ofx_rows(fileobj)
+    raise StatementFormatError(f'Unsupported format {fmt!r}; expected one of {", ".join(SUPPORTED_FORMATS)}')
+
+
+def _flush(user, rows, watermark, result, touched, matcher, default_category, currency) -> None:
+    fingerprints = [fingerprint(row) for row in rows]
+    existing = set(
+        Transaction.objects
+        .filter(user=user, fingerprint__in=set(fingerprints), id__lte=watermark)
+        .values_list('fingerprint', flat=True)
+    )
+    boundary = archive_boundary()
+    if boundary is not None and min(row.date for row in rows) <= boundary:
+        # Re-importing an old statement must also match rows already archived.
+        existing.update(
+            ArchivedTransaction.objects
+            .filter(user=user, fingerprint__in=set(fingerprints))
+            .values_list('fingerprint', flat=True)
+        )
+    new = [
+        Transaction(
+            user=user, date=row.date, amount=row.amount, type=row.type,
+            category=row.category or matcher.categorize(row.description, row.amount) or default_category,
+            description=row.description, fingerprint=fp, currency=currency,
+        )
+        for row, fp in zip(rows, fingerprints)
+        if fp not in existing
+    ]
+    with db_transaction.atomic():
+        Transaction.objects.bulk_create(new)
+        budgets = adjust_budgets((tx, 1) for tx in new)
+        record_expenses(new)
+    result['imported'] += len(new)
+    result['duplicates'] += len(rows) - len(new)
+    touched.update((budget.pk, budget) for budget in budgets)
+
+
+def import_statement(
+    user,
+    fileobj,
+    fmt: str = 'csv',
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    default_category: str = DEFAULT_CATEGORY,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    currency: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Stream-import a statement for ``user``.
+
+    All rows are in ``currency`` (the base currency by default), since a
+    statement covers one account. See ``import_rows`` for the rest.
+    """
+    return import_rows(
+        user, iter_statement_rows(fileobj, fmt), chunk_size=chunk_size,
+        default_category=default_category, progress=progress, currency=currency,
+    )
+
+
+def import_rows(
+    user,
+    rows_iter: Iterable,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    default_category: str = DEFAULT_CATEGORY,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    currency: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Bulk-insert parsed ``StatementRow``s (``RowError``s are counted and skipped) for ``user``.
+
+    Rows without a category go through the user's categorization rules and
+    fall back to ``default_category``. Each chunk is deduplicated with one
+    indexed fingerprint lookup, inserted with ``bulk_create`` and rolled into
+    budgets set-wise inside its own transaction. ``progress`` is called after
+    every chunk with the running totals. Returns the final totals plus the
+    first few row errors.
+    """
+    currency = currency or base_currency()
+    matcher = get_matcher(user.id)
+    watermark = Transaction.objects.filter(user=user).aggregate(top=Max('id'))['top'] or 0
+    result = {'processed': 0, 'imported': 0, 'duplicates': 0, 'errors': [], 'error_count': 0}
+    touched = {}
+
+    chunk = []
+    for row in rows_iter:
+        result['processed'] += 1
+        if isinstance(row, RowError):
+            result['error_count'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append(str(row))
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _flush(user, chunk, watermark, result, touched, matcher, default_category, currency)
+            chunk = []
+            if progress:
+                progress(result)
+    if chunk:
+        _flush(user, chunk, watermark, result, touched, matcher, default_category, currency)
+        if progress:
+            progress(result)
+
+    check_budget_alerts(touched.values())
+    if result['imported']:
+        bump_version('data', user.id)
+    logger.info(
+        f"Import for user {user.id}: {result['imported']} imported, "
+        f"{result['duplicates']} duplicates, {result['error_count']} errors"
+    )
+    return result
@@ -6,7 +6,10 @@ import os
 import json
 import logging
 import base64
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from .llm_usage_service import CallRecorder
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +17,19 @@ logger = logging.getLogger(__name__)
 MAX_PROMPT_LENGTH = 4000
 MAX_IMAGE_SIZE_MB = 5
 
+OPENAI_MODEL = "gpt-4o-mini"
+GEMINI_MODEL = "gemini-2.5-flash"
+
+
+def _openai_tokens(response) -> Tuple[int, int]:
+    usage = getattr(response, 'usage', None)
+    return (getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def _gemini_tokens(response) -> Tuple[int, int]:
+    usage = getattr(response, 'usage_metadata', None)
+    return (getattr(usage, 'prompt_token_count', 0) or 0, getattr(usage, 'candidates_token_count', 0) or 0)
+
 
 def _get_openai_client():
     """Get OpenAI client with API key from environment."""
@@ -48,13 +64,14 @@ def _get_gemini_client():
         return None
 
 
-def generate_insights(prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+def generate_insights(prompt: str, context: Optional[Dict[str, Any]] = None, user_id: Optional[int] = None) -> str:
     """
     Generate AI-powered financial insights using OpenAI.
     
     Args:
         prompt: User's question or context for insights
         context: Optional financial data context
+        user_id: Who asked, for usage accounting
         
     Returns:
         AI-generated insight text or fallback message
@@ -66,12 +83,19 @@ def generate_insights(prompt: str, context: Optional[Dict[str, Any]] = None) ->
     if len(prompt) > MAX_PROMPT_LENGTH:
         return "Input too long. Please shorten your request."
     
+    with CallRecorder('insight', user_id, fallback='rules') as usage:
+        return _insight_with_openai(prompt, context, usage)
+
+
+def _insight_with_openai(prompt: str, context: Optional[Dict[str, Any]], usage: CallRecorder) -> str:
     client = _get_openai_client()
     
     if not client:
         logger.info("OpenAI not available, using rule-based fallback")
+        usage.attempt('openai', OPENAI_MODEL, 'off')
         return _generate_fallback_insight(context)
     
+    started = time.perf_counter()
     try:
         # Build system prompt with financial context
         system_prompt = """You are a helpful financial advisor assistant for FinTrack, 
@@ -88,7 +112,7 @@ Do not provide specific investment advice or guarantees."""
         logger.info(f"Calling OpenAI API for insights (prompt length: {len(prompt)})")
         
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
@@ -98,21 +122,25 @@ Do not provide specific investment advice or guarantees."""
         )
         
         result = response.choices[0].message.content.strip()
+        usage.attempt('openai', OPENAI_MODEL, 'ok', started, *_openai_tokens(response))
         logger.info("OpenAI API call successful")
         return result
         
     except Exception as e:
         logger.error(f"OpenAI API error: {type(e).__name__} - {str(e)[:100]}")
+        usage.attempt('openai', OPENAI_MODEL, 'error', started)
         return _generate_fallback_insight(context)
 
 
-def scan_receipt_image(image_data: str) -> Dict[str, Any]:
+def scan_receipt_image(image_data: str, user_id: Optional[int] = None, usage_sink: Optional[list] = None) -> Dict[str, Any]:
     """
     Scan receipt image using AI to extract transaction data.
     Supports both OpenAI Vision and Gemini as fallback.
     
     Args:
         image_data: Base64 encoded image data
+        user_id: Who asked, for usage accounting
+        usage_sink: Collect the usage row here instead of saving it
         
     Returns:
         Dict with success status, demo_mode flag, and extracted data
@@ -137,15 +165,16 @@ def scan_receipt_image(image_data: str) -> Dict[str, Any]:
             'error': f'Image too large. Maximum size is {MAX_IMAGE_SIZE_MB}MB'
         }
     
-    # Try OpenAI Vision first
-    result = _scan_with_openai(image_data_clean)
-    if result['success'] and not result.get('demo_mode'):
-        return result
-    
-    # Fallback to Gemini
-    result = _scan_with_gemini(image_data_clean)
-    if result['success'] and not result.get('demo_mode'):
-        return result
+    with CallRecorder('receipt_scan', user_id, fallback='demo', sink=usage_sink) as usage:
+        # Try OpenAI Vision first
+        result = _scan_with_openai(image_data_clean, usage)
+        if result['success'] and not result.get('demo_mode'):
+            return result
+        
+        # Fallback to Gemini
+        result = _scan_with_gemini(image_data_clean, usage)
+        if result['success'] and not result.get('demo_mode'):
+            return result
     
     # Demo mode fallback
     logger.info("No AI service available, returning demo data")
@@ -161,19 +190,23 @@ def scan_receipt_image(image_data: str) -> Dict[str, Any]:
     }
 
 
-def _scan_with_openai(image_data: str) -> Dict[str, Any]:
+def _scan_with_openai(image_data: str, usage: CallRecorder) -> Dict[str, Any]:
     """Scan receipt using OpenAI Vision."""
     client = _get_openai_client()
     if not client:
+        usage.attempt('openai', OPENAI_MODEL, 'off')
         return {'success': True, 'demo_mode': True, 'data': {}}
     
+    started = time.perf_counter()
+    tokens = (0, 0)
     try:
         prompt = """Analyze this receipt/transaction image and extract:
 {
     "amount": "total amount as number (e.g., 299.50)",
     "category": "Food, Shopping, Transportation, Entertainment, Utilities, Healthcare, Education, or Other",
     "description": "brief description of transaction",
-    "type": "expense or income"
+    "type": "expense or income",
+    "date": "transaction date as YYYY-MM-DD, or null if none is printed"
 }
 Return ONLY valid JSON. Focus on TOTAL amount."""
 
@@ -181,7 +214,7 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
         
         try:
             response = client.chat.completions.create(
-                model="gpt-4o-mini",
+                model=OPENAI_MODEL,
                 messages=[
                     {
                         "role": "user",
@@ -200,8 +233,10 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
             )
         except Exception as api_error:
             logger.error(f"OpenAI API call failed: {type(api_error).__name__}: {str(api_error)[:200]}")
+            usage.attempt('openai', OPENAI_MODEL, 'error', started)
             return {'success': True, 'demo_mode': True, 'data': {}}
         
+        tokens = _openai_tokens(response)
         response_text = response.choices[0].message.content.strip()
         
         # Clean markdown if present
@@ -211,6 +246,7 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
             response_text = re.sub(r'\s*```$', '', response_text)
         
         data = json.loads(response_text)
+        usage.attempt('openai', OPENAI_MODEL, 'ok', started, *tokens)
         logger.info("OpenAI Vision scan successful")
         
         return {
@@ -221,15 +257,20 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
         
     except Exception as e:
         logger.error(f"OpenAI Vision error: {type(e).__name__} - {str(e)[:100]}")
+        # An unreadable answer was still billed.
+        usage.attempt('openai', OPENAI_MODEL, 'error', started, *tokens)
         return {'success': True, 'demo_mode': True, 'data': {}}
 
 
-def _scan_with_gemini(image_data: str) -> Dict[str, Any]:
+def _scan_with_gemini(image_data: str, usage: CallRecorder) -> Dict[str, Any]:
     """Scan receipt using Google Gemini."""
     client = _get_gemini_client()
     if not client:
+        usage.attempt('gemini', GEMINI_MODEL, 'off')
         return {'success': True, 'demo_mode': True, 'data': {}}
     
+    started = time.perf_counter()
+    tokens = (0, 0)
     try:
         from google.genai import types
         from PIL import Image
@@ -240,7 +281,8 @@ def _scan_with_gemini(image_data: str) -> Dict[str, Any]:
     "amount": "total amount as number (e.g., 299.50)",
     "category": "Food, Shopping, Transportation, Entertainment, Utilities, Healthcare, Education, or Other",
     "description": "brief description of transaction",
-    "type": "expense or income"
+    "type": "expense or income",
+    "date": "transaction date as YYYY-MM-DD, or null if none is printed"
 }
 Return ONLY valid JSON. Focus on TOTAL amount."""
 
@@ -250,13 +292,14 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
         
         # Use the new google-genai SDK format
         response = client.models.generate_content(
-            model="gemini-2.5-flash",
+            model=GEMINI_MODEL,
             contents=[
                 types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
                 prompt
             ]
         )
         
+        tokens = _gemini_tokens(response)
         response_text = response.text.strip()
         
         # Clean markdown if present
@@ -266,6 +309,7 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
             response_text = re.sub(r'\s*```$', '', response_text)
         
         data = json.loads(response_text)
+        usage.attempt('gemini', GEMINI_MODEL, 'ok', started, *tokens)
         logger.info("Gemini scan successful")
         
         return {
@@ -276,6 +320,7 @@ Return ONLY valid JSON. Focus on TOTAL amount."""
         
     except Exception as e:
         logger.error(f"Gemini error: {type(e).__name__} - {str(e)[:100]}")
+        usage.attempt('gemini', GEMINI_MODEL, 'error', started, *tokens)
         return {'success': True, 'demo_mode': True, 'data': {}}
 
 
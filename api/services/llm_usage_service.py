@@ -0,0 +1,250 @@
+"""
+LLM usage accounting.
+
+Every user-facing AI request (an insight prompt or a receipt scan) is stored
+as one ``LLMCall`` row by ``CallRecorder``. The row holds the provider and
+model that answered, the total latency, token counts, the estimated cost
+(``LLM_PRICES``) and the chain of providers tried. ``rollup_usage`` runs
+nightly through the ``rollup_llm_usage`` command. It folds each finished day
+into ``LLMUsageDay`` rows per user, operation and provider, each with a
+latency histogram. It then deletes raw calls older than
+``LLM_CALL_RETENTION_DAYS``. ``usage_report`` reads the rollups plus the
+calls not rolled up yet, so its cost depends on the number of days, not on
+traffic.
+"""
+import bisect
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import LLMCall, LLMUsageDay
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket holds anything slower.
+LATENCY_BUCKETS_MS = (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000, 60000)
+TOP_USERS = 50
+ROLLUP_LOCK_KEY = 'fintrack:llm_usage:rollup_lock'
+ROLLUP_LOCK_SECONDS = 60 * 60
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Decimal:
+    """Estimated USD cost from ``LLM_PRICES`` (per million input/output tokens); 0 for unpriced models."""
+    prices = settings.LLM_PRICES.get(model)
+    if not prices:
+        return Decimal('0')
+    per_input, per_output = (Decimal(str(p)) for p in prices)
+    return (prompt_tokens * per_input + completion_tokens * per_output) / 1_000_000
+
+
+class CallRecorder:
+    """
+    Collects one AI request's provider attempts and stores them as an
+    ``LLMCall`` on exit. ``fallback`` names what answered when no provider
+    did ('rules' for insights, 'demo' for receipt scans). With a ``sink``
+    list the unsaved row is appended to it instead, for callers that
+    bulk-insert (and for worker threads, which should not open connections).
+    """
+
+    def __init__(self, operation: str, user_id: Optional[int] = None, fallback: str = 'rules',
+                 sink: Optional[List[LLMCall]] = None):
+        self.operation = operation
+        self.user_id = user_id
+        self.fallback = fallback
+        self.sink = sink
+        self.attempts: List[str] = []
+        self.provider = self.model = ''
+        self.prompt_tokens = self.completion_tokens = 0
+        self.cost = Decimal('0')
+        self.failed_before_answer = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def attempt(self, provider: str, model: str, outcome: str, started: Optional[float] = None,
+                prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """Record one provider call: outcome is 'ok', 'error' or 'off' (not configured)."""
+        elapsed = int((time.perf_counter() - started) * 1000) if started is not None else 0
+        self.attempts.append(f'{provider}:{outcome}:{elapsed}')
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.cost += llm_cost(model, prompt_tokens or 0, completion_tokens or 0)
+        if outcome == 'ok' and not self.provider:
+            self.provider, self.model = provider, model
+        elif outcome == 'error' and not self.provider:
+            self.failed_before_answer = True
+
+    def __exit__(self, *exc_info):
+        if self.provider:
+            outcome = 'fallback' if self.failed_before_answer else 'ok'
+        else:
+            outcome = 'demo' if self.fallback == 'demo' else 'fallback'
+        call = LLMCall(
+            user_id=self.user_id, operation=self.operation, provider=self.provider or self.fallback,
+            model=self.model, outcome=outcome, chain='>'.join(self.attempts)[:200],
+            latency_ms=int((time.perf_counter() - self.started) * 1000),
+            prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens, cost_usd=self.cost,
+        )
+        if self.sink is not None:
+            self.sink.append(call)
+            return False
+        try:
+            call.save()
+        except DatabaseError:
+            # Accounting must never fail the request it describes.
+            logger.exception('Could not record LLM call')
+        return False
+
+
+def _day_start(day) -> datetime:
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def _new_group() -> Dict[str, Any]:
+    return {
+        'calls': 0, 'fallbacks': 0, 'demos': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+        'cost_usd': Decimal('0'), 'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def _aggregate(calls) -> Dict[tuple, Dict[str, Any]]:
+    """Group raw calls by (day, user_id, operation, provider), in one streaming pass."""
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    rows = calls.values_list(
+        'created_at', 'user_id', 'operation', 'provider', 'outcome', 'latency_ms',
+        'prompt_tokens', 'completion_tokens', 'cost_usd',
+    ).iterator(chunk_size=5000)
+    for created_at, user_id, operation, provider, outcome, latency, prompt, completion, cost in rows:
+        key = (timezone.localdate(created_at), user_id, operation, provider)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _new_group()
+        group['calls'] += 1
+        group['fallbacks'] += outcome == 'fallback'
+        group['demos'] += outcome == 'demo'
+        group['prompt_tokens'] += prompt
+        group['completion_tokens'] += completion
+        group['cost_usd'] += cost
+        group['latency_histogram'][bisect.bisect_left(LATENCY_BUCKETS_MS, latency)] += 1
+    return groups
+
+
+def _last_rolled_day():
+    return LLMUsageDay.objects.aggregate(last=Max('day'))['last']
+
+
+def rollup_usage(retention_days: Optional[int] = None) -> Dict[str, int]:
+    """
+    Roll every finished day not rolled up yet into LLMUsageDay, then prune old
+    raw calls. Runs are serialized by a lock in the shared cache; a run that
+    finds it held does nothing. Days that already have rows are skipped, and
+    the unique constraint backs that up, so a day is never counted twice.
+    """
+    retention_days = settings.LLM_CALL_RETENTION_DAYS if retention_days is None else retention_days
+    if not cache.add(ROLLUP_LOCK_KEY, uuid.uuid4().hex, ROLLUP_LOCK_SECONDS):
+        logger.warning('LLM usage rollup already running; skipped')
+        return {'days': 0, 'rows': 0, 'pruned': 0}
+    try:
+        today = timezone.localdate()
+        calls = LLMCall.objects.filter(created_at__lt=_day_start(today))
+        last = _last_rolled_day()
+        if last is not None:
+            # Rolled days are final; their raw calls may already be pruned.
+            calls = calls.filter(created_at__gte=_day_start(last + timedelta(days=1)))
+        groups = _aggregate(calls)
+        with db_transaction.atomic():
+            # A day is written in one transaction, so any row means it is done.
+            # This also covers rows without a user, which the constraint cannot.
+            done = set(LLMUsageDay.objects.filter(day__in={key[0] for key in groups}).values_list('day', flat=True))
+            groups = {key: group for key, group in groups.items() if key[0] not in done}
+            LLMUsageDay.objects.bulk_create([
+                LLMUsageDay(day=day, user_id=user_id, operation=operation, provider=provider, **group)
+                for (day, user_id, operation, provider), group in groups.items()
+            ], batch_size=1000, ignore_conflicts=True)
+            pruned, _ = LLMCall.objects.filter(created_at__lt=_day_start(today - timedelta(days=retention_days))).delete()
+    finally:
+        cache.delete(ROLLUP_LOCK_KEY)
+    return {'days': len({key[0] for key in groups}), 'rows': len(groups), 'pruned': pruned}
+
+
+def percentile(histogram: List[int], q: float) -> Optional[int]:
+    """Upper bound (ms) of the bucket holding the q-th quantile; None when it is the overflow bucket or empty."""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, histogram):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+def _merge(target: Dict[str, Any], group: Dict[str, Any]) -> None:
+    for field in ('calls', 'fallbacks', 'demos', 'prompt_tokens', 'completion_tokens', 'cost_usd'):
+        target[field] += group[field]
+    target['latency_histogram'] = [a + b for a, b in zip(target['latency_histogram'], group['latency_histogram'])]
+
+
+def _summary(group: Dict[str, Any]) -> Dict[str, Any]:
+    calls = group['calls']
+    return {
+        'calls': calls,
+        'fallback_rate': round(group['fallbacks'] / calls, 4) if calls else 0,
+        'demo_rate': round(group['demos'] / calls, 4) if calls else 0,
+        'prompt_tokens': group['prompt_tokens'],
+        'completion_tokens': group['completion_tokens'],
+        'cost_usd': float(round(group['cost_usd'], 6)),
+        'p50_ms': percentile(group['latency_histogram'], 0.5),
+        'p95_ms': percentile(group['latency_histogram'], 0.95),
+    }
+
+
+def usage_report(days: int = 30) -> Dict[str, Any]:
+    """Totals, latency percentiles per operation and provider, per-day and per-user figures for the last ``days`` days."""
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+    groups = {
+        (row.day, row.user_id, row.operation, row.provider): {
+            field: getattr(row, field) for field in _new_group()
+        }
+        for row in LLMUsageDay.objects.filter(day__gte=since)
+    }
+    last = _last_rolled_day()
+    live_from = since if last is None or last < since else last + timedelta(days=1)
+    groups.update(_aggregate(LLMCall.objects.filter(created_at__gte=_day_start(live_from))))
+
+    total, by_route, by_day, by_user = _new_group(), {}, {}, {}
+    for (day, user_id, operation, provider), group in groups.items():
+        _merge(total, group)
+        for index, key in ((by_route, (operation, provider)), (by_day, day), (by_user, user_id)):
+            _merge(index.setdefault(key, _new_group()), group)
+
+    top_users = sorted(by_user.items(), key=lambda item: -item[1]['cost_usd'])[:TOP_USERS]
+    names = dict(User.objects.filter(pk__in=[uid for uid, _ in top_users]).values_list('id', 'username'))
+    return {
+        'since': since.isoformat(),
+        'totals': _summary(total),
+        'latency': [
+            {'operation': operation, 'provider': provider, **_summary(group)}
+            for (operation, provider), group in sorted(by_route.items())
+        ],
+        'daily': [{'day': day.isoformat(), **_summary(group)} for day, group in sorted(by_day.items())],
+        'users': [
+            {'user_id': uid, 'username': names.get(uid), **_summary(group)}
+            for uid, group in top_users
+        ],
+    }
@@ -0,0 +1,135 @@
+"""
+Batch receipt scanning.
+
+``scan_receipts`` takes many base64 images and yields ``(index, result)``
+as each one finishes, so callers can stream results. Every image is
+prepared in a thread pool: decoded, validated and, when PIL is installed,
+downscaled to a JPEG of at most ``RECEIPT_MAX_SIDE`` pixels. Its provider
+call is then submitted to the same pool, so at most
+``RECEIPT_SCAN_CONCURRENCY`` images are in flight. Each goes through the
+usual OpenAI → Gemini → demo chain of ``scan_receipt_image``. Worker threads
+never touch the database; their usage rows are collected and inserted in
+one statement when the batch ends. ``receipt_rows`` turns the successful
+scans into statement rows for ``import_rows``, keyed by a digest of the
+image so the same photo is never imported twice.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import LLMCall
+from .import_service import RowError, StatementRow, parse_amount, parse_date
+from .llm_service import MAX_IMAGE_SIZE_MB, scan_receipt_image
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_MAX_SIDE = 1600
+JPEG_QUALITY = 85
+
+
+def prepare_image(image_data: str) -> str:
+    """Base64 JPEG payload for the providers; raises ValueError for anything that is not a usable image."""
+    payload = image_data.split(',', 1)[1] if ',' in image_data else image_data
+    try:
+        raw = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Image is not valid base64')
+    if len(raw) > MAX_IMAGE_SIZE_MB * 1024 * 1024:
+        raise ValueError(f'Image too large. Maximum size is {MAX_IMAGE_SIZE_MB}MB')
+    try:
+        from PIL import Image
+    except ImportError:
+        return payload
+    try:
+        image = Image.open(io.BytesIO(raw))
+        if image.format == 'JPEG' and max(image.size) <= RECEIPT_MAX_SIDE:
+            return payload
+        # Providers are sent image/jpeg, and a smaller image is fewer tokens.
+        image.thumbnail((RECEIPT_MAX_SIDE, RECEIPT_MAX_SIDE))
+        out = io.BytesIO()
+        image.convert('RGB').save(out, 'JPEG', quality=JPEG_QUALITY)
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('File is not a readable image')
+    return base64.b64encode(out.getvalue()).decode()
+
+
+def _scan(payload: str, user_id: Optional[int], sink: List[LLMCall]) -> Dict[str, Any]:
+    try:
+        return scan_receipt_image(payload, user_id=user_id, usage_sink=sink)
+    except Exception as e:
+        logger.error(f"Receipt scan error: {type(e).__name__}")
+        return {'success': False, 'error': 'Failed to process receipt'}
+
+
+def scan_receipts(images: List[str], user_id: Optional[int] = None,
+                  concurrency: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Scan ``images`` concurrently; yields (index, result) in completion order."""
+    pool = ThreadPoolExecutor(
+        max_workers=concurrency or settings.RECEIPT_SCAN_CONCURRENCY, thread_name_prefix='receipt-scan',
+    )
+    calls: List[LLMCall] = []
+    try:
+        preparing = {pool.submit(prepare_image, image): index for index, image in enumerate(images)}
+        scanning = {}
+        pending = set(preparing)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in preparing:
+                    index = preparing[future]
+                    try:
+                        payload = future.result()
+                    except ValueError as e:
+                        yield index, {'success': False, 'error': str(e)}
+                        continue
+                    scan = pool.submit(_scan, payload, user_id, calls)
+                    scanning[scan] = index
+                    pending.add(scan)
+                else:
+                    yield scanning[future], future.result()
+    finally:
+        # Also runs when the client goes away mid-stream: drop queued work, keep what was paid for.
+        pool.shutdown(wait=True, cancel_futures=True)
+        LLMCall.objects.bulk_create(calls)
+
+
+def image_digest(image_data: str) -> str:
+    """SHA-256 of the base64 image as sent, ignoring any data: URL prefix and whitespace."""
+    payload = image_data.split(',', 1)[1] if ',' in image_data else image_data
+    return hashlib.sha256(''.join(payload.split()).encode()).hexdigest()
+
+
+def receipt_rows(scans: Iterable[Tuple[int, Dict[str, Any]]], images: List[str]) -> Iterator:
+    """
+    StatementRow for each scanned receipt's data (``images[index]`` is the
+    scanned image), or RowError naming the image. Rows are dated with the
+    receipt's printed date when the provider read one, else now.
+    """
+    now = timezone.now()
+    for index, data in scans:
+        try:
+            amount = parse_amount(str(data.get('amount', '')))
+            if not amount:
+                raise RowError('no amount found')
+        except RowError as e:
+            yield RowError(f'Image {index}: {e}')
+            continue
+        try:
+            date = min(parse_date(str(data.get('date') or '')), now)
+        except RowError:
+            date = now
+        kind = 'income' if str(data.get('type', '')).strip().lower() == 'income' else 'expense'
+        yield StatementRow(
+            date=date, amount=abs(amount).quantize(Decimal('0.01')), type=kind,
+            category=str(data.get('category') or '').strip()[:100],
+            description=str(data.get('description') or '').strip(),
+            source=f'receipt:{image_digest(images[index])}',
+        )
@@ -0,0 +1,38 @@
+"""
+The income/expense summary with per-budget utilization, shared by the
+``/api/reports/summary/`` endpoint and the command-line client.
+"""
+from decimal import Decimal
+from typing import Any, Dict
+
+from ..models import Budget
+from .archive_service import ledger_history, sum_history
+from .fx_service import base_currency
+from .household_service import LedgerScope
+
+
+def report_summary(scope: LedgerScope) -> Dict[str, Any]:
+    totals = sum_history(ledger_history(scope), 'type')
+    income_total = totals.get('income', Decimal('0'))
+    expense_total = totals.get('expense', Decimal('0'))
+
+    budget_data = []
+    for budget in scope.filter(Budget.objects.all()).order_by('category'):
+        budget_data.append({
+            'category': budget.category,
+            'currency': budget.currency,
+            'limit_amount': budget.limit_amount,
+            'spent_amount': budget.spent_amount,
+            'remaining': budget.limit_amount - budget.spent_amount,
+            'utilization_pct': int((budget.spent_amount / budget.limit_amount) * 100) if budget.limit_amount > 0 else 0
+        })
+
+    return {
+        'summary': {
+            'currency': base_currency(),
+            'totalIncome': income_total,
+            'totalExpenses': expense_total,
+            'netAmount': income_total - expense_total
+        },
+        'budgetAnalysis': budget_data
+    }
@@ -0,0 +1,236 @@
+"""
+Full-text search over transaction descriptions and categories.
+
+SQLite uses an FTS5 external-content table kept in sync by triggers, so
+bulk inserts and queryset updates are indexed too. PostgreSQL uses a GIN
+index over a ``tsvector`` expression. Other backends fall back to
+``icontains`` filtering.
+"""
+import base64
+import json
+import logging
+import math
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Q
+
+from ..models import Transaction
+from .household_service import LedgerScope
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_TERMS = 8
+
+FTS_TABLE = 'api_transaction_fts'
+PG_INDEX = 'api_transaction_search_gin'
+PG_VECTOR = "to_tsvector('simple', coalesce({alias}description, '') || ' ' || coalesce({alias}category, ''))"
+
+SQLITE_TRIGGERS = {
+    'api_transaction_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS api_transaction_fts_ai AFTER INSERT ON api_transaction BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, description, category)
+            VALUES (new.id, new.description, new.category);
+        END""",
+    'api_transaction_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS api_transaction_fts_ad AFTER DELETE ON api_transaction BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category)
+            VALUES ('delete', old.id, old.description, old.category);
+        END""",
+    'api_transaction_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS api_transaction_fts_au
+        AFTER UPDATE OF description, category ON api_transaction BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category)
+            VALUES ('delete', old.id, old.description, old.category);
+            INSERT INTO {FTS_TABLE}(rowid, description, category)
+            VALUES (new.id, new.description, new.category);
+        END""",
+}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def ensure_search_index(using_connection=None) -> None:
+    """
+    Create the search index if it is missing.
+
+    Safe to call repeatedly. On SQLite, Django rebuilds ``api_transaction``
+    when a migration alters it, which drops our triggers, so this runs after
+    every ``migrate`` and rebuilds the FTS table whenever triggers were absent.
+    """
+    conn = using_connection or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)"
+                % ', '.join(['%s'] * len(SQLITE_TRIGGERS)),
+                list(SQLITE_TRIGGERS),
+            )
+            present = {row[0] for row in cursor.fetchall()}
+            if present == set(SQLITE_TRIGGERS):
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "description, category, content='api_transaction', content_rowid='id', "
+                "tokenize='unicode61', prefix='2 3')"
+            )
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            logger.info("Transaction FTS index (re)built")
+        elif conn.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON api_transaction USING GIN ({PG_VECTOR.format(alias='')})"
+            )
+
+
+def encode_cursor(values: Tuple) -> str:
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> List:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor('Invalid cursor') from exc
+    # Both orderings end with the row id as the tie-breaker.
+    if not isinstance(values, list) or len(values) != 2 or type(values[1]) is not int:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def _query_terms(query: str) -> List[str]:
+    return re.findall(r'\w+', query.lower())[:MAX_QUERY_TERMS]
+
+
+def _filter_sql(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    clauses, params = [], []
+    ops = connection.ops
+    if filters.get('type'):
+        clauses.append('t.type = %s')
+        params.append(filters['type'])
+    if filters.get('min_amount') is not None:
+        clauses.append('t.amount >= %s')
+        params.append(ops.adapt_decimalfield_value(filters['min_amount'], 12, 2))
+    if filters.get('max_amount') is not None:
+        clauses.append('t.amount <= %s')
+        params.append(ops.adapt_decimalfield_value(filters['max_amount'], 12, 2))
+    if filters.get('date_from') is not None:
+        clauses.append('t.date >= %s')
+        params.append(ops.adapt_datetimefield_value(filters['date_from']))
+    if filters.get('date_to') is not None:
+        clauses.append('t.date < %s')
+        params.append(ops.adapt_datetimefield_value(filters['date_to']))
+    return ''.join(f' AND {c}' for c in clauses), params
+
+
+def _ranked_ids(scope, terms, filters, after, limit) -> List[Tuple[int, float]]:
+    """Return ``(id, score)`` pairs ordered best first; lower scores rank higher."""
+    filter_sql, filter_params = _filter_sql(filters)
+    scope_sql, scope_params = scope.sql('t')
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        inner = (
+            f"SELECT t.id AS id, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} "
+            f"JOIN api_transaction t ON t.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND {scope_sql}{filter_sql}"
+        )
+        params = [match, *scope_params, *filter_params]
+    else:
+        match = ' & '.join(f'{term}:*' for term in terms)
+        vector = PG_VECTOR.format(alias='t.')
+        inner = (
+            f"SELECT t.id AS id, -ts_rank({vector}, to_tsquery('simple', %s)) AS score "
+            f"FROM api_transaction t "
+            f"WHERE {vector} @@ to_tsquery('simple', %s) AND {scope_sql}{filter_sql}"
+        )
+        params = [match, match, *scope_params, *filter_params]
+
+    # MATERIALIZED stops SQLite from flattening bm25() into the outer WHERE,
+    # where auxiliary FTS functions do not see the match context.
+    sql = f"WITH ranked AS MATERIALIZED ({inner}) SELECT id, score FROM ranked"
+    if after is not None:
+        sql += " WHERE score > %s OR (score = %s AND id < %s)"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY score, id DESC LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], float(row[1])) for row in cursor.fetchall()]
+
+
+def search_transactions(
+    owner,
+    query: str = '',
+    filters: Optional[Dict[str, Any]] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Dict[str, Any]:
+    """
+    Search transactions with keyset pagination.
+
+    ``owner`` is a ``LedgerScope`` (a user's personal and household ledgers)
+    or a user, meaning just their personal ledger.
+
+    With a text query, results are ranked by relevance and every term is
+    matched as a prefix against ``description`` and ``category``. Without one,
+    results are ordered newest first. ``filters`` may contain ``type``,
+    ``min_amount``, ``max_amount``, ``date_from`` and ``date_to``.
+
+    Returns a dict with ``results`` (Transaction instances, each carrying a
+    ``score`` attribute when ranked) and ``next_cursor``.
+    """
+    scope = owner if isinstance(owner, LedgerScope) else LedgerScope(owner.id)
+    filters = filters or {}
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    terms = _query_terms(query or '')
+
+    if terms and connection.vendor in ('sqlite', 'postgresql'):
+        if after is not None and not (type(after[0]) in (int, float) and math.isfinite(after[0])):
+            # e.g. a date cursor from an unranked search reused with ``q``.
+            raise InvalidCursor('Invalid cursor')
+        ranked = _ranked_ids(scope, terms, filters, after, limit + 1)
+        page, has_more = ranked[:limit], len(ranked) > limit
+        by_id = Transaction.objects.in_bulk([pk for pk, _ in page])
+        results = []
+        for pk, score in page:
+            tx = by_id[pk]
+            tx.score = score
+            results.append(tx)
+        next_cursor = encode_cursor((page[-1][1], page[-1][0])) if has_more else None
+        return {'results': results, 'next_cursor': next_cursor}
+
+    qs = scope.filter(Transaction.objects.all())
+    for term in terms:
+        qs = qs.filter(Q(description__icontains=term) | Q(category__icontains=term))
+    if filters.get('type'):
+        qs = qs.filter(type=filters['type'])
+    if filters.get('min_amount') is not None:
+        qs = qs.filter(amount__gte=filters['min_amount'])
+    if filters.get('max_amount') is not None:
+        qs = qs.filter(amount__lte=filters['max_amount'])
+    if filters.get('date_from') is not None:
+        qs = qs.filter(date__gte=filters['date_from'])
+    if filters.get('date_to') is not None:
+        qs = qs.filter(date__lt=filters['date_to'])
+    if after is not None:
+        try:
+            after_date = datetime.fromisoformat(after[0])
+        except (TypeError, ValueError) as exc:
+            raise InvalidCursor('Invalid cursor') from exc
+        qs = qs.filter(Q(date__lt=after_date) | Q(date=after_date, id__lt=after[1]))
+
+    rows = list(qs.order_by('-date', '-id')[:limit + 1])
+    page, has_more = rows[:limit], len(rows) > limit
+    next_cursor = encode_cursor((page[-1].date.isoformat(), page[-1].id)) if has_more else None
+    return {'results': page, 'next_cursor': next_cursor}
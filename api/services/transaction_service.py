@@ -0,0 +1,74 @@
+"""
+Editing and deleting transactions.
+
+A change is applied to everything derived from the transaction as an exact
+signed delta, never by recomputing from history. That covers the spend of
+the affected budgets (one UPDATE each, so a category change moves spend from
+one budget to the other) and the category statistics used for anomaly
+detection. Single-row paths rely on the model signals for tombstones and
+cache versions. Bulk delete does the same work set-wise.
+"""
+import copy
+import logging
+from typing import Dict
+
+from django.db import transaction as db_transaction
+
+from ..db_utils import delete_by_ids
+from ..models import Tombstone, Transaction
+from .alert_service import check_budget_alerts
+from .anomaly_service import forget_expense, forget_expenses, record_expenses
+from .budget_service import adjust_budgets
+from .household_service import bump_ledger_data
+
+logger = logging.getLogger(__name__)
+
+# Fields the budget roll-ups and category statistics depend on.
+TRACKED_FIELDS = ('type', 'category', 'amount', 'currency', 'date', 'household_id')
+DELETE_BATCH_SIZE = 500
+
+
+def update_transaction(transaction: Transaction, changes: Dict) -> Transaction:
+    with db_transaction.atomic():
+        before = Transaction.objects.select_for_update().get(pk=transaction.pk)
+        after = copy.copy(before)
+        for field, value in changes.items():
+            setattr(after, field, value)
+        after.save()
+        if any(getattr(before, field) != getattr(after, field) for field in TRACKED_FIELDS):
+            check_budget_alerts(adjust_budgets([(before, -1), (after, 1)]))
+            forget_expense(before)
+            record_expenses([after], notify=False)
+    return after
+
+
+def delete_transaction(transaction: Transaction) -> None:
+    with db_transaction.atomic():
+        check_budget_alerts(adjust_budgets([(transaction, -1)]))
+        # Signals take it out of the statistics, leave a tombstone and bump caches.
+        transaction.delete()
+
+
+def delete_transactions(queryset) -> int:
+    """Delete every transaction in ``queryset`` with a fixed number of queries per batch."""
+    with db_transaction.atomic():
+        rows = list(queryset.select_for_update().order_by().only(
+            'id', 'user_id', 'household_id', 'type', 'category', 'amount', 'currency', 'date',
+        ))
+        if not rows:
+            return 0
+        check_budget_alerts(adjust_budgets([(tx, -1) for tx in rows]))
+        forget_expenses(rows)
+        Tombstone.objects.bulk_create([
+            Tombstone(kind='transaction', object_id=tx.pk, user_id=tx.user_id, household_id=tx.household_id)
+            for tx in rows
+        ], batch_size=DELETE_BATCH_SIZE)
+        ids = [tx.pk for tx in rows]
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            # Nothing references transactions, so a plain DELETE is safe; the
+            # per-row signal work was done set-wise above.
+            delete_by_ids(Transaction, ids[start:start + DELETE_BATCH_SIZE])
+    for user_id, household_id in {(tx.user_id, tx.household_id) for tx in rows}:
+        bump_ledger_data(user_id, household_id)
+    logger.info(f'Bulk deleted {len(rows)} transactions')
+    return len(rows)
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_utils import bump_version
+from .models import Budget, CategoryRule, SavingsGoal, Transaction
+from .services.anomaly_service import forget_expense, record_expenses
+from .services.household_service import bump_ledger_data
+from .services.sync_service import record_deletion
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes; workers re-read the row.
+    # Imported here so processes that never serve the API (the CLI, most
+    # management commands) don't load DRF and simplejwt at startup.
+    from .authentication import forget_user
+    forget_user(instance)
+
+
+@receiver([post_save, post_delete], sender=CategoryRule)
+def invalidate_category_rules(sender, instance, **kwargs):
+    bump_version('rules', instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+@receiver([post_save, post_delete], sender=Budget)
+@receiver([post_save, post_delete], sender=SavingsGoal)
+def invalidate_user_data(sender, instance, **kwargs):
+    # Anything derived from a user's ledger (forecasts, cached summaries) is
+    # keyed by this version. Bulk write paths bump it explicitly. Shared
+    # household rows invalidate every member.
+    bump_ledger_data(instance.user_id, instance.household_id)
+
+
+@receiver(post_save, sender=Transaction)
+def track_expense_statistics(sender, instance, created, raw=False, **kwargs):
+    # bulk_create skips signals; bulk write paths call record_expenses themselves.
+    if created and not raw:
+        record_expenses([instance])
+
+
+@receiver(post_delete, sender=Transaction)
+def untrack_expense_statistics(sender, instance, **kwargs):
+    forget_expense(instance)
+
+
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=SavingsGoal)
+def leave_tombstone(sender, instance, **kwargs):
+    # Lets /api/sync/ tell offline clients which rows disappeared.
+    record_deletion(instance)
@@ -1,9 +1,9 @@
 from django.conf import settings
-from twilio.rest import Client
 
 def send_sms_alert(user_phone, message):
     """Send SMS alert using Twilio"""
     try:
+        from twilio.rest import Client
         client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
         
         message = client.messages.create(
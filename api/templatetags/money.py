@@ -0,0 +1,17 @@
+from django import template
+
+from ..services import fx_service
+
+register = template.Library()
+
+
+@register.filter(name='currency_symbol')
+def currency_symbol_filter(currency):
+    """``{{ budget.currency|currency_symbol }}``: the symbol for that currency (base if empty)."""
+    return fx_service.currency_symbol(currency)
+
+
+@register.simple_tag(name='currency_symbol')
+def currency_symbol_tag():
+    """``{% currency_symbol %}``: the base currency's symbol, for totals converted with sum_in_base."""
+    return fx_service.currency_symbol()
@@ -1,13 +1,39 @@
+import io
 import json
+import os
+import pstats
+import tempfile
+from unittest import mock
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Budget, Transaction, Notification
+from django.core.management import CommandError, call_command
+
+from .models import (
+	ArchivedTransaction, Budget, CategoryRule, CategoryStats, GoalContribution, LLMCall, LLMUsageDay, Tombstone, Transaction, Notification,
+	RecurringTransaction, SavingsGoal,
+)
+from .authentication import clear_user_cache
+from .services.archive_service import ledger_history
+from .services.forecast_service import compute_forecast
+from .services.fx_service import get_rate_table, load_rates, sum_in_base
+from .services.goal_service import compute_goal_summary
+from .services.household_service import add_member, create_household, ledger_scope_for_user
+from .services.import_service import import_statement
+from .services.recurring_service import advance, materialize_due
+from .services.search_service import encode_cursor
+from .services.sync_service import encode_token
+from .services.transaction_service import delete_transaction
 
 
 class BudgetAPITests(APITestCase):
@@ -41,6 +67,26 @@ class BudgetAPITests(APITestCase):
 		self.assertEqual(len(response.data), 1)
 		self.assertEqual(response.data[0]['category'], 'Travel')
 
+	def test_bulk_upsert_is_one_statement_and_all_or_nothing(self):
+		Budget.objects.create(user=self.user, category='Food', limit_amount=100, spent_amount=40)
+		url = reverse('api:budgets-bulk')
+		entries = [{'category': f'Category {i:02d}', 'limit_amount': '1000.00'} for i in range(20)]
+		entries.append({'category': 'Food', 'limit_amount': '600.00', 'alert_threshold': 90})
+
+		with self.assertNumQueries(4):  # savepoint, upsert, re-read, release
+			response = self.client.post(url, {'budgets': entries}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(response.data), 21)
+		food = Budget.objects.get(user=self.user, category='Food')
+		self.assertEqual((food.limit_amount, food.spent_amount, food.alert_threshold), (Decimal('600.00'), Decimal('40.00'), 90))
+
+		response = self.client.post(url, {'budgets': [
+			{'category': 'Rent', 'limit_amount': '900.00'},
+			{'category': 'Fun', 'limit_amount': '-5'},
+		]}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertFalse(Budget.objects.filter(user=self.user, category='Rent').exists())
+
 
 class TransactionAPITests(APITestCase):
 	def setUp(self):
@@ -79,6 +125,47 @@ class TransactionAPITests(APITestCase):
 		self.budget.refresh_from_db()
 		self.assertEqual(self.budget.spent_amount, Decimal('0'))
 
+	def test_edit_moves_spend_and_delete_reverses_it(self):
+		dining = Budget.objects.create(user=self.user, category='Dining', limit_amount=Decimal('200.00'))
+		response = self.client.post(
+			reverse('api:transactions'),
+			{'amount': '40.00', 'type': 'expense', 'category': 'Groceries', 'description': 'Market'},
+			format='json',
+		)
+		url = reverse('api:transaction-detail', args=[response.json()['id']])
+
+		response = self.client.patch(url, {'category': 'Dining', 'amount': '65.00'}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.json()['category'], 'Dining')
+		self.budget.refresh_from_db()
+		dining.refresh_from_db()
+		self.assertEqual(self.budget.spent_amount, Decimal('0.00'))
+		self.assertEqual(dining.spent_amount, Decimal('65.00'))
+		self.assertFalse(CategoryStats.objects.filter(user=self.user, category='Groceries', count__gt=0).exists())
+		self.assertEqual(CategoryStats.objects.get(user=self.user, category='Dining').mean, 65.0)
+
+		self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+		dining.refresh_from_db()
+		self.assertEqual(dining.spent_amount, Decimal('0.00'))
+		self.assertEqual(CategoryStats.objects.get(user=self.user, category='Dining').count, 0)
+
+	def test_bulk_delete_by_filter(self):
+		for i in range(6):
+			self.client.post(
+				reverse('api:transactions'),
+				{'amount': '10.00', 'type': 'expense', 'category': 'Groceries' if i % 2 else 'Fuel', 'description': f'Item {i}'},
+				format='json',
+			)
+		url = reverse('api:transactions-bulk-delete')
+		self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+		response = self.client.post(url, {'category': 'Groceries'}, format='json')
+		self.assertEqual(response.json(), {'deleted': 3})
+		self.budget.refresh_from_db()
+		self.assertEqual(self.budget.spent_amount, Decimal('0.00'))
+		self.assertEqual(list(Transaction.objects.filter(user=self.user).values_list('category', flat=True).distinct()), ['Fuel'])
+		self.assertEqual(Tombstone.objects.filter(user=self.user, kind='transaction').count(), 3)
+
 
 class ReportSummaryAPITests(APITestCase):
 	def setUp(self):
@@ -100,9 +187,31 @@ class ReportSummaryAPITests(APITestCase):
 		self.assertEqual(len(budget_analysis), 1)
 		self.assertEqual(budget_analysis[0]['category'], 'Utilities')
 
+	def test_columnar_export_round_trips_and_beats_csv(self):
+		Transaction.objects.bulk_create([
+			Transaction(user=self.user, amount=Decimal('12.34') + i, type='expense', category=f'Cat {i % 5}', description=f'Shop {i % 7} café')
+			for i in range(500)
+		])
+		response = self.client.get(reverse('api:report-export-columnar'), {'fmt': 'npz'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		columnar = b''.join(response.streaming_content)
+		csv_size = len(self.client.get(reverse('api:report-export-csv')).content)
+		self.assertLess(len(columnar) * 3, csv_size)
+
+		import numpy as np
+		data = np.load(io.BytesIO(columnar))
+		self.assertEqual(len(data['id']), 502)
+		self.assertEqual(data['amount_cents'].sum(), 100000 + 12000 + sum(1234 + 100 * i for i in range(500)))
+		self.assertEqual(data['date'].dtype, np.int64)
+		offsets, text = data['description_offsets'], data['description_data'].tobytes()
+		descriptions = {text[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)}
+		self.assertIn('Shop 3 café', descriptions)
+		self.assertEqual(set(data['category_labels'][data['category_codes']]), {'Salary', 'Utilities', *(f'Cat {i}' for i in range(5))})
+
 
 class DashboardViewTests(TestCase):
 	def setUp(self):
+		cache.clear()
 		self.user = User.objects.create_user(username='eve', password='pass12345')
 		Budget.objects.create(user=self.user, category='Housing', limit_amount=Decimal('1500.00'), spent_amount=Decimal('900.00'), alert_threshold=75)
 		Transaction.objects.create(user=self.user, amount=Decimal('3000.00'), type='income', category='Salary')
@@ -110,12 +219,1036 @@ class DashboardViewTests(TestCase):
 		self.client = Client()
 		self.client.login(username='eve', password='pass12345')
 
-	def test_dashboard_context_contains_chart_flags_and_summary(self):
+	def test_dashboard_renders_summary_and_serves_charts_separately(self):
+		response = self.client.get(reverse('api:web-dashboard'))
+		self.assertEqual(response.status_code, 200)
+		self.assertContains(response, 'Housing')
+		self.assertContains(response, '3000.00')
+
+		response = self.client.get(reverse('api:web-dashboard-charts'))
+		self.assertEqual(response.status_code, 200)
+		charts = response.json()
+		self.assertGreater(len(charts['trend']['labels']), 0)
+		self.assertEqual(charts['breakdown'], {'labels': ['Housing'], 'values': [900.0]})
+		with self.assertNumQueries(2):  # session and user only
+			response = self.client.get(reverse('api:web-dashboard-charts'), HTTP_IF_NONE_MATCH=response['ETag'])
+		self.assertEqual(response.status_code, 304)
+
+	def test_summary_fragments_are_cached_until_data_changes(self):
+		self.client.get(reverse('api:web-dashboard'))
+		with self.assertNumQueries(3):  # session, user, recent transactions
+			response = self.client.get(reverse('api:web-dashboard'))
+		self.assertContains(response, '3000.00')
+
+		Transaction.objects.create(user=self.user, amount=Decimal('500.00'), type='income', category='Bonus')
 		response = self.client.get(reverse('api:web-dashboard'))
+		self.assertContains(response, '3500.00')
+
+	def test_dashboard_page_is_revalidated_with_an_etag(self):
+		etag = self.client.get(reverse('api:web-dashboard'))['ETag']
+		with self.assertNumQueries(2):  # session and user only
+			response = self.client.get(reverse('api:web-dashboard'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+
+		Transaction.objects.create(user=self.user, amount=Decimal('500.00'), type='income', category='Bonus')
+		response = self.client.get(reverse('api:web-dashboard'), HTTP_IF_NONE_MATCH=etag)
 		self.assertEqual(response.status_code, 200)
-		self.assertIn('trend_labels_json', response.context)
-		self.assertTrue(response.context['has_trend_data'])
-		labels = json.loads(response.context['trend_labels_json'])
-		self.assertGreater(len(labels), 0)
-		budgets_summary = response.context['budgets_summary']
-		self.assertEqual(budgets_summary[0]['category'], 'Housing')
+		self.assertContains(response, '3500.00')
+
+
+class TransactionSearchAPITests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='frank', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+		for amount, category, description in [
+			('40.00', 'Groceries', 'Weekly grocery run'),
+			('250.00', 'Groceries', 'Monthly groceries'),
+			('60.00', 'Transport', 'Fuel'),
+			('15.00', 'Food', 'Coffee with grocery list'),
+		]:
+			Transaction.objects.create(user=self.user, amount=Decimal(amount), type='expense', category=category, description=description)
+		other = User.objects.create_user(username='gina', password='pass12345')
+		Transaction.objects.create(user=other, amount=Decimal('10.00'), type='expense', category='Groceries', description='grocery')
+
+	def test_prefix_search_is_scoped_and_filtered(self):
+		url = reverse('api:transactions-search')
+		response = self.client.get(url, {'q': 'groc'})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(response.data['results']), 3)
+
+		response = self.client.get(url, {'q': 'groc', 'min_amount': '30', 'max_amount': '100'})
+		self.assertEqual([r['description'] for r in response.data['results']], ['Weekly grocery run'])
+
+	def test_keyset_pagination_covers_all_matches_once(self):
+		url = reverse('api:transactions-search')
+		seen = []
+		params = {'q': 'groc', 'limit': 2}
+		while True:
+			response = self.client.get(url, params)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			seen.extend(r['id'] for r in response.data['results'])
+			if not response.data['next_cursor']:
+				break
+			params['cursor'] = response.data['next_cursor']
+		self.assertEqual(len(seen), 3)
+		self.assertEqual(len(set(seen)), 3)
+
+		response = self.client.get(url, {'limit': 3})
+		self.assertEqual(len(response.data['results']), 3)
+		response = self.client.get(url, {'limit': 3, 'cursor': response.data['next_cursor']})
+		self.assertEqual(len(response.data['results']), 1)
+		self.assertIsNone(response.data['next_cursor'])
+
+	def test_tampered_cursor_is_rejected(self):
+		url = reverse('api:transactions-search')
+		cursor = encode_cursor(('2026-01-01T00:00:00+00:00', 'abc'))
+		response = self.client.get(url, {'cursor': cursor})
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+		# A cursor from the date-ordered listing is not a ranked cursor, and vice versa.
+		date_cursor = encode_cursor(('2026-01-01T00:00:00+00:00', 5))
+		self.assertEqual(self.client.get(url, {'cursor': date_cursor, 'q': 'rent'}).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self.client.get(url, {'cursor': encode_cursor((-1.5, 5))}).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self.client.get(url, {'cursor': encode_cursor((-1.5, 5)), 'q': 'rent'}).status_code, status.HTTP_200_OK)
+
+
+class StatementImportTests(APITestCase):
+	CSV = (
+		'Date,Narration,Withdrawal Amt.,Deposit Amt.\n'
+		'01/03/2026,SWIGGY ORDER,"1,250.00",\n'
+		'02/03/2026,SALARY MARCH,,50000.00\n'
+		'03/03/2026,UBER TRIP,320.00,\n'
+		'bad-date,BROKEN ROW,10.00,\n'
+	)
+
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='hana', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def test_csv_upload_imports_once_and_rolls_up_budgets(self):
+		url = reverse('api:transactions-import')
+		upload = SimpleUploadedFile('statement.csv', self.CSV.encode(), content_type='text/csv')
+		response = self.client.post(url, {'file': upload}, format='multipart')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(response.data['imported'], 3)
+		self.assertEqual(response.data['error_count'], 1)
+		self.assertEqual(timezone.localtime(Transaction.objects.get(description='SWIGGY ORDER').date).date().isoformat(), '2026-03-01')
+		budget = Budget.objects.get(user=self.user, category='Uncategorized')
+		self.assertEqual(budget.spent_amount, Decimal('1570.00'))
+
+		upload = SimpleUploadedFile('statement.csv', self.CSV.encode(), content_type='text/csv')
+		response = self.client.post(url, {'file': upload}, format='multipart')
+		self.assertEqual(response.data['imported'], 0)
+		self.assertEqual(response.data['duplicates'], 3)
+		budget.refresh_from_db()
+		self.assertEqual(budget.spent_amount, Decimal('1570.00'))
+
+	def test_ofx_import_streams_in_chunks(self):
+		transactions = ''.join(
+			f'<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>202603{day:02d}120000<TRNAMT>-{day}.50<NAME>Shop {day}</STMTTRN>'
+			for day in range(1, 11)
+		)
+		ofx = f'OFXHEADER:100\n<OFX><BANKTRANLIST>{transactions}</BANKTRANLIST></OFX>'
+		progress = []
+		result = import_statement(self.user, io.BytesIO(ofx.encode()), fmt='ofx', chunk_size=4, progress=lambda r: progress.append(r['imported']))
+		self.assertEqual(result['imported'], 10)
+		self.assertEqual(progress, [4, 8, 10])
+		self.assertEqual(Transaction.objects.filter(user=self.user, type='expense').count(), 10)
+
+
+	def test_cli_batch_import_and_json_report(self):
+		import interactive_fintrack
+		with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+			f.write(self.CSV)
+			f.flush()
+			with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+				interactive_fintrack.main(['add', '--user', 'hana', '--file', f.name, '--json'])
+		self.assertEqual(json.loads(out.getvalue())['imported'], 3)
+
+		with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+			interactive_fintrack.main(['report', '--user', 'hana', '--json'])
+		report = json.loads(out.getvalue())
+		self.assertEqual(Decimal(report['summary']['totalIncome']), Decimal('50000'))
+		self.assertEqual(report['budgetAnalysis'][0]['spent_amount'], '1570.00')
+
+class CategorizationRuleTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='ivan', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def add_rule(self, **payload):
+		response = self.client.post(reverse('api:category-rules'), payload, format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+		return response.data
+
+	def test_blank_category_is_filled_by_best_ranked_rule(self):
+		self.add_rule(kind='substring', pattern='uber', category='Transport', priority=20)
+		self.add_rule(kind='regex', pattern=r'uber\s+eats', category='Food', priority=10)
+		self.add_rule(kind='amount', min_amount='10000', category='Big Ticket', priority=5)
+
+		url = reverse('api:transactions')
+		self.client.post(url, {'amount': '300.00', 'type': 'expense', 'description': 'UBER EATS order'}, format='json')
+		self.client.post(url, {'amount': '150.00', 'type': 'expense', 'description': 'Uber trip'}, format='json')
+		self.client.post(url, {'amount': '20000.00', 'type': 'expense', 'description': 'uber eats catering'}, format='json')
+		self.client.post(url, {'amount': '50.00', 'type': 'expense', 'description': 'Corner shop'}, format='json')
+		categories = list(Transaction.objects.filter(user=self.user).order_by('id').values_list('category', flat=True))
+		self.assertEqual(categories, ['Food', 'Transport', 'Big Ticket', 'Uncategorized'])
+
+		response = self.client.post(reverse('api:category-rules'), {'kind': 'regex', 'pattern': '(', 'category': 'X'}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_patterns_that_break_the_combined_matcher_are_rejected(self):
+		self.add_rule(kind='substring', pattern='rent', category='Housing')
+		for pattern in ('(?i)uber', r'(a)\1', '(a)(?(1)b|c)', '(a+)+$', r'([a-z]+\s?)*!', '(a|ab)*c', 'x' * 101):
+			response = self.client.post(reverse('api:category-rules'), {'kind': 'regex', 'pattern': pattern, 'category': 'X'}, format='json')
+			self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, pattern)
+		self.add_rule(kind='regex', pattern=r'\\1 \d+', category='Escaped')
+		self.add_rule(kind='regex', pattern=r'amzn(mktp)?\s+\w+', category='Shopping')
+
+		# Rules stored before validation covered them are skipped, not fatal or slow.
+		CategoryRule.objects.create(user=self.user, kind='regex', pattern='(?i)uber', category='X', priority=1)
+		CategoryRule.objects.create(user=self.user, kind='regex', pattern='(a+)+$', category='X', priority=1)
+		response = self.client.post(reverse('api:transactions'), {'amount': '10.00', 'type': 'expense', 'description': 'Rent' + 'a' * 40 + '!'}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(Transaction.objects.get(user=self.user).category, 'Housing')
+
+	def test_recategorize_moves_budget_spend_after_rule_edit(self):
+		for description in ('SWIGGY ORDER 1182', 'SWIGGY ORDER 9921', 'Rent'):
+			Transaction.objects.create(user=self.user, amount=Decimal('100.00'), type='expense', category='Uncategorized', description=description)
+		Budget.objects.create(user=self.user, category='Uncategorized', spent_amount=Decimal('300.00'))
+
+		rule = self.add_rule(kind='merchant', pattern='Swiggy Order', category='Dining')
+		response = self.client.post(reverse('api:category-rules-apply'), {}, format='json')
+		self.assertEqual(response.data['updated'], 2)
+		self.assertEqual(Budget.objects.get(user=self.user, category='Dining').spent_amount, Decimal('200.00'))
+		self.assertEqual(Budget.objects.get(user=self.user, category='Uncategorized').spent_amount, Decimal('100.00'))
+
+		Budget.objects.create(user=self.user, category='Food', limit_amount=Decimal('150.00'))
+		self.client.patch(reverse('api:category-rule-detail', args=[rule['id']]), {'category': 'Food'}, format='json')
+		self.client.post(reverse('api:category-rules-apply'), {}, format='json')
+		self.assertEqual(Transaction.objects.filter(user=self.user, category='Food').count(), 2)
+		self.assertEqual(Budget.objects.get(user=self.user, category='Dining').spent_amount, Decimal('0.00'))
+		self.assertEqual(Budget.objects.get(user=self.user, category='Food').spent_amount, Decimal('200.00'))
+		self.assertTrue(Notification.objects.filter(user=self.user, type='budget_alert', message__contains='Food').exists())
+		# The anomaly baselines follow the rows.
+		stats = dict(CategoryStats.objects.filter(user=self.user).values_list('category', 'count'))
+		self.assertEqual(stats, {'Uncategorized': 1, 'Dining': 0, 'Food': 2})
+		self.assertEqual(CategoryStats.objects.get(user=self.user, category='Food').mean, 100.0)
+
+
+class RecurringTransactionTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='jill', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def test_scheduler_catches_up_once_and_is_idempotent(self):
+		start = timezone.now() - timedelta(days=70)
+		response = self.client.post(reverse('api:recurring'), {
+			'amount': '300.00', 'type': 'expense', 'category': 'Entertainment',
+			'description': 'Netflix subscription', 'frequency': 'monthly', 'next_run_at': start.isoformat(),
+		}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		RecurringTransaction.objects.create(
+			user=self.user, amount=Decimal('50000.00'), type='income', category='Salary',
+			description='Monthly Salary', frequency='monthly', next_run_at=timezone.now() + timedelta(days=3),
+		)
+
+		totals = materialize_due()
+		self.assertEqual(totals, {'schedules': 1, 'transactions': 3})
+		self.assertEqual(Transaction.objects.filter(user=self.user, description='Netflix subscription').count(), 3)
+		self.assertEqual(Budget.objects.get(user=self.user, category='Entertainment').spent_amount, Decimal('900.00'))
+		schedule = RecurringTransaction.objects.get(description='Netflix subscription')
+		self.assertGreater(schedule.next_run_at, timezone.now())
+
+		self.assertEqual(materialize_due(), {'schedules': 0, 'transactions': 0})
+
+	def test_advance_clamps_to_month_end(self):
+		self.assertEqual(advance(datetime(2026, 1, 31, 9), 'monthly'), datetime(2026, 2, 28, 9))
+		self.assertEqual(advance(datetime(2024, 2, 29, 9), 'yearly'), datetime(2025, 2, 28, 9))
+
+	def test_month_end_rule_keeps_its_anchor_day(self):
+		start = timezone.make_aware(datetime(2026, 1, 31, 9))
+		schedule = RecurringTransaction.objects.create(
+			user=self.user, amount=Decimal('100.00'), type='expense', category='Rent', frequency='monthly', next_run_at=start,
+		)
+		self.assertEqual(schedule.anchor_day, 31)
+		materialize_due(now=timezone.make_aware(datetime(2026, 4, 30, 12)))
+		days = [timezone.localtime(d).date() for d in Transaction.objects.filter(user=self.user).order_by('date').values_list('date', flat=True)]
+		self.assertEqual(days, [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)])
+
+
+class ForecastTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='fred', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def test_projection_and_days_until_limit(self):
+		today = date(2026, 3, 10)
+		Transaction.objects.bulk_create([
+			Transaction(
+				user=self.user, amount=Decimal('100.00'), type='expense', category='Food', description='Lunch',
+				date=timezone.make_aware(datetime.combine(today - timedelta(days=i), datetime.min.time()) + timedelta(hours=12)),
+			)
+			for i in range(70)
+		])
+		Budget.objects.create(user=self.user, category='Food', limit_amount=Decimal('3000.00'), spent_amount=Decimal('1000.00'))
+
+		forecast = compute_forecast(self.user, today)
+		food = forecast['categories'][0]
+		self.assertEqual(food['ma30'], 100.0)
+		self.assertEqual(food['month_to_date'], 1000.0)
+		self.assertEqual(food['projected_month_total'], 3100.0)
+		budget = forecast['budgets'][0]
+		self.assertEqual(budget['days_until_limit'], 20)
+		self.assertTrue(budget['will_exceed'])
+
+	def test_only_future_dated_expenses_forecast_zero(self):
+		today = date(2026, 3, 10)
+		Transaction.objects.create(
+			user=self.user, amount=Decimal('500.00'), type='expense', category='Travel',
+			date=timezone.make_aware(datetime(2026, 3, 20, 12)),
+		)
+		Budget.objects.create(user=self.user, category='Travel', limit_amount=Decimal('1000.00'))
+		forecast = compute_forecast(self.user, today)
+		self.assertEqual(forecast['categories'][0]['projected_month_total'], 0.0)
+		self.assertEqual(forecast['budgets'][0]['days_until_limit'], None)
+		self.assertFalse(forecast['budgets'][0]['will_exceed'])
+
+	def test_precompute_needs_a_shared_cache(self):
+		with self.assertRaises(CommandError):
+			call_command('precompute_forecasts', stdout=io.StringIO())
+
+	def test_forecast_endpoint_refreshes_after_new_transaction(self):
+		response = self.client.get(reverse('api:forecast'))
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data['categories'], [])
+
+		self.client.post(reverse('api:transactions'), {
+			'amount': '250.00', 'type': 'expense', 'category': 'Transport', 'description': 'Cab',
+		}, format='json')
+		response = self.client.get(reverse('api:forecast'))
+		self.assertEqual([c['category'] for c in response.data['categories']], ['Transport'])
+		self.assertEqual(response.data['total']['month_to_date'], 250.0)
+
+
+class AnomalyDetectionTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='gina', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def _expense(self, amount, description, days_ago=0):
+		return Transaction.objects.create(
+			user=self.user, amount=Decimal(amount), type='expense', category='Food',
+			description=description, date=timezone.now() - timedelta(days=days_ago),
+		)
+
+	def test_outlier_and_duplicate_charge_are_flagged(self):
+		for i in range(12):
+			self._expense(str(100 + i * 5), f'Cafe {chr(65 + i)}', days_ago=30 - i)
+		self.assertFalse(Notification.objects.filter(user=self.user, type='anomaly').exists())
+
+		self._expense('5000.00', 'Caterer')
+		self._expense('150.00', 'Swiggy order 123', days_ago=1)
+		self._expense('150.00', 'SWIGGY ORDER 456')
+		messages = list(Notification.objects.filter(user=self.user, type='anomaly').values_list('message', flat=True))
+		self.assertEqual(len(messages), 2)
+		self.assertIn('Unusual expense', messages[0])
+		self.assertIn('Possible duplicate charge', messages[1])
+
+		self.client.force_login(self.user)
+		response = self.client.get(reverse('api:web-insights'))
+		self.assertEqual(len(response.json()['context']['recent_anomalies']), 2)
+
+	def test_backfill_matches_incremental_statistics(self):
+		for i, amount in enumerate(['120.00', '80.50', '99.99', '240.00']):
+			self._expense(amount, f'Shop {i}', days_ago=10 - i)
+		self._expense('55.00', 'Shop X').delete()
+		incremental = CategoryStats.objects.get(user=self.user, category='Food')
+
+		call_command('backfill_anomaly_stats', stdout=io.StringIO())
+		rebuilt = CategoryStats.objects.get(user=self.user, category='Food')
+		self.assertEqual(rebuilt.count, 4)
+		self.assertEqual(incremental.count, 4)
+		self.assertAlmostEqual(rebuilt.mean, incremental.mean)
+		self.assertAlmostEqual(rebuilt.m2, incremental.m2, places=6)
+
+
+class SavingsGoalSummaryTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='hana', password='pass12345')
+		self.client = Client()
+		self.client.force_login(self.user)
+
+	def test_summary_query_count_is_constant(self):
+		for i in range(3):
+			SavingsGoal.objects.create(user=self.user, name=f'Goal {i}', target_amount=Decimal('100.00'), current_amount=Decimal('100.00'))
+		ledger_scope_for_user(self.user)  # memberships are cached per user
+		with self.assertNumQueries(2):
+			summary = compute_goal_summary(self.user)
+		self.assertEqual(summary['completed_goals'], 3)
+
+		for i in range(20):
+			SavingsGoal.objects.create(user=self.user, name=f'More {i}', target_amount=Decimal('500.00'))
+		with self.assertNumQueries(2):
+			summary = compute_goal_summary(self.user)
+		self.assertEqual((summary['goal_count'], summary['active_goals']), (23, 20))
+		self.assertEqual(summary['total_target'], Decimal('10300.00'))
+
+	def test_contributions_drive_projection(self):
+		self.client.post(reverse('api:web-goals'), {
+			'action': 'create', 'name': 'Laptop', 'target_amount': '12000', 'current_amount': '0',
+		})
+		goal = SavingsGoal.objects.get(user=self.user)
+		for days_ago in (89, 50, 20):
+			GoalContribution.objects.create(goal=goal, amount=Decimal('1000.00'), created_at=timezone.now() - timedelta(days=days_ago))
+		SavingsGoal.objects.filter(pk=goal.pk).update(current_amount=Decimal('3000.00'))
+
+		response = self.client.post(reverse('api:web-goals'), {'action': 'update', 'goal_id': goal.id, 'add_amount': '600'})
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(goal.contributions.count(), 4)
+
+		response = self.client.get(reverse('api:web-goals'))
+		projected = response.context['goals'][0]
+		self.assertEqual(response.context['total_saved'], Decimal('3600.00'))
+		# 3600 over a 90-day window is 40/day; 8400 left takes 210 days.
+		self.assertEqual(projected.projected_completion, timezone.localdate() + timedelta(days=210))
+
+
+class MultiCurrencyTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='ivan', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+		load_rates(io.StringIO('date,currency,rate\n2026-01-01,USD,80\n2026-06-01,USD,85\n2026-01-01,EUR,90\n'))
+
+	def test_expense_in_foreign_currency_rolls_into_budget_converted(self):
+		Budget.objects.create(user=self.user, category='Travel', limit_amount=Decimal('10000.00'))
+		response = self.client.post(reverse('api:transactions'), {
+			'amount': '10.00', 'currency': 'usd', 'type': 'expense', 'category': 'Travel', 'description': 'Metro card',
+		}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(response.data['currency'], 'USD')
+		self.assertEqual(Budget.objects.get(user=self.user, category='Travel').spent_amount, Decimal('850.00'))
+
+		response = self.client.post(reverse('api:transactions'), {
+			'amount': '5.00', 'currency': 'XYZ', 'type': 'expense', 'category': 'Travel',
+		}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_mixed_currency_totals_convert_in_one_query(self):
+		def at(year, month, day):
+			return timezone.make_aware(datetime(year, month, day, 12))
+		Transaction.objects.bulk_create([
+			Transaction(user=self.user, amount=Decimal('1000.00'), type='expense', category='Food', date=at(2026, 3, 1)),
+			Transaction(user=self.user, amount=Decimal('10.00'), currency='USD', type='expense', category='Food', date=at(2026, 3, 1)),
+			Transaction(user=self.user, amount=Decimal('10.00'), currency='USD', type='expense', category='Food', date=at(2026, 7, 1)),
+			Transaction(user=self.user, amount=Decimal('2.00'), currency='EUR', type='income', category='Refund', date=at(2026, 7, 1)),
+		])
+		get_rate_table()  # loaded once per process, then reused until rates change
+		with self.assertNumQueries(1):
+			totals = sum_in_base(Transaction.objects.filter(user=self.user), 'type')
+		self.assertEqual(totals, {'expense': Decimal('2650.00'), 'income': Decimal('180.00')})
+
+		response = self.client.get(reverse('api:report-summary'))
+		self.assertEqual(response.data['summary']['totalExpenses'], Decimal('2650.00'))
+
+	def test_imported_foreign_expense_is_reversed_exactly_on_delete(self):
+		Budget.objects.create(user=self.user, category='Travel')
+		statement = io.StringIO('Date,Narration,Withdrawal Amt.,Deposit Amt.\n01/03/2026,Hotel,10.00,\n')
+		import_statement(self.user, statement, currency='USD', default_category='Travel')
+		budget = Budget.objects.get(user=self.user, category='Travel')
+		self.assertEqual(budget.spent_amount, Decimal('800.00'))  # March rate, not the latest
+
+		delete_transaction(Transaction.objects.get(user=self.user))
+		budget.refresh_from_db()
+		self.assertEqual(budget.spent_amount, Decimal('0.00'))
+
+	def test_import_rejects_an_unknown_currency_up_front(self):
+		path = os.path.join(tempfile.mkdtemp(), 'statement.csv')
+		with open(path, 'w') as fileobj:
+			fileobj.write('Date,Narration,Withdrawal Amt.,Deposit Amt.\n01/03/2026,Hotel,10.00,\n')
+		with self.assertRaisesMessage(CommandError, 'No exchange rates are loaded for XYZ'):
+			call_command('import_statement', self.user.username, path, '--currency', 'xyz', stdout=io.StringIO())
+		call_command('import_statement', self.user.username, path, '--currency', 'usd', stdout=io.StringIO())
+		self.assertEqual(Transaction.objects.get(user=self.user).currency, 'USD')
+
+	def test_web_pages_show_each_amounts_own_currency_symbol(self):
+		Budget.objects.create(user=self.user, category='Travel', currency='USD', limit_amount=Decimal('300.00'))
+		Transaction.objects.create(user=self.user, amount=Decimal('12.50'), currency='EUR', type='expense', category='Food')
+		self.client.force_login(self.user)
+
+		response = self.client.get(reverse('api:web-budgets'))
+		self.assertContains(response, '$300')
+		self.assertContains(response, 'Budget Limit (₹)')
+		response = self.client.get(reverse('api:web-transactions'))
+		self.assertContains(response, '€12.50')
+		response = self.client.get(reverse('api:web-report'))
+		self.assertContains(response, '₹1125.00')  # totals are converted to the base currency
+		self.assertContains(response, '$300.00')
+		response = self.client.get(reverse('api:web-goals'))
+		self.assertContains(response, "const CURRENCY_SYMBOL = '₹';")
+
+
+class HouseholdLedgerTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.owner = User.objects.create_user(username='june', password='pass12345')
+		self.household = create_household(self.owner, 'Flat 4B')
+		self.members = [self.owner]
+		for i in range(9):
+			member = User.objects.create_user(username=f'flatmate{i}', password='pass12345')
+			add_member(self.household, member)
+			self.members.append(member)
+
+	def test_list_query_count_does_not_grow_with_members(self):
+		for member in self.members:
+			Transaction.objects.create(user=member, household=self.household, amount=Decimal('10.00'), type='expense', category='Groceries')
+		Transaction.objects.create(user=self.owner, amount=Decimal('5.00'), type='expense', category='Personal')
+		outsider = User.objects.create_user(username='kai', password='pass12345')
+		Transaction.objects.create(user=outsider, amount=Decimal('7.00'), type='expense', category='Groceries')
+
+		self.client.force_authenticate(user=self.members[3])
+		self.client.get(reverse('api:transactions'))  # warm the membership cache
+		with self.assertNumQueries(1):
+			response = self.client.get(reverse('api:transactions'))
+		self.assertEqual(len(response.data), 10)
+		with self.assertNumQueries(1):
+			self.client.get(reverse('api:budgets'))
+
+		self.client.force_authenticate(user=self.owner)
+		response = self.client.get(reverse('api:transactions'))
+		self.assertEqual(len(response.data), 11)
+		response = self.client.get(reverse('api:households'))
+		self.assertEqual(len(response.data[0]['members']), 10)
+
+	def test_members_share_one_household_budget(self):
+		Budget.objects.create(household=self.household, category='Utilities', limit_amount=Decimal('1000.00'))
+		for member in self.members[:2]:
+			self.client.force_authenticate(user=member)
+			response = self.client.post(reverse('api:transactions'), {
+				'amount': '150.00', 'type': 'expense', 'category': 'Utilities', 'household': self.household.id,
+			}, format='json')
+			self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		budget = Budget.objects.get(household=self.household, category='Utilities')
+		self.assertEqual(budget.spent_amount, Decimal('300.00'))
+		self.assertFalse(Budget.objects.filter(user__in=self.members[:2], category='Utilities').exists())
+
+		outsider = User.objects.create_user(username='lee', password='pass12345')
+		self.client.force_authenticate(user=outsider)
+		response = self.client.post(reverse('api:transactions'), {
+			'amount': '10.00', 'type': 'expense', 'category': 'Utilities', 'household': self.household.id,
+		}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='mia', password='pass12345')
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+	def test_user_row_is_read_once(self):
+		self.client.get(reverse('api:transactions'))
+		with self.assertNumQueries(1):
+			response = self.client.get(reverse('api:transactions'))
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+		with self.settings(JWT_TRUST_CLAIMS_FOR_SAFE_METHODS=True):
+			self.user.save()  # drops the cached row; the next read marks the user active
+			self.client.get(reverse('api:transactions'))
+			clear_user_cache()  # as seen by another worker: GETs now trust the token
+			with self.assertNumQueries(1):
+				response = self.client.get(reverse('api:transactions'))
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+	def test_trusted_claims_never_outlive_a_deactivation(self):
+		with self.settings(JWT_TRUST_CLAIMS_FOR_SAFE_METHODS=True):
+			self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_200_OK)
+			self.user.is_active = False
+			self.user.save()
+			clear_user_cache()
+			self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+			# An evicted marker means one more DB read, not a pass.
+			self.user.is_active = True
+			self.user.save()
+			self.client.get(reverse('api:transactions'))
+			cache.delete(f'fintrack:auth:claims:{self.user.pk}')
+			clear_user_cache()
+			with self.assertNumQueries(2):
+				self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_200_OK)
+
+	def test_trusted_claims_keep_staff_access(self):
+		self.user.is_staff = True
+		self.user.save()
+		with self.settings(JWT_TRUST_CLAIMS_FOR_SAFE_METHODS=True):
+			self.client.get(reverse('api:transactions'))
+			clear_user_cache()
+			with self.assertNumQueries(0):
+				self.assertEqual(self.client.get(reverse('api:profiles')).status_code, status.HTTP_200_OK)
+			self.user.is_staff = False
+			self.user.save()
+			self.assertEqual(self.client.get(reverse('api:profiles')).status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_auth_version_is_memoized_between_cache_reads(self):
+		import time
+		from .cache_utils import get_version
+		self.client.get(reverse('api:transactions'))
+		with mock.patch('api.authentication.get_version', side_effect=get_version) as read:
+			for _ in range(3):
+				self.client.get(reverse('api:transactions'))
+			self.assertEqual(read.call_count, 0)
+			with mock.patch('api.authentication.time.monotonic', return_value=time.monotonic() + 60):
+				self.client.get(reverse('api:transactions'))
+			self.assertEqual(read.call_count, 1)
+
+	def test_deactivation_and_password_change_take_effect_immediately(self):
+		self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_200_OK)
+		self.user.set_password('new-pass-678')
+		self.user.save()
+		with self.assertNumQueries(2):
+			self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_200_OK)
+
+		self.user.is_active = False
+		self.user.save()
+		self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_401_UNAUTHORIZED)
+		with self.settings(JWT_TRUST_CLAIMS_FOR_SAFE_METHODS=True):
+			self.assertEqual(self.client.get(reverse('api:transactions')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@mock.patch('api.services.sync_service.SYNC_SETTLE_SECONDS', 0)
+class SyncAPITests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='nora', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def test_incremental_sync_returns_only_changes_and_deletions(self):
+		old = [
+			Transaction.objects.create(user=self.user, amount=Decimal('5.00'), type='expense', category='Food')
+			for _ in range(30)
+		]
+		budget = Budget.objects.create(user=self.user, category='Food', limit_amount=Decimal('500.00'))
+		response = self.client.get(reverse('api:sync'))
+		self.assertEqual(len(response.data['transactions']['upserted']), 30)
+		self.assertEqual(len(response.data['budgets']['upserted']), 1)
+		token = response.data['token']
+
+		old[0].description = 'Edited offline'
+		old[0].save()
+		created = self.client.post(reverse('api:transactions'), {'amount': '7.00', 'type': 'income', 'category': 'Gift'}, format='json')
+		deleted_tx, deleted_budget = old[1].id, budget.id
+		old[1].delete()
+		budget.delete()
+		Transaction.objects.filter(pk=old[2].pk).update(category='Dining', updated_at=timezone.now())
+
+		response = self.client.get(reverse('api:sync'), {'since': token})
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		upserted = {row['id'] for row in response.data['transactions']['upserted']}
+		self.assertEqual(upserted, {old[0].id, old[2].id, created.data['id']})
+		self.assertEqual(response.data['transactions']['deleted'], [deleted_tx])
+		self.assertEqual(response.data['budgets'], {'upserted': [], 'deleted': [deleted_budget]})
+
+		response = self.client.get(reverse('api:sync'), {'since': response.data['token']})
+		self.assertEqual(response.data['transactions'], {'upserted': [], 'deleted': []})
+
+	def test_bad_and_expired_tokens(self):
+		response = self.client.get(reverse('api:sync'), {'since': 'not-a-token'})
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		expired = encode_token(timezone.now() - timedelta(days=365))
+		response = self.client.get(reverse('api:sync'), {'since': expired})
+		self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+class TransactionArchiveTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='archie', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+		now = timezone.now()
+		for i, days_ago in enumerate([1100, 900, 800, 20, 3]):
+			Transaction.objects.create(
+				user=self.user, amount=Decimal('10.00') * (i + 1), type='expense', category='Food',
+				description=f'Row {i}', date=now - timedelta(days=days_ago),
+			)
+
+	def test_archive_moves_old_rows_and_history_still_sees_them(self):
+		summary = self.client.get(reverse('api:report-summary')).json()['summary']
+		budget = Budget.objects.create(user=self.user, category='Food', limit_amount=Decimal('999.00'), spent_amount=Decimal('150.00'))
+
+		call_command('archive_transactions', '--months', '24', '--batch-size', '2', stdout=io.StringIO())
+		self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+		self.assertEqual(ArchivedTransaction.objects.filter(user=self.user).count(), 3)
+		budget.refresh_from_db()
+		self.assertEqual(budget.spent_amount, Decimal('150.00'))
+
+		scope = ledger_scope_for_user(self.user)
+		self.assertEqual(len(ledger_history(scope, date_from=timezone.now() - timedelta(days=60))), 1)
+		self.assertEqual(len(ledger_history(scope)), 2)
+		self.assertEqual(self.client.get(reverse('api:report-summary')).json()['summary'], summary)
+		lines = self.client.get(reverse('api:report-export-csv')).content.decode().splitlines()
+		self.assertEqual([line.split(',')[-1] for line in lines[1:]], [f'Row {i}' for i in range(5)])
+		self.client.force_login(self.user)
+		lines = self.client.get(reverse('api:web-download-csv')).content.decode().splitlines()
+		self.assertEqual([line.split(',')[-1] for line in lines[1:]], [f'Row {i}' for i in range(5)])
+
+		call_command('backfill_anomaly_stats', stdout=io.StringIO())
+		self.assertEqual(CategoryStats.objects.get(user=self.user, category='Food').count, 5)
+
+
+class RequestProfilingTests(APITestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username='ops', password='pass12345', is_staff=True)
+		self.user = User.objects.create_user(username='plain', password='pass12345')
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.settings_override = override_settings(REQUEST_PROFILE_DIR=tmp.name, REQUEST_PROFILE_KEEP=2)
+		self.settings_override.enable()
+		self.addCleanup(self.settings_override.disable)
+
+	def test_staff_capture_is_stored_listed_and_bounded(self):
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+		ids = []
+		for _ in range(3):
+			response = self.client.get(reverse('api:transactions'), HTTP_X_FINTRACK_PROFILE='cprofile')
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			ids.append(response['X-Profile-Id'])
+
+		listed = self.client.get(reverse('api:profiles')).json()
+		self.assertEqual([p['id'] for p in listed], ids[:0:-1])
+		self.assertGreater(listed[0]['query_count'], 0)
+		queries = self.client.get(reverse('api:profile-download', args=[ids[-1]]), {'part': 'queries'}).json()
+		self.assertIn('api_transaction', ' '.join(q['sql'] for q in queries['queries']))
+
+		response = self.client.get(reverse('api:profile-download', args=[ids[-1]]))
+		with tempfile.NamedTemporaryFile(suffix='.prof') as f:
+			f.write(b''.join(response.streaming_content))
+			f.flush()
+			self.assertGreater(pstats.Stats(f.name).total_calls, 0)
+		self.assertEqual(self.client.get(reverse('api:profile-download', args=[ids[0]])).status_code, status.HTTP_404_NOT_FOUND)
+
+	def test_non_staff_requests_are_not_profiled(self):
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+		response = self.client.get(reverse('api:transactions'), {'_profile': '1'})
+		self.assertNotIn('X-Profile-Id', response)
+		self.assertEqual(self.client.get(reverse('api:profiles')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class WorkerStartupTests(TestCase):
+	def test_worker_boot_does_not_import_optional_heavy_libraries(self):
+		out = io.StringIO()
+		call_command('bench_startup', '--check', '--runs', '1', '--top', '0', stdout=out)
+		self.assertIn('None of reportlab', out.getvalue())
+
+	def test_warm_up_primes_urls_and_templates(self):
+		from core.warmup import warm_up
+		stats = warm_up(freeze=False)
+		self.assertGreater(stats['url_names'], 50)
+		self.assertGreaterEqual(stats['templates'], 7)
+
+
+class TemplateAndStaticCachingTests(TestCase):
+	def test_templates_are_parsed_once_per_process(self):
+		from django.template import engines
+		from django.template.base import Template
+		engines['django'].engine.template_loaders[0].reset()
+		with mock.patch.object(Template, 'compile_nodelist', autospec=True, side_effect=Template.compile_nodelist) as compiled:
+			self.client.get(reverse('api:web-login'))
+			first = compiled.call_count
+			self.client.get(reverse('api:web-login'))
+		self.assertGreater(first, 0)
+		self.assertEqual(compiled.call_count, first)
+
+	def test_collected_static_files_are_hashed_compressed_and_immutable(self):
+		from django.contrib.staticfiles.storage import staticfiles_storage
+		from django.test import RequestFactory
+		from whitenoise.middleware import WhiteNoiseMiddleware
+		with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+			self.assertEqual(staticfiles_storage.url('css/styles.css'), '/static/css/styles.css')
+			call_command('collectstatic', '--noinput', verbosity=0)
+			hashed = staticfiles_storage.stored_name('css/styles.css')
+			self.assertRegex(hashed, r'^css/styles\.[0-9a-f]{12}\.css$')
+			self.assertTrue(os.path.exists(os.path.join(root, hashed + '.gz')))
+
+			middleware = WhiteNoiseMiddleware(lambda request: None)
+			response = middleware(RequestFactory().get(f'/static/{hashed}', HTTP_ACCEPT_ENCODING='gzip'))
+			self.assertEqual(response.status_code, 200)
+			self.assertIn('immutable', response['Cache-Control'])
+
+
+@override_settings(THROTTLE_BUCKETS={
+	'export': {'burst': 2, 'per_minute': 1},
+	'receipt_scan': {'burst': 2, 'per_minute': 1},
+	'ai_insight': {'burst': 2, 'per_minute': 1},
+})
+class ThrottlingTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='hana', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+
+	def test_export_bucket_drains_per_user(self):
+		url = reverse('api:report-export-csv')
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+		self.assertGreater(int(response['Retry-After']), 0)
+
+		self.client.force_authenticate(user=User.objects.create_user(username='ivan', password='pass12345'))
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+	def test_web_downloads_share_the_export_bucket(self):
+		self.client.force_login(self.user)
+		with mock.patch('api.web_views.iter_history', return_value=iter(())) as history:
+			self.assertEqual(self.client.get(reverse('api:web-download-csv')).status_code, 200)
+			self.assertEqual(self.client.get(reverse('api:web-download-csv')).status_code, 200)
+			self.assertEqual(history.call_count, 1)  # the repeat reused the first rendering
+		response = self.client.get(reverse('api:web-download-pdf'))
+		self.assertEqual(response.status_code, 429)
+		self.assertGreater(int(response['Retry-After']), 0)
+
+	def test_identical_requests_share_one_computation(self):
+		import threading
+		import time
+		from .throttling import single_flight
+
+		calls, results = [], []
+		def compute():
+			calls.append(1)
+			time.sleep(0.2)
+			return b'report'
+		threads = [threading.Thread(target=lambda: results.append(single_flight('same', compute))) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual((len(calls), results), (1, [b'report'] * 4))
+
+		self.client.force_login(self.user)
+		with mock.patch('api.web_views.generate_insights', return_value='Spend less') as generate:
+			for _ in range(2):
+				response = self.client.post(reverse('api:web-insights'), {'prompt': 'How am I doing?'}, content_type='application/json')
+				self.assertEqual(response.json()['insight'], 'Spend less')
+			self.assertEqual(generate.call_count, 1)
+			response = self.client.post(reverse('api:web-insights'), {'prompt': 'How am I doing?'}, content_type='application/json')
+			self.assertEqual(response.status_code, 429)
+
+
+class BudgetAlertTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='jade', password='pass12345')
+		self.client.force_authenticate(user=self.user)
+		Budget.objects.create(user=self.user, category='Food', limit_amount=Decimal('100.00'), alert_threshold=80)
+
+	def _spend(self, amount):
+		response = self.client.post(reverse('api:transactions'), {'amount': amount, 'type': 'expense', 'category': 'Food'}, format='json')
+		return response.data['id']
+
+	def _alerts(self):
+		return list(Notification.objects.filter(user=self.user, type='budget_alert').order_by('id').values_list('message', flat=True))
+
+	def test_each_crossing_alerts_once_and_refunds_rearm(self):
+		first = self._spend('85.00')
+		self._spend('5.00')
+		self.assertEqual(len(self._alerts()), 1)
+		self.assertIn('85% of Food', self._alerts()[0])
+		self._spend('20.00')
+		self.assertEqual(len(self._alerts()), 2)
+		self.assertIn('Food budget exceeded, 110% used', self._alerts()[1])
+
+		self.client.delete(reverse('api:transaction-detail', args=[first]))
+		self.assertEqual(Budget.objects.get(user=self.user).alert_level, 0)
+		self._spend('60.00')
+		self.assertEqual(len(self._alerts()), 3)
+
+	def test_sweep_alerts_all_owners_in_bulk(self):
+		household = create_household(self.user, 'Home')
+		mate = User.objects.create_user(username='kim', password='pass12345')
+		add_member(household, mate)
+		Budget.objects.create(household=household, category='Rent', limit_amount=Decimal('1000.00'), alert_threshold=90)
+		others = [User.objects.create_user(username=f'sweep{i}', password='pass12345') for i in range(20)]
+		Budget.objects.bulk_create([Budget(user=u, category='Food', limit_amount=Decimal('100.00')) for u in others])
+		# Spend written outside the inline path, e.g. by the recurring job.
+		Budget.objects.update(spent_amount=Decimal('95.00'))
+		Budget.objects.filter(household=household).update(spent_amount=Decimal('950.00'))
+
+		out = io.StringIO()
+		call_command('check_budget_alerts', '--shard', '0/2', '--batch-size', '5', stdout=out)
+		call_command('check_budget_alerts', '--shard', '1/2', '--batch-size', '5', stdout=out)
+		self.assertEqual(Notification.objects.filter(type='budget_alert').count(), 21 + 2)
+		self.assertEqual(Notification.objects.filter(user=mate, message__contains='95% of Rent').count(), 1)
+		call_command('check_budget_alerts', stdout=out)
+		self.assertEqual(Notification.objects.filter(type='budget_alert').count(), 23)
+		self.assertIn('Sent 0 budget alerts', out.getvalue().splitlines()[-1])
+
+
+class LLMUsageTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='lena', password='pass12345')
+
+	def test_calls_record_provider_chain_tokens_and_cost(self):
+		from types import SimpleNamespace
+		from .services import llm_service
+		openai = mock.Mock()
+		openai.chat.completions.create.side_effect = TimeoutError
+		gemini = mock.Mock()
+		gemini.models.generate_content.return_value = SimpleNamespace(
+			text='{"amount": "12.50", "category": "Food", "description": "Lunch", "type": "expense"}',
+			usage_metadata=SimpleNamespace(prompt_token_count=1000, candidates_token_count=200),
+		)
+		with mock.patch.object(llm_service, '_get_openai_client', return_value=openai), \
+				mock.patch.object(llm_service, '_get_gemini_client', return_value=gemini):
+			result = llm_service.scan_receipt_image('aGVsbG8=', user_id=self.user.id)
+		self.assertEqual(result['data']['amount'], '12.50')
+		call = LLMCall.objects.get(operation='receipt_scan')
+		self.assertEqual((call.user_id, call.provider, call.model, call.outcome), (self.user.id, 'gemini', 'gemini-2.5-flash', 'fallback'))
+		self.assertRegex(call.chain, r'^openai:error:\d+>gemini:ok:\d+$')
+		self.assertEqual((call.prompt_tokens, call.completion_tokens), (1000, 200))
+		self.assertEqual(call.cost_usd, Decimal('0.000800'))
+
+		with mock.patch.object(llm_service, '_get_openai_client', return_value=None):
+			llm_service.generate_insights('How am I doing?', user_id=self.user.id)
+		call = LLMCall.objects.get(operation='insight')
+		self.assertEqual((call.provider, call.outcome, call.chain), ('rules', 'fallback', 'openai:off:0'))
+
+	def test_daily_rollup_prunes_and_feeds_the_admin_report(self):
+		now = timezone.now()
+		LLMCall.objects.bulk_create(
+			[LLMCall(user=self.user, operation='insight', provider='openai', model='gpt-4o-mini', outcome='ok',
+				latency_ms=ms, cost_usd=Decimal('0.001'), created_at=now - timedelta(days=3)) for ms in (150, 450, 900, 2500)]
+			+ [LLMCall(user=self.user, operation='insight', provider='rules', outcome='demo', latency_ms=5, created_at=now)]
+		)
+		out = io.StringIO()
+		call_command('rollup_llm_usage', '--retention-days', '2', stdout=out)
+		self.assertIn('Rolled up 1 days into 1 rows, pruned 4 calls', out.getvalue())
+		call_command('rollup_llm_usage', stdout=out)
+		self.assertEqual(LLMUsageDay.objects.get().calls, 4)
+
+		self.client.force_authenticate(user=self.user)
+		self.assertEqual(self.client.get(reverse('api:llm-usage')).status_code, status.HTTP_403_FORBIDDEN)
+		self.client.force_authenticate(user=User.objects.create_user(username='ops2', password='pass12345', is_staff=True))
+		report = self.client.get(reverse('api:llm-usage'), {'days': 7}).json()
+		self.assertEqual((report['totals']['calls'], report['totals']['demo_rate']), (5, 0.2))
+		openai = next(row for row in report['latency'] if row['provider'] == 'openai')
+		self.assertEqual((openai['p50_ms'], openai['p95_ms']), (500, 3000))
+		self.assertEqual(report['users'][0]['username'], 'lena')
+		self.assertAlmostEqual(report['users'][0]['cost_usd'], 0.004)
+
+	def test_overlapping_rollups_count_a_day_once(self):
+		from .services.llm_usage_service import ROLLUP_LOCK_KEY, rollup_usage
+		cache.clear()
+		day = timezone.now() - timedelta(days=3)
+		LLMCall.objects.bulk_create([
+			LLMCall(user=user, operation='insight', provider='openai', outcome='ok', latency_ms=100, created_at=day)
+			for user in (self.user, None)
+		])
+		rollup_usage()
+		# A second run that started before the first one wrote its rows.
+		with mock.patch('api.services.llm_usage_service._last_rolled_day', return_value=None):
+			rollup_usage()
+			self.assertEqual(LLMUsageDay.objects.filter(user=self.user).get().calls, 1)
+			cache.add(ROLLUP_LOCK_KEY, 'other-run')
+			self.assertEqual(rollup_usage()['rows'], 0)
+		self.assertEqual(LLMUsageDay.objects.count(), 2)
+
+
+@override_settings(RECEIPT_SCAN_CONCURRENCY=2)
+class BatchReceiptScanTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='mara', password='pass12345')
+		self.client.force_login(self.user)
+		Budget.objects.create(user=self.user, category='Food', limit_amount=Decimal('1000.00'))
+
+	def _image(self, size, fmt):
+		import base64
+		from PIL import Image
+		buffer = io.BytesIO()
+		Image.new('RGB', size, 'white').save(buffer, fmt)
+		return f'data:image/{fmt.lower()};base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+	def _post(self, images, **extra):
+		response = self.client.post(reverse('api:web-scan-receipts'), {'images': images, **extra}, content_type='application/json')
+		self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+		return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+	def test_images_stream_back_with_bounded_parallel_provider_calls(self):
+		import threading
+		import time
+		from types import SimpleNamespace
+		from PIL import Image
+		from .services import llm_service
+
+		lock, state, sizes = threading.Lock(), {'now': 0, 'max': 0}, []
+		def generate_content(model, contents):
+			with lock:
+				state['now'] += 1
+				state['max'] = max(state['max'], state['now'])
+			sizes.append(Image.open(io.BytesIO(contents[0].inline_data.data)).size)
+			time.sleep(0.1)
+			with lock:
+				state['now'] -= 1
+			return SimpleNamespace(text='{"amount": "12.50", "category": "Food", "description": "Lunch", "type": "expense"}',
+				usage_metadata=SimpleNamespace(prompt_token_count=300, candidates_token_count=40))
+		gemini = mock.Mock()
+		gemini.models.generate_content.side_effect = generate_content
+
+		images = [self._image((3200, 800), 'PNG')] + [self._image((400, 600), 'JPEG')] * 3 + ['not-an-image']
+		with mock.patch.object(llm_service, '_get_openai_client', return_value=None), \
+				mock.patch.object(llm_service, '_get_gemini_client', return_value=gemini):
+			lines = self._post(images)
+		results = {line['index']: line for line in lines[:-1]}
+		self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+		self.assertEqual(results[4], {'index': 4, 'success': False, 'error': 'Image is not valid base64'})
+		self.assertEqual(results[0]['data']['amount'], '12.50')
+		self.assertEqual(lines[-1], {'done': True, 'images': 5})
+		self.assertEqual(state['max'], 2)
+		self.assertIn((1600, 400), sizes)
+		self.assertEqual(LLMCall.objects.filter(user=self.user, operation='receipt_scan', provider='gemini').count(), 4)
+		self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+	def test_create_adds_scanned_receipts_through_the_bulk_import(self):
+		import base64
+		from PIL import Image
+		dinner = {'amount': '₹ 240.00', 'category': 'Food', 'description': 'Dinner', 'type': 'expense'}
+		scans = {
+			300: {'success': True, 'demo_mode': False, 'data': {**dinner, 'date': '2026-03-14'}},
+			301: {'success': True, 'demo_mode': False, 'data': {'amount': 'n/a', 'category': 'Food', 'description': 'Blurry', 'type': 'expense'}},
+			302: {'success': True, 'demo_mode': True, 'data': {'amount': '299.00', 'category': 'Shopping', 'description': 'Demo', 'type': 'expense'}},
+			303: {'success': True, 'demo_mode': False, 'data': {**dinner, 'date': None}},
+		}
+		def fake_scan(payload, user_id=None, usage_sink=None):
+			return scans[Image.open(io.BytesIO(base64.b64decode(payload))).width]
+		images = [self._image((width, 300), 'JPEG') for width in (300, 301, 302)]
+		with mock.patch('api.services.receipt_service.scan_receipt_image', side_effect=fake_scan):
+			summary = self._post(images, create=True, currency='INR')[-1]
+			self.assertEqual((summary['created'], summary['duplicates'], len(summary['errors'])), (1, 0, 1))
+			# Re-sending a receipt is skipped by its image; another one just like it is not.
+			with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+				summary = self._post(images + [self._image((303, 300), 'JPEG')], create=True, currency='INR')[-1]
+			self.assertEqual((summary['created'], summary['duplicates']), (1, 1))
+		first, second = Transaction.objects.filter(user=self.user).order_by('id')
+		self.assertEqual((first.amount, first.category, first.description), (Decimal('240.00'), 'Food', 'Dinner'))
+		self.assertEqual(timezone.localdate(first.date), date(2026, 3, 14))  # the printed date
+		self.assertEqual(second.description, 'Dinner')
+		self.assertEqual(Budget.objects.get(user=self.user).spent_amount, Decimal('480.00'))
+
+	def test_each_image_costs_a_receipt_scan_token(self):
+		url = reverse('api:web-scan-receipts')
+		for body, error in (([], 'Expected a JSON object'), ({'images': ['a'], 'currency': 7}, 'Currency must be a currency code')):
+			response = self.client.post(url, body, content_type='application/json')
+			self.assertEqual(response.json(), {'success': False, 'error': error})
+		with override_settings(THROTTLE_BUCKETS={'receipt_scan': {'burst': 3, 'per_minute': 1}}):
+			response = self.client.post(url, {'images': ['a'] * 4}, content_type='application/json')
+			self.assertEqual(response.json()['error'], 'At most 3 images per batch')
+			self._post(['a', 'b'])
+			response = self.client.post(url, {'images': ['a', 'b']}, content_type='application/json')
+			self.assertEqual(response.status_code, 429)
+			response = self.client.post(reverse('api:web-scan-receipt'), {'image': 'a'}, content_type='application/json')
+			self.assertNotEqual(response.status_code, 429)  # the last token
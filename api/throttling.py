@@ -0,0 +1,131 @@
+"""
+Rate limiting and request coalescing for expensive endpoints.
+
+``TokenBucket`` gives each user a bucket per scope, configured in
+``settings.THROTTLE_BUCKETS`` as a burst size and a refill rate per minute.
+The bucket is stored in the cache configured by ``settings.CACHES`` (Redis
+or the database table, shared by every worker) as one "theoretical arrival
+time" (GCRA), so a check is one get and one set. Two requests racing in different
+workers can both pass, which is fine for throttling. DRF views opt in with
+``TokenBucketThrottle`` and a ``throttle_scope``; function views use the
+``throttle(scope)`` decorator, or ``consume(user_id, tokens)`` directly
+when one request pays for several units of work.
+
+``single_flight(key, compute)`` makes concurrent identical requests share one
+computation. The first caller takes a short cache lock and computes. The
+others wait for its result, which stays cached for
+``SINGLE_FLIGHT_SHARE_SECONDS`` so a double-click that lands just after still
+reuses it. Keys should include whatever the result depends on: the user,
+the request parameters and, for data-derived results, the 'data' version.
+"""
+import functools
+import hashlib
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+SINGLE_FLIGHT_WAIT_SECONDS = 60
+SINGLE_FLIGHT_SHARE_SECONDS = 10
+SINGLE_FLIGHT_POLL_SECONDS = 0.05
+# Results larger than this are not put in the cache; waiters recompute instead.
+SINGLE_FLIGHT_MAX_BYTES = 5 * 1024 * 1024
+
+_MISSING = object()
+
+
+class TokenBucket:
+    def __init__(self, scope: str):
+        config = settings.THROTTLE_BUCKETS[scope]
+        self.scope = scope
+        self.burst = config['burst']
+        self.interval = 60.0 / config['per_minute']
+
+    def consume(self, user_id, tokens: int = 1) -> Optional[float]:
+        """Take ``tokens`` tokens; returns None when allowed, else seconds until enough are available."""
+        key = f'fintrack:throttle:{self.scope}:{user_id}'
+        now = time.time()
+        arrival = max(cache.get(key, now), now) + tokens * self.interval
+        wait = arrival - now - self.burst * self.interval
+        if wait > 0:
+            return wait
+        cache.set(key, arrival, int(self.burst * self.interval) + 1)
+        return None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle using the view's ``throttle_scope`` bucket."""
+
+    def allow_request(self, request, view):
+        user_id = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        self.retry_after = TokenBucket(view.throttle_scope).consume(user_id)
+        return self.retry_after is None
+
+    def wait(self):
+        return self.retry_after
+
+
+def throttled_response(retry_after: float) -> JsonResponse:
+    response = JsonResponse(
+        {'success': False, 'error': 'Too many requests, please wait a moment and try again'}, status=429,
+    )
+    response['Retry-After'] = str(int(retry_after) + 1)
+    return response
+
+
+def throttle(scope: str, methods=('POST',)):
+    """Decorator for function views: 429 with Retry-After once the user's bucket is empty."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            retry_after = TokenBucket(scope).consume(request.user.pk) if request.method in methods else None
+            if retry_after is not None:
+                return throttled_response(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def request_key(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def _size(value) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_size(v) for v in value)
+    return 0
+
+
+def single_flight(key: str, compute: Callable[[], Any], wait: float = SINGLE_FLIGHT_WAIT_SECONDS) -> Any:
+    """Run ``compute`` once for concurrent callers with the same ``key`` and share its (picklable) result."""
+    result_key = f'fintrack:flight:{key}:result'
+    lock_key = f'fintrack:flight:{key}:lock'
+    value = cache.get(result_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    if cache.add(lock_key, uuid.uuid4().hex, int(wait)):
+        try:
+            value = compute()
+            if _size(value) <= SINGLE_FLIGHT_MAX_BYTES:
+                cache.set(result_key, value, SINGLE_FLIGHT_SHARE_SECONDS)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+        value = cache.get(result_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if cache.get(lock_key) is None:
+            # The leader failed or its result was too big to share.
+            break
+    return compute()
@@ -2,12 +2,16 @@ from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import (
     RegisterView, LoginView, health,
-    BudgetListCreateView, TransactionListCreateView,
-    ReportSummaryView, ExportCSVView, ExportPDFView
+    BudgetListCreateView, BudgetBulkUpsertView, TransactionListCreateView, TransactionDetailView,
+    TransactionBulkDeleteView, TransactionSearchView,
+    StatementImportView, CategoryRuleListCreateView, CategoryRuleDetailView, RecategorizeView,
+    RecurringTransactionListCreateView, RecurringTransactionDetailView, ForecastView,
+    HouseholdListCreateView, HouseholdMemberView, SyncView, ProfileListView, ProfileDownloadView, LLMUsageReportView,
+    ReportSummaryView, ExportCSVView, ExportColumnarView, ExportPDFView
 )
 from .web_views import (
-    login_view, dashboard, budgets_view, transactions_view, 
-    report_view, download_csv, download_pdf, scan_receipt,
+    login_view, dashboard, dashboard_charts, budgets_view, transactions_view, 
+    report_view, download_csv, download_pdf, scan_receipt, scan_receipts_batch,
     goals_view, get_spending_heatmap, get_ai_insights, debug_env
 )
 
@@ -20,9 +24,28 @@ urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='auth-login'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='auth-token-refresh'),
     path('budgets/', BudgetListCreateView.as_view(), name='budgets'),
+    path('budgets/bulk/', BudgetBulkUpsertView.as_view(), name='budgets-bulk'),
     path('transactions/', TransactionListCreateView.as_view(), name='transactions'),
+    path('transactions/<int:pk>/', TransactionDetailView.as_view(), name='transaction-detail'),
+    path('transactions/bulk-delete/', TransactionBulkDeleteView.as_view(), name='transactions-bulk-delete'),
+    path('transactions/search/', TransactionSearchView.as_view(), name='transactions-search'),
+    path('transactions/import/', StatementImportView.as_view(), name='transactions-import'),
+    path('category-rules/', CategoryRuleListCreateView.as_view(), name='category-rules'),
+    path('category-rules/<int:pk>/', CategoryRuleDetailView.as_view(), name='category-rule-detail'),
+    path('category-rules/apply/', RecategorizeView.as_view(), name='category-rules-apply'),
+    path('recurring/', RecurringTransactionListCreateView.as_view(), name='recurring'),
+    path('recurring/<int:pk>/', RecurringTransactionDetailView.as_view(), name='recurring-detail'),
+    path('forecast/', ForecastView.as_view(), name='forecast'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('households/', HouseholdListCreateView.as_view(), name='households'),
+    path('households/<int:pk>/members/', HouseholdMemberView.as_view(), name='household-members'),
+    path('households/<int:pk>/members/<int:user_id>/', HouseholdMemberView.as_view(), name='household-member-detail'),
+    path('profiles/', ProfileListView.as_view(), name='profiles'),
+    path('profiles/<str:profile_id>/', ProfileDownloadView.as_view(), name='profile-download'),
+    path('llm-usage/', LLMUsageReportView.as_view(), name='llm-usage'),
     path('reports/summary/', ReportSummaryView.as_view(), name='report-summary'),
     path('reports/export/csv/', ExportCSVView.as_view(), name='report-export-csv'),
+    path('reports/export/columnar/', ExportColumnarView.as_view(), name='report-export-columnar'),
     path('reports/export/pdf/', ExportPDFView.as_view(), name='report-export-pdf'),
 
     # Web interface
@@ -35,6 +58,8 @@ urlpatterns = [
     path('web/download/csv/', download_csv, name='web-download-csv'),
     path('web/download/pdf/', download_pdf, name='web-download-pdf'),
     path('web/scan-receipt/', scan_receipt, name='web-scan-receipt'),
+    path('web/scan-receipts/', scan_receipts_batch, name='web-scan-receipts'),
+    path('web/api/dashboard-charts/', dashboard_charts, name='web-dashboard-charts'),
     path('web/api/heatmap/', get_spending_heatmap, name='web-heatmap'),
     path('web/api/insights/', get_ai_insights, name='web-insights'),
     path('web/debug-env/', debug_env, name='debug-env'),
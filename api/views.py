@@ -1,16 +1,38 @@
 import csv
-from decimal import Decimal
-from django.db.models import Sum, Count
+import io
+from itertools import islice
+from django.db.models import Count
 from django.contrib.auth.models import User
-from django.http import HttpResponse
-from rest_framework import permissions, generics, views
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework import permissions, generics, views, status
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import api_view, permission_classes
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from .models import Budget, Transaction, Notification
-from .serializers import RegisterSerializer, BudgetSerializer, TransactionSerializer
+from .cache_utils import get_version
+from .models import Budget, Transaction, CategoryRule, RecurringTransaction, Household
+from .profiling import list_profiles, load_profile, profile_file
+from .throttling import TokenBucketThrottle, request_key, single_flight
+from .serializers import (
+    RegisterSerializer, BudgetSerializer, BudgetBulkSerializer, TransactionSerializer, TransactionBulkDeleteSerializer, TransactionSearchSerializer,
+    CategoryRuleSerializer, RecurringTransactionSerializer, HouseholdSerializer, SavingsGoalSerializer
+)
+from .services.categorization_service import categorize, recategorize_all, UNCATEGORIZED
+from .services.search_service import search_transactions, InvalidCursor
+from .services.forecast_service import get_forecast
+from .services.alert_service import check_budget_alerts
+from .services.budget_service import charge_budget, upsert_budgets
+from .services.fx_service import base_currency, known_currencies
+from .services.archive_service import iter_history, ledger_history
+from .services.report_service import report_summary
+from .services.export_service import available_formats, stream_arrow, stream_npz
+from .services.household_service import add_member, create_household, get_ledger_scope, remove_member
+from .services.transaction_service import delete_transaction, delete_transactions, update_transaction
+from .services.sync_service import changes_since, InvalidSyncToken, SyncTokenExpired
+from .services.llm_usage_service import usage_report
+from .services.import_service import (
+    import_statement, detect_format, StatementFormatError, SUPPORTED_FORMATS
+)
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -29,126 +51,357 @@ class BudgetListCreateView(generics.ListCreateAPIView):
     serializer_class = BudgetSerializer
     
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user)
+        return get_ledger_scope(self.request).filter(Budget.objects.all())
     
     def perform_create(self, serializer):
-        category = self.request.data.get('category')
-        limit_amount = Decimal(str(self.request.data.get('limit_amount', 0)))
-        alert_threshold = int(self.request.data.get('alert_threshold', 80))
-        
-        budget, created = Budget.objects.get_or_create(
-            user=self.request.user,
-            category=category,
-            defaults={'limit_amount': limit_amount, 'alert_threshold': alert_threshold}
+        data = serializer.validated_data
+        household = data.get('household')
+        # The currency is fixed when a budget is created; spent_amount is kept in it.
+        serializer.instance, = upsert_budgets(
+            [data], user=None if household else self.request.user, household=household,
         )
-        
-        if not created:
-            budget.limit_amount = limit_amount
-            budget.alert_threshold = alert_threshold
-            budget.save()
-        
-        serializer.instance = budget
+
+class BudgetBulkUpsertView(views.APIView):
+    def post(self, request):
+        serializer = BudgetBulkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        household = serializer.validated_data.get('household')
+        budgets = upsert_budgets(
+            serializer.validated_data['budgets'],
+            user=None if household else request.user, household=household,
+        )
+        return Response(BudgetSerializer(budgets, many=True).data)
 
 class TransactionListCreateView(generics.ListCreateAPIView):
     serializer_class = TransactionSerializer
     
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).order_by('-date')
+        return get_ledger_scope(self.request).filter(Transaction.objects.all()).order_by('-date')
     
     def perform_create(self, serializer):
-        transaction = serializer.save(user=self.request.user)
+        data = serializer.validated_data
+        category = (
+            data.get('category', '').strip()
+            or categorize(self.request.user.id, data.get('description', ''), data['amount'])
+            or UNCATEGORIZED
+        )
+        transaction = serializer.save(user=self.request.user, category=category)
         
         if transaction.type == 'expense':
-            budget, created = Budget.objects.get_or_create(
-                user=self.request.user,
-                category=transaction.category,
-                defaults={'limit_amount': 0, 'spent_amount': 0, 'alert_threshold': 80}
-            )
-            
-            budget.spent_amount += transaction.amount
-            budget.save()
-            
-            if budget.limit_amount > 0:
-                percentage = (budget.spent_amount / budget.limit_amount) * 100
-                if percentage >= budget.alert_threshold:
-                    Notification.objects.create(
-                        user=self.request.user,
-                        type='budget_alert',
-                        message=f'Budget alert: {int(percentage)}% of {transaction.category} budget used'
-                    )
+            check_budget_alerts([charge_budget(transaction)])
 
-class ReportSummaryView(views.APIView):
+class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = TransactionSerializer
+
+    def get_queryset(self):
+        return get_ledger_scope(self.request).filter(Transaction.objects.all())
+
+    def perform_update(self, serializer):
+        data = dict(serializer.validated_data)
+        if 'category' in data and not data['category'].strip():
+            amount = data.get('amount', serializer.instance.amount)
+            description = data.get('description', serializer.instance.description)
+            data['category'] = categorize(self.request.user.id, description, amount) or UNCATEGORIZED
+        serializer.instance = update_transaction(serializer.instance, data)
+
+    def perform_destroy(self, instance):
+        delete_transaction(instance)
+
+class TransactionBulkDeleteView(views.APIView):
+    def post(self, request):
+        serializer = TransactionBulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        transactions = get_ledger_scope(request).filter(Transaction.objects.all())
+        if 'ids' in filters:
+            transactions = transactions.filter(pk__in=filters['ids'])
+        if 'category' in filters:
+            transactions = transactions.filter(category=filters['category'])
+        if 'type' in filters:
+            transactions = transactions.filter(type=filters['type'])
+        if 'date_from' in filters:
+            transactions = transactions.filter(date__gte=filters['date_from'])
+        if 'date_to' in filters:
+            transactions = transactions.filter(date__lte=filters['date_to'])
+        return Response({'deleted': delete_transactions(transactions)})
+
+class TransactionSearchView(views.APIView):
     def get(self, request):
-        transactions = Transaction.objects.filter(user=request.user)
-        budgets = Budget.objects.filter(user=request.user)
-        
-        income_total = transactions.filter(type='income').aggregate(total=Sum('amount'))['total'] or 0
-        expense_total = transactions.filter(type='expense').aggregate(total=Sum('amount'))['total'] or 0
-        
-        budget_data = []
-        for budget in budgets:
-            budget_data.append({
-                'category': budget.category,
-                'limit_amount': budget.limit_amount,
-                'spent_amount': budget.spent_amount,
-                'remaining': budget.limit_amount - budget.spent_amount,
-                'utilization_pct': int((budget.spent_amount / budget.limit_amount) * 100) if budget.limit_amount > 0 else 0
-            })
-        
+        params = TransactionSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        filters = {key: data.get(key) for key in ('type', 'min_amount', 'max_amount', 'date_from', 'date_to')}
+        try:
+            page = search_transactions(
+                get_ledger_scope(request),
+                query=data.get('q', ''),
+                filters=filters,
+                cursor=data.get('cursor'),
+                limit=data['limit'],
+            )
+        except InvalidCursor:
+            return Response({'cursor': ['Invalid cursor.']}, status=400)
+
         return Response({
-            'summary': {
-                'totalIncome': income_total,
-                'totalExpenses': expense_total,
-                'netAmount': income_total - expense_total
-            },
-            'budgetAnalysis': budget_data
+            'results': TransactionSerializer(page['results'], many=True).data,
+            'next_cursor': page['next_cursor'],
         })
 
+class StatementImportView(views.APIView):
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'file': ['No statement file provided.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = (request.data.get('format') or detect_format(upload.name)).lower()
+        if fmt not in SUPPORTED_FORMATS:
+            return Response({'format': [f'Expected one of: {", ".join(SUPPORTED_FORMATS)}.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        currency = (request.data.get('currency') or base_currency()).upper()
+        if currency not in known_currencies():
+            return Response({'currency': [f'No FX rates loaded for {currency}.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = import_statement(request.user, upload, fmt=fmt, currency=currency)
+        except StatementFormatError as e:
+            return Response({'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+class CategoryRuleListCreateView(generics.ListCreateAPIView):
+    serializer_class = CategoryRuleSerializer
+
+    def get_queryset(self):
+        return CategoryRule.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class CategoryRuleDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = CategoryRuleSerializer
+
+    def get_queryset(self):
+        return CategoryRule.objects.filter(user=self.request.user)
+
+class RecategorizeView(views.APIView):
+    def post(self, request):
+        only_uncategorized = str(request.data.get('only_uncategorized', '')).lower() in ('1', 'true', 'yes')
+        changed = recategorize_all(request.user, only_uncategorized=only_uncategorized)
+        return Response({'updated': changed})
+
+class RecurringTransactionListCreateView(generics.ListCreateAPIView):
+    serializer_class = RecurringTransactionSerializer
+
+    def get_queryset(self):
+        return RecurringTransaction.objects.filter(user=self.request.user).order_by('next_run_at')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class RecurringTransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = RecurringTransactionSerializer
+
+    def get_queryset(self):
+        return RecurringTransaction.objects.filter(user=self.request.user)
+
+class ForecastView(views.APIView):
+    def get(self, request):
+        return Response(get_forecast(request.user))
+
+class SyncView(views.APIView):
+    """Changes to transactions, budgets and goals since the client's last sync token."""
+    serializer_classes = {
+        'transactions': TransactionSerializer,
+        'budgets': BudgetSerializer,
+        'goals': SavingsGoalSerializer,
+    }
+
+    def get(self, request):
+        try:
+            changes = changes_since(get_ledger_scope(request), request.query_params.get('since') or None)
+        except SyncTokenExpired as e:
+            return Response({'since': [str(e)]}, status=status.HTTP_410_GONE)
+        except InvalidSyncToken as e:
+            return Response({'since': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        data = {'token': changes['token']}
+        for name, serializer_class in self.serializer_classes.items():
+            data[name] = {
+                'upserted': serializer_class(changes[name]['upserted'], many=True).data,
+                'deleted': changes[name]['deleted'],
+            }
+        return Response(data)
+
+class HouseholdListCreateView(generics.ListCreateAPIView):
+    serializer_class = HouseholdSerializer
+
+    def get_queryset(self):
+        return (
+            Household.objects
+            .filter(memberships__user=self.request.user)
+            .prefetch_related('memberships__user')
+            .order_by('name')
+        )
+
+    def perform_create(self, serializer):
+        serializer.instance = create_household(self.request.user, serializer.validated_data['name'])
+
+class HouseholdMemberView(views.APIView):
+    def _household(self, request, pk):
+        return Household.objects.filter(pk=pk, memberships__user=request.user).first()
+
+    def _is_owner(self, household, user):
+        return household.memberships.filter(user=user, role='owner').exists()
+
+    def post(self, request, pk):
+        household = self._household(request, pk)
+        if household is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if not self._is_owner(household, request.user):
+            return Response({'detail': 'Only the owner can add members.'}, status=status.HTTP_403_FORBIDDEN)
+        member = User.objects.filter(username=request.data.get('username', '')).first()
+        if member is None:
+            return Response({'username': ['No such user.']}, status=status.HTTP_400_BAD_REQUEST)
+        add_member(household, member)
+        return Response({'id': member.id, 'username': member.username}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, pk, user_id):
+        household = self._household(request, pk)
+        if household is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if user_id != request.user.id and not self._is_owner(household, request.user):
+            return Response({'detail': 'Only the owner can remove other members.'}, status=status.HTTP_403_FORBIDDEN)
+        member = User.objects.filter(pk=user_id).first()
+        if member is not None:
+            remove_member(household, member)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ProfileListView(views.APIView):
+    """Stored request profiles (see ``api/profiling.py``), newest first."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(list_profiles())
+
+class ProfileDownloadView(views.APIView):
+    """One capture: the profiler output, or its SQL log with ``?part=queries``."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, profile_id):
+        meta = load_profile(profile_id)
+        if meta is None:
+            return Response({'detail': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get('part') == 'queries':
+            return Response({key: meta[key] for key in ('id', 'path', 'query_count', 'query_ms', 'queries')})
+        path = profile_file(meta)
+        if not path.exists():
+            return Response({'detail': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
+
+class LLMUsageReportView(views.APIView):
+    """AI usage for the last ``?days=`` days (default 30): latency percentiles, fallback and demo rates, cost per user."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= 366:
+            return Response({'days': ['Use a whole number of days from 1 to 366']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(usage_report(days))
+
+class ReportSummaryView(views.APIView):
+    def get(self, request):
+        return Response(report_summary(get_ledger_scope(request)))
+
+def _export_key(request, fmt):
+    # Identical exports (same user, filters and data version) share one rendering.
+    return request_key('export', fmt, request.user.id, get_version('data', request.user.id),
+                       request.query_params.urlencode())
+
 class ExportCSVView(views.APIView):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'export'
+
     def get(self, request):
-        transactions = Transaction.objects.filter(user=request.user).order_by('date')
+        scope = get_ledger_scope(request)
+
+        def render():
+            rows = iter_history(ledger_history(scope), 'date', 'type', 'category', 'amount', 'description')
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['Date', 'Type', 'Category', 'Amount', 'Description'])
+            
+            for date, type_, category, amount, description in rows:
+                writer.writerow([
+                    date.strftime('%Y-%m-%d'),
+                    type_,
+                    category,
+                    str(amount),
+                    description
+                ])
+            return buffer.getvalue().encode()
         
-        response = HttpResponse(content_type='text/csv')
+        response = HttpResponse(single_flight(_export_key(request, 'csv'), render), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="fintrack-report.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Date', 'Type', 'Category', 'Amount', 'Description'])
-        
-        for t in transactions:
-            writer.writerow([
-                t.date.strftime('%Y-%m-%d'),
-                t.type,
-                t.category,
-                str(t.amount),
-                t.description
-            ])
-        
+        return response
+
+class ExportColumnarView(views.APIView):
+    """Full history as column arrays (Arrow IPC when pyarrow is installed, else NumPy .npz)."""
+
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'export'
+
+    def get(self, request):
+        formats = available_formats()
+        fmt = request.query_params.get('fmt', formats[0])
+        if fmt not in formats:
+            return Response({'fmt': [f'Choose one of: {", ".join(formats)}']}, status=status.HTTP_400_BAD_REQUEST)
+        transactions = ledger_history(get_ledger_scope(request))
+        if fmt == 'arrow':
+            response = StreamingHttpResponse(stream_arrow(transactions), content_type='application/vnd.apache.arrow.stream')
+        else:
+            response = StreamingHttpResponse(stream_npz(transactions), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="fintrack-transactions.{fmt}"'
         return response
 
 class ExportPDFView(views.APIView):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'export'
+
     def get(self, request):
-        transactions = Transaction.objects.filter(user=request.user).order_by('date')
+        scope = get_ledger_scope(request)
+
+        def render():
+            # reportlab (and the PIL it pulls in) is only loaded by workers that render a PDF.
+            from reportlab.lib.pagesizes import A4
+            from reportlab.pdfgen import canvas
+
+            rows = iter_history(ledger_history(scope), 'date', 'type', 'category', 'amount')
+            buffer = io.BytesIO()
+            p = canvas.Canvas(buffer, pagesize=A4)
+            width, height = A4
+            y = height - 50
+            
+            p.setFont("Helvetica-Bold", 16)
+            p.drawString(50, y, "FinTrack Transaction Report")
+            y -= 40
+            
+            p.setFont("Helvetica", 10)
+            for date, type_, category, amount in islice(rows, 30):
+                text = f"{date.strftime('%Y-%m-%d')} | {type_} | {category} | {amount}"
+                p.drawString(50, y, text)
+                y -= 15
+                if y < 50:
+                    p.showPage()
+                    y = height - 50
+            
+            p.showPage()
+            p.save()
+            return buffer.getvalue()
         
-        response = HttpResponse(content_type='application/pdf')
+        response = HttpResponse(single_flight(_export_key(request, 'pdf'), render), content_type='application/pdf')
         response['Content-Disposition'] = 'attachment; filename="fintrack-report.pdf"'
-        
-        p = canvas.Canvas(response, pagesize=A4)
-        width, height = A4
-        y = height - 50
-        
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, y, "FinTrack Transaction Report")
-        y -= 40
-        
-        p.setFont("Helvetica", 10)
-        for t in transactions[:30]:
-            text = f"{t.date.strftime('%Y-%m-%d')} | {t.type} | {t.category} | {t.amount}"
-            p.drawString(50, y, text)
-            y -= 15
-            if y < 50:
-                p.showPage()
-                y = height - 50
-        
-        p.showPage()
-        p.save()
         return response
@@ -1,9 +1,14 @@
+import io
 import json
 import base64
+import functools
+import hashlib
 import os
 import re
 import logging
+import time
 from datetime import timedelta
+from itertools import islice
 from decimal import Decimal, InvalidOperation
 
 from django.shortcuts import render, redirect
@@ -11,22 +16,40 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
+from django.middleware.csrf import get_token
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse, JsonResponse
-from django.db.models import Sum, Q, F
+from django.views.decorators.http import condition, require_http_methods
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.db.models import F
 from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.conf import settings
 
+from .cache_utils import get_version, versioned_key
 from .models import Budget, Transaction, Notification, SavingsGoal
 from .services.llm_service import scan_receipt_image, generate_insights
+from .services.categorization_service import categorize
+from .services.forecast_service import get_forecast
+from .services.fx_service import FX_VERSION_SCOPE, base_currency, currency_symbol, known_currencies, sum_in_base
+from .services.goal_service import add_contribution, closest_goal, create_goal, get_goal_summary
+from .services.archive_service import iter_history, ledger_history
+from .services.alert_service import AT_THRESHOLD, check_budget_alerts, with_alert_levels
+from .services.budget_service import charge_budget, upsert_budgets
+from .services.household_service import get_ledger_scope
+from .services.import_service import import_rows
+from .services.receipt_service import receipt_rows, scan_receipts
+from .throttling import TokenBucket, request_key, single_flight, throttle, throttled_response
 
 logger = logging.getLogger(__name__)
 
+DASHBOARD_FRAGMENT_TTL = 60 * 60
+
 
 @csrf_exempt
 @login_required(login_url='/api/web/login/')
+@throttle('receipt_scan')
 def scan_receipt(request):
     """Handle receipt image upload and AI scanning via secure service layer."""
     if request.method != 'POST':
@@ -40,7 +63,12 @@ def scan_receipt(request):
             return JsonResponse({'success': False, 'error': 'No image provided'})
         
         logger.info(f"Receipt scan request from user {request.user.username}")
-        result = scan_receipt_image(image_data)
+        # Re-submitting the same image (double-click, retry) shares the running scan.
+        image_hash = hashlib.sha256(image_data.encode()).hexdigest()
+        result = single_flight(
+            request_key('receipt', request.user.id, image_hash),
+            lambda: scan_receipt_image(image_data, user_id=request.user.id),
+        )
         return JsonResponse(result)
         
     except json.JSONDecodeError:
@@ -50,6 +78,66 @@ def scan_receipt(request):
         return JsonResponse({'success': False, 'error': 'Failed to process receipt'})
 
 
+@csrf_exempt
+@login_required(login_url='/api/web/login/')
+def scan_receipts_batch(request):
+    """
+    Scan many receipts at once: POST {"images": [...], "create": false, "currency": null}.
+
+    Streams one JSON line per image as it completes ({"index": i, ...} with
+    the same fields as scan_receipt), then a summary line. With "create",
+    the scanned receipts are added as transactions through the bulk import
+    path; demo results are never added. Each image costs one token from the
+    'receipt_scan' bucket, the same as a single scan.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'})
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'})
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object'})
+
+    images = data.get('images')
+    if not isinstance(images, list) or not images or not all(isinstance(image, str) and image for image in images):
+        return JsonResponse({'success': False, 'error': 'No images provided'})
+    bucket = TokenBucket('receipt_scan')
+    max_images = min(settings.RECEIPT_BATCH_MAX_IMAGES, bucket.burst)
+    if len(images) > max_images:
+        return JsonResponse({'success': False, 'error': f'At most {max_images} images per batch'})
+    currency = data.get('currency') or base_currency()
+    if not isinstance(currency, str):
+        return JsonResponse({'success': False, 'error': 'Currency must be a currency code'})
+    currency = currency.upper()
+    if currency not in known_currencies():
+        return JsonResponse({'success': False, 'error': f'No exchange rates are loaded for {currency}'})
+    retry_after = bucket.consume(request.user.pk, tokens=len(images))
+    if retry_after is not None:
+        return throttled_response(retry_after)
+
+    logger.info(f"Batch receipt scan of {len(images)} images from user {request.user.username}")
+    response = StreamingHttpResponse(
+        _receipt_batch_lines(request.user, images, bool(data.get('create')), currency),
+        content_type='application/x-ndjson',
+    )
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _receipt_batch_lines(user, images, create, currency):
+    scanned = []
+    for index, result in scan_receipts(images, user_id=user.id):
+        if create and result.get('success') and not result.get('demo_mode'):
+            scanned.append((index, result['data']))
+        yield json.dumps({'index': index, **result}, default=str) + '\n'
+    summary = {'done': True, 'images': len(images)}
+    if create:
+        imported = import_rows(user, receipt_rows(sorted(scanned), images), currency=currency)
+        summary.update(created=imported['imported'], duplicates=imported['duplicates'], errors=imported['errors'])
+    yield json.dumps(summary) + '\n'
+
+
 def debug_env(request):
     """Debug endpoint to check environment variables (temporary)."""
     gemini_key = os.getenv('GEMINI_API_KEY', '')
@@ -80,92 +168,138 @@ def login_view(request):
                 return redirect('api:web-dashboard')
     return render(request, 'login.html')
 
-@login_required(login_url='/api/web/login/')
-def dashboard(request):
-    user = request.user
-    transactions = Transaction.objects.filter(user=user)
-    totals = transactions.aggregate(
-        income_total=Sum('amount', filter=Q(type='income')),
-        expense_total=Sum('amount', filter=Q(type='expense')),
-    )
-    income_total = totals['income_total'] or Decimal('0')
-    expense_total = totals['expense_total'] or Decimal('0')
-    net_amount = income_total - expense_total
+def _memoized(fn):
+    """A zero-argument callable computed at most once; templates only call it on a fragment cache miss."""
+    return functools.lru_cache(maxsize=None)(fn)
 
-    budgets = Budget.objects.filter(user=user).order_by('category')
-    budget_warnings = []
+
+def _dashboard_version(user_id):
+    # Everything on the dashboard is derived from the user's ledgers and FX rates.
+    return f"{get_version('data', user_id)}.{get_version('fx', FX_VERSION_SCOPE)}"
+
+
+def _budget_overview(budgets):
     budgets_summary = []
+    budget_warnings = []
     for budget in budgets:
         limit_amount = budget.limit_amount
         spent_amount = budget.spent_amount
-        utilization_pct = int((spent_amount / limit_amount) * 100) if limit_amount > 0 else 0
+        utilization_pct = budget.utilization_pct
         budgets_summary.append({
             'category': budget.category,
+            'currency': budget.currency,
             'limit_amount': limit_amount,
             'spent_amount': spent_amount,
             'remaining': limit_amount - spent_amount,
             'utilization_pct': utilization_pct,
             'alert_threshold': budget.alert_threshold,
         })
-        if limit_amount > 0 and utilization_pct >= budget.alert_threshold:
+        if budget.level >= AT_THRESHOLD:
+            symbol = currency_symbol(budget.currency)
             budget_warnings.append(
-                f"⚠️ Budget alert: {utilization_pct}% of {budget.category} budget used (₹{spent_amount}/₹{limit_amount})"
+                f"⚠️ Budget alert: {utilization_pct}% of {budget.category} budget used ({symbol}{spent_amount}/{symbol}{limit_amount})"
             )
+    return budgets_summary, budget_warnings
 
-    recent_transactions = transactions.order_by('-date')[:5]
 
-    last_30_days = timezone.now() - timedelta(days=29)
-    daily_expenses = (
-        transactions
-        .filter(type='expense', date__gte=last_30_days)
-        .annotate(day=TruncDate('date'))
-        .values('day')
-        .annotate(total=Sum('amount'))
-        .order_by('day')
-    )
-    trend_labels = [entry['day'].strftime('%b %d') for entry in daily_expenses]
-    trend_values = [float(entry['total']) for entry in daily_expenses]
-
-    breakdown_qs = (
-        transactions
-        .filter(type='expense')
-        .values('category')
-        .annotate(total=Sum('amount'))
-        .order_by('-total')[:6]
+# Set when the views are imported: in the gunicorn master before the fork, so
+# every worker agrees on it and each deploy changes the dashboard ETag.
+_SHELL_BUILD = time.time_ns()
+
+
+def _dashboard_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    user_id = request.user.id
+    # The page embeds a CSRF token; a cached copy is only valid while its secret is.
+    get_token(request)  # makes sure the secret exists (and is set as a cookie) before hashing it
+    csrf = hashlib.sha256(request.META['CSRF_COOKIE'].encode()).hexdigest()[:16]
+    return (
+        f"dashboard-{user_id}-{_dashboard_version(user_id)}-{get_version('auth', user_id)}-"
+        f"{timezone.localdate().isoformat()}-{csrf}-{_SHELL_BUILD}"
     )
-    expense_breakdown = []
-    breakdown_labels = []
-    breakdown_values = []
-    for item in breakdown_qs:
-        label = item['category'] or 'Uncategorized'
-        amount = item['total'] or Decimal('0')
-        expense_breakdown.append({'category': label, 'total': amount})
-        breakdown_labels.append(label)
-        breakdown_values.append(float(amount))
+
+
+@login_required(login_url='/api/web/login/')
+@condition(etag_func=_dashboard_etag)
+def dashboard(request):
+    scope = get_ledger_scope(request)
+    transactions = scope.filter(Transaction.objects.all())
+    # Utilization and alert level are computed by the query, as in the alert sweep.
+    budgets = with_alert_levels(scope.filter(Budget.objects.all())).order_by('category')
+
+    # Summary sections are rendered from per-user fragment caches keyed by
+    # data_version, so these only run when a write has invalidated them.
+    @_memoized
+    def kpis():
+        totals = sum_in_base(transactions, 'type')
+        income_total = totals.get('income', Decimal('0'))
+        expense_total = totals.get('expense', Decimal('0'))
+        return {'income_total': income_total, 'expense_total': expense_total, 'net_amount': income_total - expense_total}
+
+    overview = _memoized(lambda: _budget_overview(budgets))
 
     context = {
-        'income_total': income_total,
-        'expense_total': expense_total,
-        'net_amount': net_amount,
-        'budget_warnings': budget_warnings,
-        'budgets_summary': budgets_summary,
-        'active_budgets': budgets.count(),
-        'recent_transactions': recent_transactions,
-        'expense_breakdown': expense_breakdown,
-        'has_trend_data': bool(trend_labels),
-        'has_breakdown_data': bool(breakdown_labels),
-        'trend_labels_json': json.dumps(trend_labels),
-        'trend_values_json': json.dumps(trend_values),
-        'breakdown_labels_json': json.dumps(breakdown_labels),
-        'breakdown_values_json': json.dumps(breakdown_values),
-        'has_data': budgets.exists() or transactions.exists(),
+        'data_version': _dashboard_version(request.user.id),
+        'fragment_ttl': DASHBOARD_FRAGMENT_TTL,
+        'kpis': kpis,
+        'budgets_summary': lambda: overview()[0],
+        'budget_warnings': lambda: overview()[1],
+        'recent_transactions': transactions.order_by('-date')[:5],
+        'has_data': lambda: budgets.exists() or transactions.exists(),
     }
-    
-    # Debug print
-    print(f"DEBUG: trend_labels count = {len(trend_labels)}, breakdown_labels count = {len(breakdown_labels)}")
-    print(f"DEBUG: has_trend_data = {bool(trend_labels)}, has_breakdown_data = {bool(breakdown_labels)}")
+    response = render(request, 'dashboard.html', context)
+    # Browsers keep the page and revalidate it: until the ledger, FX rates, the
+    # user or the deploy change, that is a 304 with no rendering and no ledger queries.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def compute_dashboard_charts(scope):
+    """Daily expense trend for the last 30 days and the top expense categories, in the base currency."""
+    transactions = scope.filter(Transaction.objects.filter(type='expense'))
+    last_30_days = timezone.now() - timedelta(days=29)
+    daily_expenses = sorted(sum_in_base(
+        transactions.filter(date__gte=last_30_days).annotate(day=TruncDate('date')),
+        'day',
+    ).items())
+    category_totals = sum_in_base(transactions, 'category')
+    breakdown = sorted(category_totals.items(), key=lambda item: item[1], reverse=True)[:6]
+    return {
+        'currency': base_currency(),
+        'trend': {
+            'labels': [day.strftime('%b %d') for day, _ in daily_expenses],
+            'values': [float(total) for _, total in daily_expenses],
+        },
+        'breakdown': {
+            'labels': [category or 'Uncategorized' for category, _ in breakdown],
+            'values': [float(amount) for _, amount in breakdown],
+        },
+    }
+
+
+def _charts_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    return f'charts-{request.user.id}-{_dashboard_version(request.user.id)}-{timezone.localdate().isoformat()}'
 
-    return render(request, 'dashboard.html', context)
+
+@login_required(login_url='/api/web/login/')
+@condition(etag_func=_charts_etag)
+def dashboard_charts(request):
+    """Chart data for the dashboard; cached per user and revalidated with an ETag."""
+    user = request.user
+    key = versioned_key(
+        'data', user.id, 'dashboard-charts', get_version('fx', FX_VERSION_SCOPE), timezone.localdate().isoformat(),
+    )
+    charts = cache.get(key)
+    if charts is None:
+        charts = compute_dashboard_charts(get_ledger_scope(request))
+        cache.set(key, charts, DASHBOARD_FRAGMENT_TTL)
+    response = JsonResponse(charts)
+    # Browsers keep the data and revalidate it with the ETag, which costs no queries.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required(login_url='/api/web/login/')
 def budgets_view(request):
@@ -192,24 +326,18 @@ def budgets_view(request):
             messages.error(request, 'Alert threshold should be between 1 and 100%.')
             return redirect('api:web-budgets')
 
-        budget, created = Budget.objects.get_or_create(
-            user=user, category=category,
-            defaults={'limit_amount': limit_amount, 'alert_threshold': alert_threshold}
-        )
-        if not created:
-            budget.limit_amount = limit_amount
-            budget.alert_threshold = alert_threshold
-            budget.save()
+        upsert_budgets([{'category': category, 'limit_amount': limit_amount, 'alert_threshold': alert_threshold}], user=user)
         
         messages.success(request, f"Budget '{category}' saved successfully!")
         return redirect('api:web-budgets')
     
-    budgets = Budget.objects.filter(user=user)
+    budgets = get_ledger_scope(request).filter(Budget.objects.all())
     budget_list = []
     for b in budgets:
         percentage = int((b.spent_amount / b.limit_amount * 100)) if b.limit_amount > 0 else 0
         budget_list.append({
             'category': b.category,
+            'currency': b.currency,
             'limit_amount': b.limit_amount,
             'spent_amount': b.spent_amount,
             'remaining': b.limit_amount - b.spent_amount,
@@ -239,59 +367,56 @@ def transactions_view(request):
             messages.error(request, 'Amount must be greater than zero.')
             return redirect('api:web-transactions')
 
-        category = (request.POST.get('category') or '').strip()
+        description = request.POST.get('description', '')
+        category = (request.POST.get('category') or '').strip() or categorize(user.id, description, amount)
         if not category:
             messages.error(request, 'Category is required.')
             return redirect('api:web-transactions')
 
-        description = request.POST.get('description', '')
+        currency = (request.POST.get('currency') or base_currency()).upper()
+        if currency not in known_currencies():
+            messages.error(request, f'No exchange rates are loaded for {currency}.')
+            return redirect('api:web-transactions')
+
+        household_id = request.POST.get('household') or None
+        if household_id is not None:
+            household_id = int(household_id) if household_id.isdigit() else -1
+            if not get_ledger_scope(request).can_post_to(household_id):
+                messages.error(request, 'You are not a member of that household.')
+                return redirect('api:web-transactions')
 
         transaction = Transaction.objects.create(
-            user=user, amount=amount, type=tx_type,
+            user=user, household_id=household_id, amount=amount, type=tx_type, currency=currency,
             category=category, description=description
         )
         
         if tx_type == 'expense':
-            budget, _ = Budget.objects.get_or_create(
-                user=user, category=category,
-                defaults={'limit_amount': 0, 'spent_amount': 0, 'alert_threshold': 80}
-            )
-            budget.spent_amount += amount
-            budget.save()
-            
-            if budget.limit_amount > 0:
-                percentage = (budget.spent_amount / budget.limit_amount) * 100
-                if percentage >= budget.alert_threshold:
-                    alert_msg = f'FinTrack Alert: {int(percentage)}% of {category} budget used (₹{budget.spent_amount}/₹{budget.limit_amount})'
-                    
-                    # Save notification
-                    Notification.objects.create(
-                        user=user, type='budget_alert',
-                        message=alert_msg
-                    )
-                    
-                    # Send SMS if phone number provided
-                    messages.warning(request, alert_msg)
+            for notification in check_budget_alerts([charge_budget(transaction)]):
+                if notification.user_id == user.id:
+                    messages.warning(request, notification.message)
         
         messages.success(request, 'Transaction added successfully!')
         return redirect('api:web-transactions')
     
-    transactions = Transaction.objects.filter(user=user).order_by('-date')[:20]
+    transactions = get_ledger_scope(request).filter(Transaction.objects.all()).order_by('-date')[:20]
     return render(request, 'transactions.html', {'transactions': transactions})
 
 @login_required(login_url='/api/web/login/')
 def report_view(request):
     user = request.user
-    transactions = Transaction.objects.filter(user=user)
-    budgets = Budget.objects.filter(user=user)
+    scope = get_ledger_scope(request)
+    transactions = scope.filter(Transaction.objects.all())
+    budgets = scope.filter(Budget.objects.all())
     
-    income_total = sum(t.amount for t in transactions.filter(type='income'))
-    expense_total = sum(t.amount for t in transactions.filter(type='expense'))
+    totals = sum_in_base(transactions, 'type')
+    income_total = totals.get('income', Decimal('0'))
+    expense_total = totals.get('expense', Decimal('0'))
     
     budget_analysis = []
     for b in budgets:
         budget_analysis.append({
             'category': b.category,
+            'currency': b.currency,
             'limit_amount': b.limit_amount,
             'spent_amount': b.spent_amount,
             'remaining': b.limit_amount - b.spent_amount,
@@ -307,59 +432,71 @@ def report_view(request):
         'budget_analysis': budget_analysis
     })
 
+def _export_key(request, fmt):
+    # Identical exports (same user, filters and data version) share one rendering.
+    return request_key('export', fmt, request.user.id, get_version('data', request.user.id), request.GET.urlencode())
+
 @login_required(login_url='/api/web/login/')
+@throttle('export', methods=('GET',))
 def download_csv(request):
     import csv
-    user = request.user
-    transactions = Transaction.objects.filter(user=user).order_by('date')
+    scope = get_ledger_scope(request)
+
+    def render_csv():
+        # Full history, archived rows included.
+        rows = iter_history(ledger_history(scope), 'date', 'type', 'category', 'amount', 'description')
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Date', 'Type', 'Category', 'Amount', 'Description'])
+        
+        for date, type_, category, amount, description in rows:
+            writer.writerow([
+                date.strftime('%Y-%m-%d'),
+                type_,
+                category,
+                str(amount),
+                description
+            ])
+        return buffer.getvalue().encode()
     
-    response = HttpResponse(content_type='text/csv')
+    response = HttpResponse(single_flight(_export_key(request, 'csv'), render_csv), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="fintrack-report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Type', 'Category', 'Amount', 'Description'])
-    
-    for t in transactions:
-        writer.writerow([
-            t.date.strftime('%Y-%m-%d'),
-            t.type,
-            t.category,
-            str(t.amount),
-            t.description
-        ])
-    
     return response
 
 @login_required(login_url='/api/web/login/')
+@throttle('export', methods=('GET',))
 def download_pdf(request):
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    
-    user = request.user
-    transactions = Transaction.objects.filter(user=user).order_by('date')
+    scope = get_ledger_scope(request)
+
+    def render_pdf():
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        
+        rows = iter_history(ledger_history(scope), 'date', 'type', 'category', 'amount')
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - 50
+        
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(50, y, "FinTrack Transaction Report")
+        y -= 40
+        
+        p.setFont("Helvetica", 10)
+        for date, type_, category, amount in islice(rows, 30):
+            text = f"{date.strftime('%Y-%m-%d')} | {type_} | {category} | {amount}"
+            p.drawString(50, y, text)
+            y -= 15
+            if y < 50:
+                p.showPage()
+                y = height - 50
+        
+        p.showPage()
+        p.save()
+        return buffer.getvalue()
     
-    response = HttpResponse(content_type='application/pdf')
+    response = HttpResponse(single_flight(_export_key(request, 'pdf'), render_pdf), content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="fintrack-report.pdf"'
-    
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, y, "FinTrack Transaction Report")
-    y -= 40
-    
-    p.setFont("Helvetica", 10)
-    for t in transactions[:30]:
-        text = f"{t.date.strftime('%Y-%m-%d')} | {t.type} | {t.category} | {t.amount}"
-        p.drawString(50, y, text)
-        y -= 15
-        if y < 50:
-            p.showPage()
-            y = height - 50
-    
-    p.showPage()
-    p.save()
     return response
 
 
@@ -392,8 +529,8 @@ def goals_view(request):
             color = request.POST.get('color', '#6366f1')
             deadline = request.POST.get('deadline') or None
             
-            SavingsGoal.objects.create(
-                user=user,
+            create_goal(
+                user,
                 name=name,
                 target_amount=target_amount,
                 current_amount=current_amount,
@@ -406,22 +543,21 @@ def goals_view(request):
         elif action == 'update':
             goal_id = request.POST.get('goal_id')
             try:
-                goal = SavingsGoal.objects.get(id=goal_id, user=user)
+                goal = get_ledger_scope(request).filter(SavingsGoal.objects.all()).get(id=goal_id)
                 add_amount = Decimal(request.POST.get('add_amount', '0'))
-                goal.current_amount += add_amount
-                goal.save()
+                add_contribution(goal, add_amount)
                 
                 if goal.is_completed:
                     messages.success(request, f'🎉 Congratulations! You\'ve reached your "{goal.name}" goal!')
                 else:
-                    messages.success(request, f'Added ₹{add_amount} to "{goal.name}"!')
+                    messages.success(request, f'Added {currency_symbol()}{add_amount} to "{goal.name}"!')
             except (SavingsGoal.DoesNotExist, InvalidOperation):
                 messages.error(request, 'Could not update goal.')
                 
         elif action == 'delete':
             goal_id = request.POST.get('goal_id')
             try:
-                goal = SavingsGoal.objects.get(id=goal_id, user=user)
+                goal = get_ledger_scope(request).filter(SavingsGoal.objects.all()).get(id=goal_id)
                 goal_name = goal.name
                 goal.delete()
                 messages.success(request, f'Goal "{goal_name}" deleted.')
@@ -431,23 +567,18 @@ def goals_view(request):
         return redirect('api:web-goals')
     
     # GET request - display goals
-    goals = SavingsGoal.objects.filter(user=user).order_by('-created_at')
-    
-    # Calculate totals
-    total_target = sum(g.target_amount for g in goals)
-    total_saved = sum(g.current_amount for g in goals)
-    completed_goals = sum(1 for g in goals if g.is_completed)
+    summary = get_goal_summary(user, get_ledger_scope(request))
     
     # Available icons and colors for the form
     icons = ['💰', '🏠', '🚗', '✈️', '💻', '🎓', '💍', '🏥', '🛡️', '🎁', '🎯', '🏖️', '📱', '🎮', '👶']
     colors = ['#6366f1', '#8b5cf6', '#ec4899', '#ef4444', '#f97316', '#eab308', '#22c55e', '#14b8a6', '#06b6d4', '#3b82f6']
     
     context = {
-        'goals': goals,
-        'total_target': total_target,
-        'total_saved': total_saved,
-        'completed_goals': completed_goals,
-        'active_goals': goals.count() - completed_goals,
+        'goals': summary['goals'],
+        'total_target': summary['total_target'],
+        'total_saved': summary['total_saved'],
+        'completed_goals': summary['completed_goals'],
+        'active_goals': summary['active_goals'],
         'icons': icons,
         'colors': colors,
     }
@@ -463,26 +594,25 @@ def get_spending_heatmap(request):
     # Get last 365 days of spending data
     start_date = timezone.now() - timedelta(days=365)
     
-    daily_spending = (
-        Transaction.objects
-        .filter(user=user, type='expense', date__gte=start_date)
-        .annotate(day=TruncDate('date'))
-        .values('day')
-        .annotate(total=Sum('amount'))
-        .order_by('day')
+    daily_spending = sum_in_base(
+        get_ledger_scope(request).filter(Transaction.objects.all())
+        .filter(type='expense', date__gte=start_date)
+        .annotate(day=TruncDate('date')),
+        'day',
     )
     
     # Convert to format suitable for heatmap
     heatmap_data = {}
-    for entry in daily_spending:
-        date_str = entry['day'].strftime('%Y-%m-%d')
-        heatmap_data[date_str] = float(entry['total'])
+    for day, total in sorted(daily_spending.items()):
+        date_str = day.strftime('%Y-%m-%d')
+        heatmap_data[date_str] = float(total)
     
     return JsonResponse({'data': heatmap_data})
 
 
 @login_required(login_url='/api/web/login/')  
 @require_http_methods(["GET", "POST"])
+@throttle('ai_insight', methods=('POST',))
 def get_ai_insights(request):
     """Generate AI-powered financial insights - uses OpenAI when available."""
     try:
@@ -500,8 +630,9 @@ def get_ai_insights(request):
             user=user, type='expense', date__gte=last_60_days, date__lt=last_30_days
         )
         
-        recent_total = recent_expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        previous_total = previous_expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        recent_by_category = sum_in_base(recent_expenses, 'category')
+        recent_total = sum(recent_by_category.values(), Decimal('0'))
+        previous_total = sum_in_base(previous_expenses).get(None, Decimal('0'))
         
         # Calculate spending change
         change_pct = 0
@@ -509,13 +640,10 @@ def get_ai_insights(request):
             change_pct = float(((recent_total - previous_total) / previous_total) * 100)
         
         # Get top category
-        top_category = (
-            recent_expenses
-            .values('category')
-            .annotate(total=Sum('amount'))
-            .order_by('-total')
-            .first()
-        )
+        top_category = None
+        if recent_by_category:
+            category, total = max(recent_by_category.items(), key=lambda item: item[1])
+            top_category = {'category': category, 'total': total}
         
         # Budget alerts
         over_budget = Budget.objects.filter(
@@ -523,6 +651,16 @@ def get_ai_insights(request):
             spent_amount__gt=F('limit_amount')
         ).count()
         
+        recent_anomalies = list(
+            Notification.objects
+            .filter(user=user, type='anomaly', created_at__gte=last_30_days)
+            .order_by('-created_at')
+            .values_list('message', flat=True)[:5]
+        )
+        
+        forecast = get_forecast(user)
+        at_risk = [b for b in forecast['budgets'] if b['will_exceed'] and b['spent_amount'] <= b['limit_amount']]
+        
         # Build context for AI
         context = {
             'recent_total': float(recent_total),
@@ -531,7 +669,11 @@ def get_ai_insights(request):
             'top_category': top_category['category'] if top_category else None,
             'top_category_amount': float(top_category['total']) if top_category else 0,
             'over_budget_count': over_budget,
-            'daily_avg': float(recent_total / 30) if recent_total > 0 else 0
+            'daily_avg': float(recent_total / 30) if recent_total > 0 else 0,
+            'forecast_daily_rate': forecast['total']['daily_rate'],
+            'projected_month_total': forecast['total']['projected_month_total'],
+            'budgets_at_risk': [b['category'] for b in at_risk],
+            'recent_anomalies': recent_anomalies,
         }
         
         # Check if user wants AI-generated insight (POST with prompt)
@@ -546,7 +688,9 @@ def get_ai_insights(request):
                     return JsonResponse({'error': 'Prompt too long (max 500 chars)'}, status=400)
                 
                 logger.info(f"AI insight request from user {user.username}")
-                ai_response = generate_insights(user_prompt, context)
+                # The context is part of the key, so an answer is only shared while the data is unchanged.
+                key = request_key('insight', user.id, user_prompt, json.dumps(context, sort_keys=True, default=str))
+                ai_response = single_flight(key, lambda: generate_insights(user_prompt, context, user_id=user.id))
                 
                 return JsonResponse({
                     'success': True,
@@ -561,6 +705,7 @@ def get_ai_insights(request):
                 return JsonResponse({'error': 'Failed to generate insight'}, status=500)
         
         # GET request - return rule-based insights (fast, no API call)
+        symbol = currency_symbol()
         if change_pct > 20:
             insights.append({
                 'type': 'warning',
@@ -581,7 +726,7 @@ def get_ai_insights(request):
                 'type': 'info',
                 'icon': '🎯',
                 'title': 'Top Spending Category',
-                'message': f'{top_category["category"]} is your biggest expense at ₹{top_category["total"]:,.0f} this month.'
+                'message': f'{top_category["category"]} is your biggest expense at {symbol}{top_category["total"]:,.0f} this month.'
             })
         
         if over_budget > 0:
@@ -592,24 +737,42 @@ def get_ai_insights(request):
                 'message': f'You\'ve exceeded {over_budget} budget(s) this period. Time to review!'
             })
         
+        if recent_anomalies:
+            more = len(recent_anomalies) - 1
+            insights.append({
+                'type': 'danger',
+                'icon': '🚨',
+                'title': 'Unusual Activity',
+                'message': recent_anomalies[0] + (f' (and {more} more flag(s) this month)' if more else '')
+            })
+        
+        if at_risk:
+            soonest = min(at_risk, key=lambda b: b['days_until_limit'] if b['days_until_limit'] is not None else 10 ** 6)
+            insights.append({
+                'type': 'warning',
+                'icon': '🔮',
+                'title': 'Budget Forecast',
+                'message': f'At your current pace you\'ll go over your {soonest["category"]} budget'
+                           + (f' in about {soonest["days_until_limit"]} day(s).' if soonest['days_until_limit'] else ' this month.')
+            })
+        
         if recent_total > 0:
             daily_avg = recent_total / 30
             insights.append({
                 'type': 'tip',
                 'icon': '💡',
                 'title': 'Daily Spending Average',
-                'message': f'You spend ₹{daily_avg:,.0f} per day on average. Cutting ₹{daily_avg * 0.1:,.0f}/day could save ₹{daily_avg * 0.1 * 30:,.0f}/month!'
+                'message': f'You spend {symbol}{daily_avg:,.0f} per day on average. Cutting {symbol}{daily_avg / 10:,.0f}/day could save {symbol}{daily_avg * 3:,.0f}/month!'
             })
         
         # Goal progress
-        active_goals = SavingsGoal.objects.filter(user=user, current_amount__lt=F('target_amount'))
-        if active_goals.exists():
-            closest_goal = min(active_goals, key=lambda g: g.remaining_amount)
+        nearest_goal = closest_goal(user)
+        if nearest_goal:
             insights.append({
                 'type': 'goal',
                 'icon': '🎯',
                 'title': 'Almost There!',
-                'message': f'You\'re ₹{closest_goal.remaining_amount:,.0f} away from your "{closest_goal.name}" goal!'
+                'message': f'You\'re {symbol}{nearest_goal.remaining:,.0f} away from your "{nearest_goal.name}" goal!'
             })
         
         return JsonResponse({'insights': insights, 'context': context})
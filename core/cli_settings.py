@@ -0,0 +1,14 @@
+"""
+Settings for the command-line client (``interactive_fintrack.py``).
+
+Same database and configuration as the web app, but only the apps the ORM
+needs are loaded. The admin, DRF, CORS and static files are skipped, which
+cuts app-registry setup roughly in half.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'api',
+]
@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,6 +36,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 CORS_ALLOWED_ORIGINS = [o for o in os.getenv('CORS_ALLOWED_ORIGINS', '').split(',') if o]
@@ -45,8 +47,15 @@ ROOT_URLCONF = 'core.urls'
 TEMPLATES = [{
     'BACKEND': 'django.template.backends.django.DjangoTemplates',
     'DIRS': [],
-    'APP_DIRS': True,
     'OPTIONS': {
+        # Parse each template once per process; the dev autoreloader clears
+        # the cache when a template changes.
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
         'context_processors': [
             'django.template.context_processors.debug',
             'django.template.context_processors.request',
@@ -68,6 +77,24 @@ DATABASES = {
 if os.getenv('DATABASE_URL'):
     DATABASES['default'] = dj_database_url.config(conn_max_age=600, ssl_require=True)
 
+# Cache versions, the auth user cache, throttles, single-flight locks,
+# precomputed forecasts and page fragments must be shared by every worker
+# process, so production sets REDIS_URL. CACHE_BACKEND=database uses the
+# fintrack_cache table instead (always created by migrate), at the cost of a
+# query per cache read. Without either, each process has its own local memory
+# cache: fine for runserver, the CLI and tests, and gunicorn refuses to start
+# several workers on it.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+REDIS_URL = os.getenv('REDIS_URL', '')
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if REDIS_URL and not TESTING else 'locmem')
+CACHES = {
+    'default': {
+        'redis': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL},
+        'database': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'fintrack_cache'},
+        'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }[CACHE_BACKEND],
+}
+
 AUTH_PASSWORD_VALIDATORS = []
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Asia/Kolkata'
@@ -76,12 +103,27 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'api' / 'static']
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+# collectstatic writes content-hashed copies plus .gz/.br versions and a
+# manifest; WhiteNoise serves hashed files with a one-year immutable
+# Cache-Control, so repeat visits fetch no static bytes.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.storage.StaticFilesStorage'},
+}
+# A file missing from the manifest is served under its plain name rather than
+# failing the page.
+WHITENOISE_MANIFEST_STRICT = False
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Currency that reports, dashboards and FX rates are expressed in
+BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'INR').upper()
+# Transactions older than this many months move to the archive table
+# (manage.py archive_transactions); exports and imports still see them.
+TRANSACTION_ARCHIVE_MONTHS = int(os.getenv('TRANSACTION_ARCHIVE_MONTHS', '24'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -93,6 +135,44 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Seconds a worker reuses a token's user row before re-reading it; saving the
+# user invalidates it at once in that worker, and within
+# AUTH_VERSION_MEMO_SECONDS in the others.
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+# How long a worker trusts the 'auth' version it last read from the shared cache.
+AUTH_VERSION_MEMO_SECONDS = int(os.getenv('AUTH_VERSION_MEMO_SECONDS', '5'))
+# Serve GET requests from the token claims without loading the user row.
+JWT_TRUST_CLAIMS_FOR_SAFE_METHODS = os.getenv('JWT_TRUST_CLAIMS_FOR_SAFE_METHODS', 'False').lower() == 'true'
+
+# Staff can profile a request with the X-Fintrack-Profile header (see api/profiling.py).
+# Only the newest REQUEST_PROFILE_KEEP captures are kept on disk.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'True').lower() == 'true'
+REQUEST_PROFILE_DIR = os.getenv('REQUEST_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+REQUEST_PROFILE_KEEP = int(os.getenv('REQUEST_PROFILE_KEEP', '50'))
+
+# Per-user token buckets for expensive endpoints (see api/throttling.py):
+# up to `burst` requests at once, refilled at `per_minute` requests per minute.
+THROTTLE_BUCKETS = {
+    'export': {'burst': 10, 'per_minute': 20},
+    # One token per image, whether scanned alone or in a batch.
+    'receipt_scan': {'burst': 10, 'per_minute': 10},
+    'ai_insight': {'burst': 5, 'per_minute': 10},
+}
+
+# Batch receipt scans: images per request (never more than the receipt_scan
+# burst), and provider calls in flight at once.
+RECEIPT_BATCH_MAX_IMAGES = int(os.getenv('RECEIPT_BATCH_MAX_IMAGES', '10'))
+RECEIPT_SCAN_CONCURRENCY = int(os.getenv('RECEIPT_SCAN_CONCURRENCY', '4'))
+
+# LLM usage accounting (see api/services/llm_usage_service.py): USD per million
+# (input, output) tokens for cost estimates, and how long raw calls are kept
+# after being rolled up per day.
+LLM_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gemini-2.5-flash': (0.30, 2.50),
+}
+LLM_CALL_RETENTION_DAYS = int(os.getenv('LLM_CALL_RETENTION_DAYS', '30'))
+
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
@@ -0,0 +1,16 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Content-hashed, gzip/brotli precompressed static files (see STORAGES).
+
+    Until ``collectstatic`` has written a manifest (tests, a fresh checkout)
+    ``{% static %}`` returns the plain name, served by the finders, instead
+    of failing to hash a file that is not in STATIC_ROOT yet.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
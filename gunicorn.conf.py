@@ -0,0 +1,93 @@
+"""
+Gunicorn settings (read automatically from the project root).
+
+The app is preloaded in the master and warmed up (``core.warmup``) before
+workers are forked, so imported code, the URL index and compiled templates
+are shared copy-on-write instead of rebuilt by every worker.
+
+Worker count and class come from the CPUs and memory available. The usual
+``2 * CPUs + 1`` sync workers are used when memory allows; otherwise fewer
+``gthread`` workers, each with enough threads to keep the same concurrency.
+Environment overrides:
+
+- ``WEB_CONCURRENCY``: number of workers
+- ``GUNICORN_WORKER_CLASS`` / ``GUNICORN_THREADS``
+- ``WEB_WORKER_MEMORY_MB``: memory budgeted per worker (default 128)
+- ``GUNICORN_MAX_REQUESTS`` / ``GUNICORN_MAX_REQUESTS_JITTER``
+
+Workers share state through the cache configured in ``core/settings.py``
+(Redis via ``REDIS_URL``, or ``CACHE_BACKEND=database``); the master refuses
+to start several workers on a per-process local-memory cache.
+"""
+import math
+import multiprocessing
+import os
+
+
+def _memory_limit_mb():
+    """Container memory limit (cgroup v2, then v1), else physical memory."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def _sizing():
+    cpu_target = multiprocessing.cpu_count() * 2 + 1
+    memory = _memory_limit_mb()
+    per_worker = int(os.getenv('WEB_WORKER_MEMORY_MB', '128'))
+    # Keep a quarter of the memory for the master, the page cache and spikes.
+    memory_cap = max(1, int(memory * 0.75) // per_worker) if memory else cpu_target
+    count = min(cpu_target, memory_cap)
+    if count >= cpu_target:
+        return count, 'sync', 1
+    return count, 'gthread', min(8, math.ceil(cpu_target / count))
+
+
+_workers, _worker_class, _threads = _sizing()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', _workers))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', _worker_class)
+threads = int(os.getenv('GUNICORN_THREADS', _threads))
+preload_app = True
+
+# Recycle workers now and then so slow leaks can't build up; the jitter keeps
+# them from all restarting at the same moment.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before any fork.
+    from django.conf import settings
+    from core.warmup import warm_up
+    if settings.CACHE_BACKEND == 'locmem' and workers > 1:
+        # Cache versions, auth invalidation, throttles and single-flight all
+        # rely on one cache that every worker sees.
+        raise RuntimeError(
+            'The local-memory cache cannot be shared by gunicorn workers; '
+            'set REDIS_URL (or CACHE_BACKEND=database), or WEB_CONCURRENCY=1'
+        )
+    stats = warm_up()
+    server.log.info(
+        f"Warmed up {stats['url_names']} URL names and {stats['templates']} templates; "
+        f"{workers} {worker_class} workers x {threads} threads"
+    )
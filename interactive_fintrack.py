@@ -1,14 +1,38 @@
 #!/usr/bin/env python3
+"""
+FinTrack from the terminal.
+
+Without arguments this starts the interactive menu. A subcommand runs one
+action and exits, for scripts and cron jobs:
+
+    python interactive_fintrack.py add --user alice --file statement.csv
+    python interactive_fintrack.py report --user alice --json
+
+Django is only set up after the arguments are parsed, so ``--help`` and
+usage errors return immediately. The CLI uses ``core.cli_settings``, which
+loads just the apps the ORM needs. A batch import runs in a single database
+transaction on one connection and goes through the same set-based import
+service as the web upload.
+"""
+import argparse
+import json
 import os
-import django
 import sys
 from decimal import Decimal
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
-django.setup()
+User = Budget = Transaction = Notification = None
+currency_symbol = None
+
 
-from django.contrib.auth.models import User
-from api.models import Budget, Transaction, Notification
+def setup():
+    """Configure Django and bind the model names the menu actions use."""
+    global User, Budget, Transaction, Notification, currency_symbol
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.cli_settings')
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from api.models import Budget, Transaction, Notification
+    from api.services.fx_service import currency_symbol
 
 def get_or_create_user():
     """Get or create a user"""
@@ -31,34 +55,27 @@ def create_budget(user):
     """Create or update a budget"""
     print("\n=== CREATE/UPDATE BUDGET ===")
     category = input("Budget category (e.g., Food, Transport, Entertainment): ").strip()
-    limit_amount = input("Budget limit amount (₹): ").strip()
+    symbol = currency_symbol()
+    limit_amount = input(f"Budget limit amount ({symbol}): ").strip()
     alert_threshold = input("Alert threshold % (default 80): ").strip() or "80"
     
     try:
         limit_amount = Decimal(limit_amount)
         alert_threshold = int(alert_threshold)
-        
-        budget, created = Budget.objects.get_or_create(
-            user=user,
-            category=category,
-            defaults={
-                'limit_amount': limit_amount,
-                'alert_threshold': alert_threshold,
-                'spent_amount': Decimal('0')
-            }
+        from api.services.budget_service import upsert_budgets
+        existed = Budget.objects.filter(user=user, category=category).exists()
+        budget, = upsert_budgets(
+            [{'category': category, 'limit_amount': limit_amount, 'alert_threshold': alert_threshold}], user=user
         )
         
-        if not created:
-            budget.limit_amount = limit_amount
-            budget.alert_threshold = alert_threshold
-            budget.save()
-            print(f"✓ Budget '{category}' updated: ₹{limit_amount} (Alert at {alert_threshold}%)")
+        if existed:
+            print(f"✓ Budget '{category}' updated: {symbol}{limit_amount} (Alert at {alert_threshold}%)")
         else:
-            print(f"✓ Budget '{category}' created: ₹{limit_amount} (Alert at {alert_threshold}%)")
+            print(f"✓ Budget '{category}' created: {symbol}{limit_amount} (Alert at {alert_threshold}%)")
         
         return budget
-    except ValueError:
-        print("✗ Invalid input. Please enter valid numbers.")
+    except (ValueError, ArithmeticError) as e:
+        print(f"✗ Invalid input: {e}")
         return None
 
 def add_transaction(user):
@@ -68,7 +85,8 @@ def add_transaction(user):
     choice = input("Select (1/2): ").strip()
     
     tx_type = 'expense' if choice == '1' else 'income'
-    amount = input("Amount (₹): ").strip()
+    symbol = currency_symbol()
+    amount = input(f"Amount ({symbol}): ").strip()
     category = input("Category: ").strip()
     description = input("Description: ").strip()
     
@@ -83,29 +101,21 @@ def add_transaction(user):
             description=description
         )
         
-        print(f"✓ {tx_type.capitalize()} of ₹{amount} added to '{category}'")
+        print(f"✓ {tx_type.capitalize()} of {symbol}{amount} added to '{category}'")
         
         # Update budget and check alert (USE CASE 1)
         if tx_type == 'expense':
-            budget, created = Budget.objects.get_or_create(
-                user=user,
-                category=category,
-                defaults={'limit_amount': Decimal('0'), 'spent_amount': Decimal('0'), 'alert_threshold': 80}
-            )
-            
-            budget.spent_amount += amount
-            budget.save()
+            from api.services.alert_service import check_budget_alerts
+            from api.services.budget_service import charge_budget
+            budget = charge_budget(transaction)
             
             if budget.limit_amount > 0:
                 percentage = (budget.spent_amount / budget.limit_amount) * 100
-                print(f"  Budget status: ₹{budget.spent_amount} / ₹{budget.limit_amount} ({int(percentage)}%)")
-                
-                if percentage >= budget.alert_threshold:
-                    notification = Notification.objects.create(
-                        user=user,
-                        type='budget_alert',
-                        message=f'⚠️ Budget alert: {int(percentage)}% of {category} budget used!'
-                    )
+                budget_symbol = currency_symbol(budget.currency)
+                print(f"  Budget status: {budget_symbol}{budget.spent_amount} / {budget_symbol}{budget.limit_amount} ({int(percentage)}%)")
+            
+            for notification in check_budget_alerts([budget]):
+                if notification.user_id == user.id:
                     print(f"  🚨 ALERT: {notification.message}")
         
         return transaction
@@ -127,10 +137,11 @@ def view_budgets(user):
         remaining = budget.limit_amount - budget.spent_amount
         status = "🔴 EXCEEDED" if percentage >= 100 else "🟡 WARNING" if percentage >= budget.alert_threshold else "🟢 OK"
         
+        symbol = currency_symbol(budget.currency)
         print(f"\n{budget.category}:")
-        print(f"  Limit: ₹{budget.limit_amount}")
-        print(f"  Spent: ₹{budget.spent_amount}")
-        print(f"  Remaining: ₹{remaining}")
+        print(f"  Limit: {symbol}{budget.limit_amount}")
+        print(f"  Spent: {symbol}{budget.spent_amount}")
+        print(f"  Remaining: {symbol}{remaining}")
         print(f"  Usage: {int(percentage)}% {status}")
 
 def view_transactions(user):
@@ -144,29 +155,27 @@ def view_transactions(user):
     
     for tx in transactions:
         symbol = "➖" if tx.type == 'expense' else "➕"
-        print(f"{symbol} {tx.date.strftime('%Y-%m-%d %H:%M')} | {tx.category:15} | ₹{tx.amount:8} | {tx.description}")
+        print(f"{symbol} {tx.date.strftime('%Y-%m-%d %H:%M')} | {tx.category:15} | {currency_symbol(tx.currency)}{tx.amount:8} | {tx.description}")
 
 def generate_report(user):
     """Generate financial report (USE CASE 2)"""
     print("\n=== FINANCIAL REPORT ===")
     
-    transactions = Transaction.objects.filter(user=user)
-    budgets = Budget.objects.filter(user=user)
-    
-    income_total = sum(t.amount for t in transactions.filter(type='income'))
-    expense_total = sum(t.amount for t in transactions.filter(type='expense'))
-    net_amount = income_total - expense_total
+    report = build_report(user)
+    summary = report['summary']
+    symbol = currency_symbol(summary['currency'])
     
     print(f"\n📊 SUMMARY:")
-    print(f"  Total Income:   ₹{income_total}")
-    print(f"  Total Expenses: ₹{expense_total}")
-    print(f"  Net Amount:     ₹{net_amount}")
+    print(f"  Total Income:   {symbol}{summary['totalIncome']}")
+    print(f"  Total Expenses: {symbol}{summary['totalExpenses']}")
+    print(f"  Net Amount:     {symbol}{summary['netAmount']}")
     
     print(f"\n📈 BUDGET ANALYSIS:")
-    for budget in budgets:
-        if budget.limit_amount > 0:
-            percentage = int((budget.spent_amount / budget.limit_amount) * 100)
-            print(f"  {budget.category}: {percentage}% utilized (₹{budget.spent_amount}/₹{budget.limit_amount})")
+    for budget in report['budgetAnalysis']:
+        if budget['limit_amount'] > 0:
+            budget_symbol = currency_symbol(budget['currency'])
+            print(f"  {budget['category']}: {budget['utilization_pct']}% utilized "
+                  f"({budget_symbol}{budget['spent_amount']}/{budget_symbol}{budget['limit_amount']})")
 
 def view_notifications(user):
     """View budget alerts"""
@@ -183,19 +192,26 @@ def view_notifications(user):
 def export_report(user):
     """Export report to CSV"""
     print("\n=== EXPORT REPORT ===")
-    transactions = Transaction.objects.filter(user=user).order_by('date')
+    from api.services.archive_service import iter_history, ledger_history
+    from api.services.household_service import ledger_scope_for_user
+    rows = iter_history(ledger_history(ledger_scope_for_user(user)), 'date', 'type', 'category', 'amount', 'description')
     
     filename = f"report_{user.username}.csv"
     
     with open(filename, 'w') as f:
         f.write("Date,Type,Category,Amount,Description\n")
-        for tx in transactions:
-            f.write(f"{tx.date.strftime('%Y-%m-%d')},{tx.type},{tx.category},{tx.amount},{tx.description}\n")
+        for date, tx_type, category, amount, description in rows:
+            f.write(f"{date.strftime('%Y-%m-%d')},{tx_type},{category},{amount},{description}\n")
     
     print(f"✓ Report exported to {filename}")
     print(f"  Location: {os.path.abspath(filename)}")
 
-def main():
+def build_report(user):
+    from api.services.household_service import ledger_scope_for_user
+    from api.services.report_service import report_summary
+    return report_summary(ledger_scope_for_user(user))
+
+def interactive():
     print("=" * 50)
     print("    FINTRACK - Personal Finance Manager")
     print("=" * 50)
@@ -237,5 +253,73 @@ def main():
         else:
             print("✗ Invalid choice. Please select 1-8.")
 
+def batch_user(username):
+    try:
+        return User.objects.get(username=username)
+    except User.DoesNotExist:
+        sys.exit(f"✗ User '{username}' not found")
+
+def batch_add(args):
+    """Import a statement file in one transaction (all rows or none)."""
+    from django.db import transaction as db_transaction
+    from api.services.fx_service import base_currency, known_currencies
+    from api.services.import_service import StatementFormatError, import_statement
+    user = batch_user(args.user)
+    fmt = args.format or ('ofx' if args.file.lower().endswith(('.ofx', '.qfx')) else 'csv')
+    currency = (args.currency or base_currency()).upper()
+    # Only a foreign currency needs the rate table (and NumPy) loaded.
+    if currency != base_currency() and currency not in known_currencies():
+        sys.exit(f"✗ No exchange rates are loaded for {currency}")
+    try:
+        with open(args.file, 'rb') as fileobj, db_transaction.atomic():
+            result = import_statement(user, fileobj, fmt=fmt, chunk_size=args.chunk_size, currency=currency)
+    except (OSError, StatementFormatError) as e:
+        sys.exit(f"✗ {e}")
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"✓ Imported {result['imported']} of {result['processed']} rows "
+              f"({result['duplicates']} duplicates, {result['error_count']} errors)")
+        for error in result['errors']:
+            print(f"  {error}")
+
+def batch_report(args):
+    report = build_report(batch_user(args.user))
+    if args.json:
+        print(json.dumps(report, default=str))
+        return
+    summary = report['summary']
+    print(f"Income {summary['totalIncome']}  Expenses {summary['totalExpenses']}  "
+          f"Net {summary['netAmount']} {summary['currency']}")
+    for budget in report['budgetAnalysis']:
+        print(f"{budget['category']:20} {budget['spent_amount']:>12} / {budget['limit_amount']:<12} {budget['utilization_pct']}%")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='fintrack', description='FinTrack personal finance manager')
+    commands = parser.add_subparsers(dest='command')
+
+    add = commands.add_parser('add', help='Import transactions from a CSV or OFX statement')
+    add.add_argument('--user', required=True)
+    add.add_argument('--file', required=True)
+    add.add_argument('--format', choices=['csv', 'ofx'], help='Default: from the file extension')
+    add.add_argument('--currency', help='Currency of the statement (default: base currency)')
+    add.add_argument('--chunk-size', type=int, default=5000)
+    add.add_argument('--json', action='store_true', help='Print the totals as JSON')
+    add.set_defaults(handler=batch_add)
+
+    report = commands.add_parser('report', help='Print the income/expense summary and budget usage')
+    report.add_argument('--user', required=True)
+    report.add_argument('--json', action='store_true')
+    report.set_defaults(handler=batch_report)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup()
+    if args.command is None:
+        interactive()
+    else:
+        args.handler(args)
+
 if __name__ == '__main__':
     main()